@@ -1,15 +1,28 @@
 import streamlit as st
-import pandas as pd
 import os
-from PIL import Image
-import tempfile
-import zipfile
-import gdown
 import time
-from components.sidebar import render_sidebar
+from components.sidebar import render_sidebar, render_jump_control, render_unannotated_navigation
 from components.navigation import render_navigation
-from components.annotation_form import render_annotation_form
-from utils.annotations import export_to_csv
+from components.annotation_form import render_annotation_form, render_batch_actions
+from components.shortcuts import render_keyboard_shortcuts
+from components.fragments import WORKSPACE_FRAGMENT, SIDEBAR_STATS_FRAGMENT, EXPORT_FRAGMENT, JUMP_FRAGMENT, flash
+from utils.annotations import (
+    get_export_csv, clear_all_annotations, get_annotation_progress,
+    bind_annotations_to_dataset, unbind_annotations, save_annotation_cursor, adopt_saved_annotations
+)
+from utils.annotation_store import AnnotationStore
+from utils.zip_source import ZipImageSource
+from utils.image_catalog import ImageCatalog
+from utils.parallel_ingest import validate_members
+from utils.image_cache import get_display_image, get_display_cache
+from utils.prefetch import ImagePrefetcher
+from utils.downloader import Downloader, DownloadError, get_drive_download_url
+from utils.helpers import format_file_size
+from utils.dataset_cache import get_dataset_cache
+from utils.dataset_registry import get_dataset_registry, release_session_dataset
+from utils.folder_source import FolderImageSource, ImageNotReady, SkippedImage, unique_names
+from utils.google_drive import extract_folder_id_from_url
+from utils.drive_listing import get_drive_listing_client, DriveListingError
 
 # Настройка страницы
 st.set_page_config(
@@ -21,24 +34,35 @@ st.set_page_config(
 
 # Инициализация session state
 if 'annotations' not in st.session_state:
-    st.session_state.annotations = []
+    st.session_state.annotations = AnnotationStore()
 if 'current_image_index' not in st.session_state:
     st.session_state.current_image_index = 0
 if 'images_list' not in st.session_state:
     st.session_state.images_list = []
-if 'image_paths' not in st.session_state:
-    st.session_state.image_paths = {}
+if 'image_catalog' not in st.session_state:
+    st.session_state.image_catalog = None
+if 'image_source' not in st.session_state:
+    st.session_state.image_source = None
+if 'dataset' not in st.session_state:
+    st.session_state.dataset = None
+if 'integrity_check' not in st.session_state:
+    st.session_state.integrity_check = None
+if 'prefetcher' not in st.session_state:
+    st.session_state.prefetcher = None
 if 'folder_name' not in st.session_state:
     st.session_state.folder_name = ""
 
+SOURCE_ZIP = "ZIP архив"
+SOURCE_FOLDER = "Папка Google Drive"
+
 
-@st.cache_data
 def load_images_from_gdrive_zip(gdrive_url, folder_name):
-    """Загружает изображения из ZIP архива на Google Drive"""
+    """
+    Подключает сессию к набору изображений из ZIP архива на Google Drive.
+    Сессии, открывшие тот же архив, используют одну общую копию набора.
+    Возвращает DatasetHandle или None
+    """
     try:
-        # Создаем временную директорию
-        temp_dir = tempfile.mkdtemp()
-
         # Извлекаем ID из ссылки Google Drive
         if 'drive.google.com' in gdrive_url:
             if '/file/d/' in gdrive_url:
@@ -49,76 +73,271 @@ def load_images_from_gdrive_zip(gdrive_url, folder_name):
                 file_id = gdrive_url.split('/open?id=')[1].split('&')[0]
             else:
                 st.error("Неверный формат ссылки Google Drive. Нужна ссылка на файл.")
-                return None, None
+                return None
         else:
             st.error("Ссылка должна быть из Google Drive")
-            return None, None
-
-        # Скачиваем ZIP файл
-        zip_path = os.path.join(temp_dir, "images.zip")
-        download_url = f"https://drive.google.com/uc?export=download&id={file_id}"
-
-        with st.spinner("Скачиваем ZIP архив..."):
-            try:
-                gdown.download(download_url, zip_path, quiet=False)
-            except Exception as e:
-                # Пробуем альтернативный метод
-                st.warning("Пробуем альтернативный способ скачивания...")
-                download_url = f"https://drive.google.com/uc?id={file_id}"
-                gdown.download(download_url, zip_path, quiet=False)
-
-        # Проверяем, что файл скачался
-        if not os.path.exists(zip_path) or os.path.getsize(zip_path) == 0:
-            st.error("Не удалось скачать файл. Проверьте ссылку и права доступа.")
-            return None, None
-
-        # Распаковываем ZIP
-        extract_dir = os.path.join(temp_dir, "extracted")
-        with st.spinner("Извлекаем изображения..."):
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_dir)
-
-        # Находим изображения
-        images = []
-        image_paths = {}
-
-        for root, dirs, files in os.walk(extract_dir):
-            # Пропускаем служебные папки
-            if '__MACOSX' in root or '.DS_Store' in root:
-                continue
-
-            for file in files:
-                # Пропускаем служебные файлы
-                if file.startswith('._') or file.startswith('.DS_Store') or file.startswith('Thumbs.db'):
-                    continue
-
-                if file.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')):
-                    full_path = os.path.join(root, file)
-
-                    # Проверяем, что файл можно открыть
-                    try:
-                        with Image.open(full_path) as test_img:
-                            test_img.verify()
-
-                        # Переоткрываем файл (verify() закрывает его)
-                        with Image.open(full_path) as img:
-                            # Проверяем размер изображения
-                            if img.size[0] > 50 and img.size[1] > 50:  # Минимальный размер
-                                images.append(file)
-                                image_paths[file] = full_path
-                    except Exception as e:
-                        st.warning(f"Пропускаем поврежденный файл {file}: {e}")
-
-        if not images:
-            st.error("В архиве не найдено изображений")
-            return None, None
-
-        st.success(f"✅ Загружено {len(images)} изображений")
-        return images, image_paths
+            return None
+
+        # Узнаем размер архива: по ID файла и размеру ищем его в реестре и дисковом кэше
+        downloader = Downloader()
+        download_url = get_drive_download_url(file_id)
+
+        try:
+            resolved = downloader.resolve(download_url)
+        except DownloadError:
+            # Пробуем альтернативный метод
+            st.warning("Пробуем альтернативный способ скачивания...")
+            download_url = f"https://drive.google.com/uc?id={file_id}"
+            resolved = downloader.resolve(download_url)
+
+        cache = get_dataset_cache()
+        archive_size = resolved[1]
+        if archive_size is not None:
+            cache_key = cache.make_key(file_id, archive_size)
+        else:
+            # Без размера нельзя понять, тот ли это архив - загружаем заново, не делясь с другими сессиями.
+            # Разовая запись удаляется, когда набор отпускает последняя сессия
+            cache_key = cache.make_private_key(file_id)
+
+        registry = get_dataset_registry()
+        shared = registry.refcount(cache_key) > 0
+        # Тот же архив уже скачивается в другой сессии - ждем ее загрузку вместо своей
+        waiting = registry.loading(cache_key)
+        if waiting:
+            st.info("⏳ Этот архив уже загружается в другой сессии, ждем ее")
+
+        # Разметки привязаны к файлу на Google Drive: новая версия архива и перезагрузка
+        # без известного размера находят их. Старые версии хранили разметки под ключом кэша
+        annotation_key = f"zip-{file_id}"
+        adopt_saved_annotations(annotation_key, f"{file_id}-")
+
+        on_wait, clear_wait = make_shared_progress()
+        handle = registry.attach(
+            cache_key,
+            lambda report: ingest_archive(downloader, download_url, resolved, cache, cache_key, file_id, report),
+            on_wait=on_wait,
+            annotation_key=annotation_key
+        )
+        clear_wait()
+        if handle is None:
+            if waiting:
+                st.error("Загрузка архива в другой сессии не удалась, попробуйте еще раз")
+            return None
+
+        if shared:
+            st.success(f"✅ Загружено {len(handle.dataset.images)} изображений (набор уже открыт в другой сессии)")
+        return handle
 
     except Exception as e:
         st.error(f"Ошибка загрузки ZIP архива: {e}")
-        return None, None
+        return None
+
+
+def ingest_archive(downloader, download_url, resolved, cache, cache_key, file_id, report):
+    """
+    Скачивает и проверяет архив (или берет его из дискового кэша). Возвращает (catalog, source) или None.
+    report(доля, текст) показывает прогресс сессиям, ждущим этот же архив
+    """
+
+    cached = cache.lookup(cache_key)
+    if cached:
+        source = ZipImageSource(cached['archive_path'], use_mmap=True)
+        st.success(f"✅ Загружено {len(cached['names'])} изображений (из кэша)")
+        return ImageCatalog.from_names(cached['root'], cached['names']), source
+
+    # Скачиваем ZIP файл прямо в кэш (с докачкой после обрыва, в том числе после перезапуска).
+    # Если архив уже скачан целиком, а индекс устарел, - только проверяем его заново
+    zip_path = cache.archive_path(cache_key)
+    if not (os.path.exists(zip_path) and os.path.getsize(zip_path) == resolved[1]):
+        progress_bar = st.progress(0.0, text="Скачиваем ZIP архив...")
+        downloader.download(
+            download_url,
+            zip_path,
+            progress_callback=make_download_progress(progress_bar, report=report),
+            resolved=resolved
+        )
+        progress_bar.empty()
+
+    # Проверяем, что файл скачался
+    if not os.path.exists(zip_path) or os.path.getsize(zip_path) == 0:
+        st.error("Не удалось скачать файл. Проверьте ссылку и права доступа.")
+        return None
+
+    # Читаем оглавление архива без распаковки
+    with st.spinner("Читаем содержимое архива..."):
+        source = ZipImageSource(zip_path, use_mmap=True)
+
+    # Проверяем изображения параллельно: формат и размеры читаются из заголовков,
+    # полная проверка целостности идет в фоне после загрузки
+    progress_bar = st.progress(0.0, text="Проверяем изображения...")
+
+    def on_validated(done, total):
+        progress_bar.progress(done / total, text=f"Проверено {done}/{total}")
+        report(done / total, f"Проверено {done}/{total}")
+
+    results = validate_members(zip_path, source.names(), progress_callback=on_validated)
+    progress_bar.empty()
+
+    # Находим изображения (служебные файлы отфильтрованы по центральному каталогу)
+    members = []
+
+    for member, accepted, error in results:
+        if error:
+            st.warning(f"Пропускаем поврежденный файл {member}: {error}")
+        elif accepted:  # Минимальный размер 50px
+            members.append(member)
+
+    if not members:
+        source.close()
+        st.error("В архиве не найдено изображений")
+        return None
+
+    # Изображения различаются по полному пути: одноименные файлы из разных папок не теряются
+    catalog = ImageCatalog(members)
+
+    # Запоминаем проверенный каталог, чтобы после перезапуска не проверять архив заново
+    cache.commit(cache_key, catalog, file_id=file_id)
+
+    st.success(f"✅ Загружено {len(catalog)} изображений")
+    return catalog, source
+
+
+def load_images_from_gdrive_folder(folder_url, folder_name):
+    """
+    Подключает сессию к набору изображений из публичной папки Google Drive.
+    Файлы скачиваются в фоне, разметка доступна сразу после первого изображения.
+    Возвращает DatasetHandle или None
+    """
+    folder_id = extract_folder_id_from_url(folder_url)
+    if not folder_id:
+        st.error("Неверный формат ссылки. Нужна ссылка на папку Google Drive.")
+        return None
+
+    try:
+        # Ключ не зависит от состава папки: разметки привязаны к папке, а не к ее снимку
+        cache_key = f"folder-{folder_id}"
+        registry = get_dataset_registry()
+        shared = registry.refcount(cache_key) > 0
+        waiting = registry.loading(cache_key)
+        if waiting:
+            st.info("⏳ Эта папка уже открывается в другой сессии, ждем ее")
+
+        on_wait, clear_wait = make_shared_progress()
+        handle = registry.attach(
+            cache_key, lambda report: ingest_folder(folder_id, cache_key, report),
+            on_wait=on_wait, annotation_key=cache_key
+        )
+        clear_wait()
+        if handle is None:
+            if waiting:
+                st.error("Открытие папки в другой сессии не удалось, попробуйте еще раз")
+            return None
+
+        if shared:
+            st.success(f"✅ Подключено {len(handle.dataset.images)} изображений (папка уже открыта в другой сессии)")
+        return handle
+
+    except Exception as e:
+        st.error(f"Ошибка загрузки папки: {e}")
+        return None
+
+
+def ingest_folder(folder_id, cache_key, report):
+    """
+    Читает список папки и запускает фоновое скачивание. Возвращает (catalog, source, source) или None.
+    report(доля, текст) показывает прогресс сессиям, ждущим эту же папку
+    """
+
+    client = get_drive_listing_client()
+    before = client.page_cache.stats()
+
+    report(None, "Получаем список файлов папки...")
+    with st.spinner("Получаем список файлов папки..."):
+        try:
+            entries = client.list_files(folder_id)
+        except DriveListingError as e:
+            st.error(f"Не удалось получить список файлов: {e}")
+            return None
+
+    # Страницы списка, которые не пришлось разбирать заново
+    after = client.page_cache.stats()
+    hits, misses = after['hits'] - before['hits'], after['misses'] - before['misses']
+    if hits:
+        st.caption(f"📋 Страниц списка из кэша: {hits}, обновлено: {misses}")
+
+    files = unique_names((entry['file_id'], entry['filename']) for entry in entries if entry['file_id'])
+    skipped = len(entries) - len(files)
+    if skipped:
+        st.warning(f"Пропускаем {skipped} файлов без ID - их нельзя скачать")
+
+    if not files:
+        st.error("В папке не найдено изображений")
+        return None
+
+    # Скачанные файлы хранятся в дисковом кэше наборов и переживают перезапуск.
+    # Квота проверяется по мере скачивания: большая папка вытесняет старые записи,
+    # а если и этого мало - дальше качаются только открываемые изображения
+    cache = get_dataset_cache()
+    source = FolderImageSource(
+        files, cache.entry_dir(cache_key), check_quota=lambda: cache.enforce_quota(keep={cache_key})
+    )
+    catalog = ImageCatalog(source.names())
+
+    # Ждем первое изображение, чтобы разметка началась не с заглушки
+    report(None, f"Найдено {len(catalog)} изображений, скачиваем первое...")
+    try:
+        source.wait(catalog.member(0))
+    except Exception:
+        pass
+    except BaseException:
+        # Сессия перезапущена или остановлена - набор никому не достанется, останавливаем скачивание
+        source.close()
+        raise
+
+    st.success(f"✅ Найдено {len(catalog)} изображений, скачивание продолжается в фоне")
+    # Источник сам проверяет файлы по мере скачивания и служит проверкой целостности
+    return catalog, source, source
+
+
+def make_download_progress(progress_bar, interval=0.5, report=None):
+    """
+    Возвращает колбэк, который обновляет прогресс скачивания не чаще раза в interval секунд.
+    report(доля, текст) дополнительно получает тот же прогресс
+    """
+
+    last_update = [0.0]
+
+    def on_progress(downloaded, total, speed):
+        now = time.monotonic()
+        if now - last_update[0] < interval and downloaded != total:
+            return
+        last_update[0] = now
+
+        text = f"Скачано {format_file_size(downloaded)}"
+        if total:
+            text += f" из {format_file_size(total)}"
+        text += f" ({format_file_size(speed)}/с)"
+
+        fraction = min(downloaded / total, 1.0) if total else None
+        progress_bar.progress(fraction or 0.0, text=text)
+        if report is not None:
+            report(fraction, text)
+
+    return on_progress
+
+
+def make_shared_progress():
+    """
+    Показывает прогресс загрузки, которую выполняет другая сессия.
+    Возвращает (колбэк on_wait(доля, текст), функция очистки)
+    """
+
+    placeholder = st.empty()
+
+    def on_wait(fraction, text):
+        placeholder.progress(fraction or 0.0, text=f"⏳ {text}")
+
+    return on_wait, placeholder.empty
 
 
 def main():
@@ -135,8 +354,8 @@ def main():
     else:
         show_annotation_interface()
 
-    # Панель экспорта
-    if st.session_state.annotations:
+    # Панель экспорта (показывается и до первой разметки, чтобы ее фрагмент можно было обновить после сохранения)
+    if st.session_state.images_list or st.session_state.annotations:
         show_export_panel()
 
 
@@ -144,7 +363,14 @@ def render_zip_upload_sidebar():
     """Рендерит боковую панель для загрузки ZIP"""
 
     with st.sidebar:
-        st.header("📦 Загрузка ZIP архива")
+        st.header("📦 Загрузка изображений")
+
+        source_kind = st.radio(
+            "Источник:",
+            [SOURCE_ZIP, SOURCE_FOLDER],
+            horizontal=True,
+            help="Папка скачивается по файлам в фоне - размечать можно сразу, не упаковывая ее в ZIP"
+        )
 
         # Инструкция
         with st.expander("📖 Как подготовить архив"):
@@ -156,17 +382,27 @@ def render_zip_upload_sidebar():
             4. Получите ссылку: "Поделиться" → "Копировать ссылку"
             5. Вставьте ссылку ниже
 
+            **Без архива:** выберите источник "Папка Google Drive" и вставьте ссылку на
+            публичную папку с изображениями.
+
             **Требования:**
-            - ZIP архив должен быть доступен по ссылке
+            - ZIP архив или папка должны быть доступны по ссылке
             - Поддерживаемые форматы: JPG, PNG, GIF, BMP, WEBP
             """)
 
-        # Ссылка на ZIP архив
-        gdrive_url = st.text_input(
-            "🔗 Ссылка на ZIP архив:",
-            placeholder="https://drive.google.com/file/d/1ABC.../view?usp=sharing",
-            help="Ссылка на ZIP архив в Google Drive"
-        )
+        # Ссылка на ZIP архив или папку
+        if source_kind == SOURCE_FOLDER:
+            gdrive_url = st.text_input(
+                "🔗 Ссылка на папку:",
+                placeholder="https://drive.google.com/drive/folders/1ABC...?usp=sharing",
+                help="Ссылка на публичную папку Google Drive"
+            )
+        else:
+            gdrive_url = st.text_input(
+                "🔗 Ссылка на ZIP архив:",
+                placeholder="https://drive.google.com/file/d/1ABC.../view?usp=sharing",
+                help="Ссылка на ZIP архив в Google Drive"
+            )
 
         # Название папки/категории
         folder_name = st.text_input(
@@ -178,21 +414,18 @@ def render_zip_upload_sidebar():
         # Кнопка загрузки
         if st.button("📥 Загрузить изображения", use_container_width=True):
             if not gdrive_url:
-                st.error("❌ Введите ссылку на ZIP архив")
+                st.error("❌ Введите ссылку на папку" if source_kind == SOURCE_FOLDER else "❌ Введите ссылку на ZIP архив")
             elif not folder_name:
                 st.error("❌ Укажите категорию одежды")
             else:
                 # Загружаем изображения
-                images, image_paths = load_images_from_gdrive_zip(gdrive_url, folder_name)
-
-                if images and image_paths:
-                    # Сохраняем в session state
-                    st.session_state.images_list = images
-                    st.session_state.image_paths = image_paths
-                    st.session_state.folder_name = folder_name
-                    st.session_state.current_image_index = 0
-                    st.session_state.gdrive_url = gdrive_url
+                if source_kind == SOURCE_FOLDER:
+                    handle = load_images_from_gdrive_folder(gdrive_url, folder_name)
+                else:
+                    handle = load_images_from_gdrive_zip(gdrive_url, folder_name)
 
+                if handle is not None:
+                    open_dataset(handle, folder_name, gdrive_url)
                     st.rerun()
 
         # Показываем информацию о загруженных изображениях
@@ -200,35 +433,107 @@ def render_zip_upload_sidebar():
             st.markdown("---")
             st.subheader("📊 Информация")
 
-            total_images = len(st.session_state.images_list)
-            annotated_count = len(st.session_state.annotations)
-
-            st.metric("Всего изображений", total_images)
-            st.metric("Размечено", annotated_count)
+            render_sidebar_stats()
 
-            if total_images > 0:
-                progress = annotated_count / total_images
-                st.progress(progress)
-                st.caption(f"{progress * 100:.1f}% завершено")
+            # Переход по номеру и поиск по имени файла
+            st.markdown("---")
+            st.subheader("🧭 Навигация")
+            render_sidebar_jump()
 
             # Действия
             st.markdown("**🔧 Действия:**")
 
             if st.button("🗑️ Очистить разметки", use_container_width=True):
-                st.session_state.annotations = []
+                clear_all_annotations()
                 st.success("Разметки очищены")
                 st.rerun()
 
-            if st.button("🔄 Загрузить новый архив", use_container_width=True):
+            if st.button("🔄 Загрузить новый набор", use_container_width=True):
                 # Очищаем все данные
                 st.session_state.images_list = []
-                st.session_state.image_paths = {}
-                st.session_state.annotations = []
+                st.session_state.image_catalog = None
+                release_session_dataset(st.session_state)
+                if st.session_state.prefetcher is not None:
+                    st.session_state.prefetcher.cancel()
+                # Сохраненные разметки архива остаются в базе
+                unbind_annotations()
+                clear_all_annotations()
                 st.session_state.folder_name = ""
                 st.session_state.current_image_index = 0
                 st.rerun()
 
 
+def open_dataset(handle, folder_name, gdrive_url):
+    """Переключает сессию на загруженный набор"""
+
+    # Отключаемся от предыдущего набора и сохраняем новый в session state
+    release_session_dataset(st.session_state)
+    dataset = handle.dataset
+    st.session_state.dataset = handle
+    st.session_state.images_list = dataset.images
+    st.session_state.image_catalog = dataset.catalog
+    st.session_state.image_source = dataset.source
+
+    # Полная проверка целостности выполняется в фоне, одна на набор
+    st.session_state.integrity_check = dataset.integrity_check
+    st.session_state.folder_name = folder_name
+    st.session_state.gdrive_url = gdrive_url
+
+    # Восстанавливаем сохраненные разметки и позицию; дальше изменения пишутся в базу
+    cursor, skipped = bind_annotations_to_dataset(handle.annotation_key, dataset.images)
+    st.session_state.current_image_index = min(cursor or 0, len(dataset.images) - 1)
+    if skipped:
+        # Сообщение переживет перезапуск после загрузки и покажется рядом с формой разметки
+        flash("warning", f"⚠️ Сохраненных разметок без изображения в наборе: {skipped} - они не загружены")
+
+
+@st.fragment(key=SIDEBAR_STATS_FRAGMENT)
+def render_sidebar_stats():
+    """Прогресс разметки и переход к неразмеченным в боковой панели; перезапускается отдельно после сохранения разметок"""
+
+    progress = get_annotation_progress()
+
+    st.metric("Всего изображений", progress['total'])
+    st.metric("Размечено", progress['annotated'])
+
+    if progress['total'] > 0:
+        st.progress(progress['progress'])
+        st.caption(f"{progress['progress'] * 100:.1f}% завершено")
+
+    # Фрагмент обновляется после каждого сохранения, поэтому счетчик оставшихся всегда свежий.
+    # Переход перезапускает все приложение, чтобы сменилось и изображение
+    render_unannotated_navigation()
+
+    render_integrity_status()
+
+
+@st.fragment(key=JUMP_FRAGMENT)
+def render_sidebar_jump():
+    """Переход по номеру и поиск; перезапускается вместе с рабочей областью при смене изображения"""
+    render_jump_control(len(st.session_state.images_list))
+
+
+def render_integrity_status():
+    """Показывает прогресс фоновой проверки целостности изображений"""
+
+    check = st.session_state.integrity_check
+    if check is None:
+        return
+
+    checked, total, broken = check.progress()
+
+    if not check.done:
+        st.caption(f"{check.title}: {checked}/{total}")
+    if getattr(check, 'over_quota', False):
+        st.caption("💾 Кэш заполнен: остальные изображения скачиваются при открытии")
+
+    if broken:
+        # Такие изображения пропускаются при переходе к неразмеченным и не входят в прогресс
+        with st.expander(f"⚠️ Пропущенные файлы ({len(broken)})"):
+            for member, error in broken.items():
+                st.text(f"{member}: {error}")
+
+
 def show_welcome_screen():
     """Показывает приветственный экран"""
     st.markdown("---")
@@ -275,13 +580,20 @@ def show_welcome_screen():
         """)
 
 
+@st.fragment(key=WORKSPACE_FRAGMENT)
 def show_annotation_interface():
-    """Показывает интерфейс разметки"""
+    """
+    Показывает интерфейс разметки: навигацию, изображение и форму.
+    Это фрагмент - переходы и сохранения перезапускают его, а не все приложение
+    """
     st.markdown("---")
 
     # Навигация
     render_navigation()
 
+    # Горячие клавиши: разметка набирается в браузере и уходит одним запросом
+    render_keyboard_shortcuts()
+
     st.markdown("---")
 
     # Основной интерфейс
@@ -296,6 +608,31 @@ def show_annotation_interface():
     with col2:
         render_annotation_form(current_filename)
 
+    # Массовая разметка оставшихся изображений; счетчик обновляется вместе с рабочей областью
+    render_batch_actions()
+
+    # Готовим следующие изображения в фоне, пока пользователь размечает текущее
+    schedule_prefetch(current_idx)
+
+    # Позиция сохраняется в базу вместе с разметками
+    save_annotation_cursor(current_idx)
+
+
+def schedule_prefetch(current_idx):
+    """Запускает фоновую подготовку соседних изображений"""
+
+    if st.session_state.prefetcher is None:
+        st.session_state.prefetcher = ImagePrefetcher(get_display_cache())
+
+    catalog = st.session_state.image_catalog
+
+    st.session_state.prefetcher.update(
+        st.session_state.image_source,
+        current_idx,
+        len(catalog),
+        catalog.member
+    )
+
 
 def show_image_area(filename):
     """Показывает область изображения"""
@@ -305,12 +642,23 @@ def show_image_area(filename):
     st.info(f"📁 **Файл:** {filename}\n📂 **Категория:** {st.session_state.folder_name}")
 
     # Показываем изображение из загруженного архива
-    if filename in st.session_state.image_paths:
+    catalog = st.session_state.image_catalog
+    if catalog is not None and filename in catalog:
         try:
-            img_path = st.session_state.image_paths[filename]
-            img = Image.open(img_path)
+            member = catalog.member_of(filename)
+            # Уменьшенная копия из кэша: повторный показ не декодирует оригинал
+            img = get_display_image(st.session_state.image_source, member)
             st.image(img, use_container_width=True, caption=filename)
 
+        except ImageNotReady:
+            # Файл папки еще скачивается - он уже поставлен в начало очереди
+            st.info("⏳ Изображение еще загружается, можно разметить следующие и вернуться")
+            show_placeholder_image()
+
+        except SkippedImage as e:
+            st.warning(f"⏭️ Изображение пропущено: {e}")
+            show_placeholder_image()
+
         except Exception as e:
             st.error(f"❌ Ошибка загрузки изображения: {str(e)}")
             show_placeholder_image()
@@ -326,40 +674,40 @@ def show_placeholder_image():
              caption="Изображение недоступно")
 
 
+@st.fragment(key=EXPORT_FRAGMENT)
 def show_export_panel():
-    """Показывает панель экспорта результатов"""
+    """Показывает панель экспорта результатов (фрагмент, обновляется после изменения разметок)"""
     st.markdown("---")
     st.header("📤 Экспорт результатов")
 
     col1, col2, col3 = st.columns([1, 1, 1])
 
     with col1:
-        annotated_count = len(st.session_state.annotations)
-        total_count = len(st.session_state.images_list)
-        st.metric("Прогресс разметки", f"{annotated_count}/{total_count}")
+        progress = get_annotation_progress()
+        st.metric("Прогресс разметки", f"{progress['annotated']}/{progress['total']}")
 
-        if total_count > 0:
-            progress_percent = (annotated_count / total_count) * 100
-            st.progress(progress_percent / 100)
-            st.caption(f"{progress_percent:.1f}% завершено")
+        if progress['total'] > 0:
+            st.progress(progress['progress'])
+            st.caption(f"{progress['progress'] * 100:.1f}% завершено")
 
     with col2:
         if st.button("📊 Показать таблицу", use_container_width=True):
             if st.session_state.annotations:
-                df = pd.DataFrame(st.session_state.annotations)
+                df = st.session_state.annotations.to_frame()
                 st.dataframe(df[['img_path', 'validity', 'gender', 'category']],
                              use_container_width=True)
             else:
                 st.info("Нет данных для отображения")
 
     with col3:
-        csv_data = export_to_csv(st.session_state.annotations)
-        if csv_data:
+        store = st.session_state.annotations
+        if store:
             timestamp = int(time.time())
             filename = f"annotations_{st.session_state.folder_name}_{timestamp}.csv"
+            # CSV формируется только при нажатии и кэшируется до следующего изменения разметок
             st.download_button(
                 label="📥 Скачать CSV",
-                data=csv_data,
+                data=lambda: get_export_csv(store) or "",
                 file_name=filename,
                 mime="text/csv",
                 use_container_width=True
@@ -0,0 +1,136 @@
+"""
+Бенчмарк extract_files_from_html на больших синтетических страницах Google Drive.
+Сравнивает однопроходный разбор с прежней реализацией (шесть re.findall) по времени и результату.
+
+Запуск: python benchmarks/bench_extract_files.py [число файлов]
+"""
+
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.google_drive import extract_files_from_html, is_image_file
+
+
+def legacy_extract_files_from_html(html_content):
+    """Прежняя реализация: отдельный re.findall на каждый паттерн"""
+
+    patterns = [
+        r'"([a-zA-Z0-9_-]{25,})"[^}]*?"([^"]*\.(?:jpg|jpeg|png|gif|bmp|webp))"',
+        r'"([^"]*\.(?:jpg|jpeg|png|gif|bmp|webp))"[^}]*?"([a-zA-Z0-9_-]{25,})"',
+        r'data-id="([a-zA-Z0-9_-]{25,})"[^>]*?title="([^"]*\.(?:jpg|jpeg|png|gif|bmp|webp))"',
+        r'title="([^"]*\.(?:jpg|jpeg|png|gif|bmp|webp))"[^>]*?data-id="([a-zA-Z0-9_-]{25,})"',
+        r'"id":"([a-zA-Z0-9_-]{25,})"[^}]*?"name":"([^"]*\.(?:jpg|jpeg|png|gif|bmp|webp))"',
+        r'"name":"([^"]*\.(?:jpg|jpeg|png|gif|bmp|webp))"[^}]*?"id":"([a-zA-Z0-9_-]{25,})"',
+    ]
+
+    found_files = {}
+
+    for pattern in patterns:
+        for match in re.findall(pattern, html_content, re.IGNORECASE):
+            if legacy_is_likely_file_id(match[0]) and is_image_file(match[1]):
+                file_id, filename = match[0], match[1]
+            elif legacy_is_likely_file_id(match[1]) and is_image_file(match[0]):
+                file_id, filename = match[1], match[0]
+            else:
+                continue
+
+            if filename not in found_files:
+                found_files[filename] = {
+                    'filename': filename,
+                    'file_id': file_id,
+                    'view_url': f"https://drive.google.com/file/d/{file_id}/preview"
+                }
+
+    if len(found_files) < 5:
+        for pattern in (r'"([^"]*\.(?:jpg|jpeg|png|gif|bmp|webp))"', r"'([^']*\.(?:jpg|jpeg|png|gif|bmp|webp))'"):
+            for filename in re.findall(pattern, html_content, re.IGNORECASE):
+                if is_image_file(filename) and len(filename) > 5 and filename not in found_files:
+                    found_files[filename] = {'filename': filename, 'file_id': None, 'view_url': None}
+
+    return list(found_files.values())
+
+
+def legacy_is_likely_file_id(text):
+    if not text or len(text) < 20 or len(text) > 50 or '.' in text:
+        return False
+    return any(c in string.ascii_letters for c in text) and any(c in string.digits for c in text)
+
+
+def random_id(rng):
+    return '1' + ''.join(rng.choice(string.ascii_letters + string.digits + '-_') for _ in range(32))
+
+
+def drive_page(count, seed=0):
+    """Страница папки: JSON записи в обоих порядках полей, плитки с data-id и шум скриптов"""
+
+    rng = random.Random(seed)
+    parts = ['<html><head><script>var config = {"locale":"ru","build":"drive_20240101"};</script></head><body>']
+
+    for i in range(count):
+        file_id = random_id(rng)
+        name = f"photo_{i:06d}.{rng.choice(['jpg', 'JPEG', 'png', 'webp'])}"
+        kind = i % 3
+        if kind == 0:
+            parts.append(f'{{"id":"{file_id}","name":"{name}","mimeType":"image/jpeg","size":"{rng.randint(1, 10 ** 7)}"}},')
+        elif kind == 1:
+            parts.append(f'{{"name":"{name}","owner":"user{i}","id":"{file_id}"}},')
+        else:
+            parts.append(f'<div class="tile" data-id="{file_id}" tabindex="0" title="{name}"><span>{name}</span></div>')
+
+        # Служебные строки без имен файлов
+        if i % 10 == 0:
+            parts.append(f'<script>track("{random_id(rng)}", "view", "{rng.random()}");</script>')
+
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+
+def token_page(count, seed=1):
+    """
+    Длинный скрипт без '}' из id, после которых нет имен файлов: прежние ленивые [^}]*?
+    шаблоны от каждого id просматривают страницу до конца - квадратичное время
+    """
+
+    rng = random.Random(seed)
+    tokens = ', '.join(f'"{random_id(rng)}"' for _ in range(count))
+    return f'<div title="cover_image.jpg"></div><script>var ids = [{tokens}];</script>'
+
+
+def measure(function, page, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(page)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    fixtures = [
+        (f"папка, {count} файлов", drive_page(count), 3),
+        (f"скрипт из {count // 10} id без имен", token_page(count // 10), 1),
+    ]
+
+    for title, page, repeat in fixtures:
+        legacy_time, legacy = measure(legacy_extract_files_from_html, page, repeat)
+        new_time, new = measure(extract_files_from_html, page, repeat)
+
+        print(f"{title}: {len(page) / 1e6:.1f} МБ, найдено {len(new)}")
+        print(f"  прежний разбор:    {legacy_time * 1000:9.1f} мс")
+        print(f"  однопроходный:     {new_time * 1000:9.1f} мс  (x{legacy_time / max(new_time, 1e-9):.1f})")
+        print(f"  результаты совпадают: {'да' if new == legacy else 'НЕТ'}")
+
+        if new != legacy:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
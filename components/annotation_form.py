@@ -1,5 +1,15 @@
 import streamlit as st
-from utils.annotations import save_annotation, get_current_annotation
+from utils.annotations import (
+    save_annotation,
+    get_current_annotation,
+    delete_annotation,
+    get_annotation_store,
+    get_annotation_stats,
+    bulk_save_annotations,
+    get_unannotated_files
+)
+from utils.annotations import get_annotation_progress as get_progress_stats
+from .fragments import flash, show_flash, rerun_after_annotation_change
 
 
 def render_annotation_form(filename):
@@ -16,21 +26,26 @@ def render_annotation_form(filename):
     else:
         st.info("⏳ Требует разметки")
 
+    # Сообщение, оставленное обработчиком прошлого действия
+    show_flash()
+
     # БЫСТРЫЕ ДЕЙСТВИЯ НАВЕРХУ
     render_quick_actions(filename)
 
     st.markdown("---")
 
     # Форма разметки
-    with st.form(key=f"annotation_form_{st.session_state.current_image_index}"):
+    form_key = f"annotation_form_{st.session_state.current_image_index}"
+    with st.form(key=form_key):
 
         # 1. Валидность (обязательное поле)
         st.markdown("#### 📋 Валидность")
-        validity = st.radio(
+        st.radio(
             "Подходит ли изображение для обучения модели?",
             ["Валидно", "Невалидно"],
             index=0 if not current_annotation else (0 if current_annotation['validity'] == 'Валидно' else 1),
-            help="Валидно = изображение четкое, подходящее для обучения"
+            help="Валидно = изображение четкое, подходящее для обучения",
+            key=f"{form_key}_validity"
         )
 
         # 2. Пол (можно выбрать несколько)
@@ -38,51 +53,46 @@ def render_annotation_form(filename):
         col1, col2 = st.columns(2)
 
         with col1:
-            gender_m = st.checkbox(
+            st.checkbox(
                 "Мужской (М)",
                 value=current_annotation and 'М' in current_annotation['gender'] if current_annotation else False,
-                help="Одежда для мужчин"
+                help="Одежда для мужчин",
+                key=f"{form_key}_gender_m"
             )
 
         with col2:
-            gender_f = st.checkbox(
+            st.checkbox(
                 "Женский (Ж)",
                 value=current_annotation and 'Ж' in current_annotation['gender'] if current_annotation else False,
-                help="Одежда для женщин"
+                help="Одежда для женщин",
+                key=f"{form_key}_gender_f"
             )
 
-        # Формируем строку пола
-        gender_list = []
-        if gender_m:
-            gender_list.append("М")
-        if gender_f:
-            gender_list.append("Ж")
-        gender = "/".join(gender_list) if gender_list else ""
-
         # 3. Категория одежды (обязательное поле)
         st.markdown("#### 👔 Категория одежды")
-        category = st.radio(
+        st.radio(
             "К какой категории относится одежда на изображении?",
             ["верх", "низ", "обувь", "голова", "аксессуар"],
             index=get_category_index(current_annotation),
-            help="Выберите основную категорию одежды"
+            help="Выберите основную категорию одежды",
+            key=f"{form_key}_category"
         )
 
         # Кнопки действий
         col1, col2 = st.columns(2)
 
+        # Обработчики - колбэки: после сохранения перезапускаются только зависящие от разметок фрагменты
         with col1:
-            submit_button = st.form_submit_button("💾 Сохранить", use_container_width=True)
+            st.form_submit_button(
+                "💾 Сохранить", use_container_width=True,
+                on_click=submit_annotation_form, args=(filename, form_key)
+            )
 
         with col2:
-            clear_button = st.form_submit_button("🗑️ Очистить", use_container_width=True)
-
-        # Обработка отправки формы
-        if submit_button:
-            handle_form_submission(filename, validity, gender, category)
-
-        if clear_button:
-            handle_clear_annotation(filename)
+            st.form_submit_button(
+                "🗑️ Очистить", use_container_width=True,
+                on_click=handle_clear_annotation, args=(filename,)
+            )
 
     # Показываем текущую разметку
     if current_annotation:
@@ -102,6 +112,22 @@ def get_category_index(current_annotation):
         return 0
 
 
+def submit_annotation_form(filename, form_key):
+    """Колбэк кнопки сохранения: собирает значения формы"""
+
+    state = st.session_state
+
+    # Формируем строку пола
+    gender_list = []
+    if state[f"{form_key}_gender_m"]:
+        gender_list.append("М")
+    if state[f"{form_key}_gender_f"]:
+        gender_list.append("Ж")
+    gender = "/".join(gender_list) if gender_list else ""
+
+    handle_form_submission(filename, state[f"{form_key}_validity"], gender, state[f"{form_key}_category"])
+
+
 def handle_form_submission(filename, validity, gender, category):
     """Обрабатывает отправку формы разметки"""
 
@@ -112,7 +138,7 @@ def handle_form_submission(filename, validity, gender, category):
     else:
         # Валидация для валидных изображений
         if not gender:
-            st.error("❌ Выберите хотя бы один пол (М или Ж)")
+            flash("error", "❌ Выберите хотя бы один пол (М или Ж)")
             return
 
     # Сохраняем разметку
@@ -120,30 +146,27 @@ def handle_form_submission(filename, validity, gender, category):
         success = save_annotation(filename, validity, gender, category, st.session_state.folder_name)
 
         if success:
-            st.success("✅ Разметка сохранена!")
+            flash("success", "✅ Разметка сохранена!")
 
             # Переходим к следующему изображению, если это не последнее
             if st.session_state.current_image_index < len(st.session_state.images_list) - 1:
                 st.session_state.current_image_index += 1
-                st.rerun()
+            rerun_after_annotation_change()
         else:
-            st.error("❌ Ошибка при сохранении разметки")
+            flash("error", "❌ Ошибка при сохранении разметки")
 
     except Exception as e:
-        st.error(f"❌ Ошибка: {str(e)}")
+        flash("error", f"❌ Ошибка: {str(e)}")
 
 
 def handle_clear_annotation(filename):
     """Обрабатывает очистку разметки"""
 
     # Удаляем разметку для текущего файла
-    st.session_state.annotations = [
-        ann for ann in st.session_state.annotations
-        if ann['filename'] != filename
-    ]
+    delete_annotation(filename)
 
-    st.success("🗑️ Разметка очищена")
-    st.rerun()
+    flash("success", "🗑️ Разметка очищена")
+    rerun_after_annotation_change()
 
 
 def show_current_annotation(annotation):
@@ -180,21 +203,30 @@ def render_quick_actions(filename):
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        if st.button("✅ Валидно + Ж + верх", use_container_width=True,
-                     help="Валидная женская одежда, категория 'верх'"):
-            save_annotation(filename, "Валидно", "Ж", "верх", st.session_state.folder_name)
-            advance_to_next()
+        st.button("✅ Валидно + Ж + верх", use_container_width=True,
+                  help="Валидная женская одежда, категория 'верх'",
+                  on_click=quick_annotate, args=(filename, "Валидно", "Ж", "верх"))
 
     with col2:
-        if st.button("✅ Валидно + Ж + низ", use_container_width=True, help="Валидная женская одежда, категория 'низ'"):
-            save_annotation(filename, "Валидно", "Ж", "низ", st.session_state.folder_name)
-            advance_to_next()
+        st.button("✅ Валидно + Ж + низ", use_container_width=True, help="Валидная женская одежда, категория 'низ'",
+                  on_click=quick_annotate, args=(filename, "Валидно", "Ж", "низ"))
 
     with col3:
-        if st.button("❌ Невалидно", use_container_width=True, help="Изображение не подходит для обучения"):
-            # Для невалидных изображений сохраняем только валидность, без пола и категории
-            save_invalid_annotation(filename, st.session_state.folder_name)
-            advance_to_next()
+        st.button("❌ Невалидно", use_container_width=True, help="Изображение не подходит для обучения",
+                  on_click=quick_annotate_invalid, args=(filename,))
+
+
+def quick_annotate(filename, validity, gender, category):
+    """Колбэк быстрого действия: сохраняет разметку и переходит дальше"""
+    save_annotation(filename, validity, gender, category, st.session_state.folder_name)
+    advance_to_next()
+
+
+def quick_annotate_invalid(filename):
+    """Колбэк быстрого действия для невалидного изображения"""
+    # Для невалидных изображений сохраняем только валидность, без пола и категории
+    save_invalid_annotation(filename, st.session_state.folder_name)
+    advance_to_next()
 
 
 def save_invalid_annotation(filename, folder_name):
@@ -211,33 +243,22 @@ def save_invalid_annotation(filename, folder_name):
             'notes': 'Быстрая разметка: невалидное изображение'
         }
 
-        # Проверяем, есть ли уже разметка для этого изображения
-        existing_index = None
-        for i, ann in enumerate(st.session_state.annotations):
-            if ann['filename'] == filename:
-                existing_index = i
-                break
+        # Добавляем новую или обновляем существующую разметку
+        get_annotation_store().upsert(annotation)
 
-        if existing_index is not None:
-            # Обновляем существующую разметку
-            st.session_state.annotations[existing_index] = annotation
-        else:
-            # Добавляем новую разметку
-            st.session_state.annotations.append(annotation)
-
-        st.success("❌ Отмечено как невалидное")
+        flash("success", "❌ Отмечено как невалидное")
         return True
 
     except Exception as e:
-        st.error(f"Ошибка при сохранении: {str(e)}")
+        flash("error", f"Ошибка при сохранении: {str(e)}")
         return False
 
 
 def advance_to_next():
-    """Переходит к следующему изображению"""
+    """Переходит к следующему изображению (из колбэка) и обновляет зависящие от разметок фрагменты"""
     if st.session_state.current_image_index < len(st.session_state.images_list) - 1:
         st.session_state.current_image_index += 1
-        st.rerun()
+    rerun_after_annotation_change()
 
 
 def render_annotation_shortcuts():
@@ -245,26 +266,29 @@ def render_annotation_shortcuts():
 
     with st.expander("⌨️ Горячие клавиши для разметки"):
         st.markdown("""
+        Метки набираются без мыши и отправляются одним действием на изображение.
+        Клавиши не срабатывают, пока курсор стоит в текстовом поле.
+
         **Валидность:**
         - `V` - Валидно
         - `N` - Невалидно
 
-        **Пол:**
+        **Пол (повторное нажатие снимает):**
         - `M` - Мужской
         - `F` - Женский
 
         **Категория:**
         - `1` - верх
-        - `2` - низ  
+        - `2` - низ
         - `3` - обувь
         - `4` - голова
         - `5` - аксессуар
 
         **Действия:**
-        - `Ctrl + S` - Сохранить
+        - `Enter` / `Ctrl + S` - Сохранить и перейти к следующему
         - `Ctrl + D` - Очистить
-        - `Space` - Следующее изображение
-        - `Enter` - Сохранить и перейти к следующему
+        - `Space` / `→` - Следующее изображение
+        - `←` - Предыдущее изображение
         """)
 
 
@@ -293,48 +317,48 @@ def render_batch_actions():
                 ["Не применять", "верх", "низ", "обувь", "голова", "аксессуар"]
             )
 
-        if st.button("🚀 Применить массово", use_container_width=True):
-            apply_batch_annotation(batch_validity, batch_gender, batch_category)
+        # Предпросмотр: сколько изображений получат разметку
+        pending_count = get_progress_stats()['remaining']
+        if pending_count:
+            st.caption(f"Будет размечено изображений: {pending_count}")
+
+        st.button(
+            f"🚀 Применить массово ({pending_count})",
+            use_container_width=True,
+            disabled=not pending_count,
+            on_click=apply_batch_annotation,
+            args=(batch_validity, batch_gender, batch_category)
+        )
 
 
 def apply_batch_annotation(validity, gender, category):
-    """Применяет разметку ко всем неразмеченным изображениям"""
+    """Колбэк кнопки: применяет разметку ко всем неразмеченным изображениям одной операцией"""
 
     # Получаем список неразмеченных файлов
-    annotated_files = {ann['filename'] for ann in st.session_state.annotations}
-    unannotated_files = [
-        filename for filename in st.session_state.images_list
-        if filename not in annotated_files
-    ]
+    unannotated_files = get_unannotated_files()
 
     if not unannotated_files:
-        st.warning("⚠️ Все изображения уже размечены")
+        flash("warning", "⚠️ Все изображения уже размечены")
         return
 
-    applied_count = 0
-
-    for filename in unannotated_files:
-        # Используем текущие значения или значения по умолчанию
-        use_validity = validity if validity != "Не применять" else "Валидно"
-        use_gender = gender if gender != "Не применять" else "Ж"
-        use_category = category if category != "Не применять" else "верх"
-
-        success = save_annotation(
-            filename,
-            use_validity,
-            use_gender,
-            use_category,
-            st.session_state.folder_name
-        )
+    # Используем выбранные значения или значения по умолчанию
+    use_validity = validity if validity != "Не применять" else "Валидно"
+    use_gender = gender if gender != "Не применять" else "Ж"
+    use_category = category if category != "Не применять" else "верх"
 
-        if success:
-            applied_count += 1
+    applied_count = bulk_save_annotations(
+        unannotated_files,
+        use_validity,
+        use_gender,
+        use_category,
+        st.session_state.folder_name
+    )
 
     if applied_count > 0:
-        st.success(f"✅ Применено к {applied_count} изображениям")
-        st.rerun()
+        flash("success", f"✅ Применено к {applied_count} изображениям")
+        rerun_after_annotation_change()
     else:
-        st.error("❌ Не удалось применить разметку")
+        flash("error", "❌ Не удалось применить разметку")
 
 
 def render_annotation_statistics():
@@ -344,7 +368,6 @@ def render_annotation_statistics():
         return
 
     with st.expander("📊 Статистика разметок"):
-        from utils.annotations import get_annotation_stats
         stats = get_annotation_stats()
 
         col1, col2, col3 = st.columns(3)
@@ -373,16 +396,17 @@ def render_validation_warnings():
 
     warnings = []
 
+    stats = get_annotation_store().stats
+
     # Проверяем баланс валидных/невалидных
-    valid_count = sum(1 for ann in st.session_state.annotations if ann['validity'] == 'Валидно')
-    invalid_count = len(st.session_state.annotations) - valid_count
+    valid_count = stats.valid
+    invalid_count = stats.total - valid_count
 
     if invalid_count > valid_count * 0.5:  # Если невалидных больше 50%
         warnings.append("⚠️ Много невалидных изображений - проверьте качество данных")
 
     # Проверяем распределение по категориям
-    from collections import Counter
-    category_counts = Counter(ann['category'] for ann in st.session_state.annotations)
+    category_counts = stats.by_category
     max_count = max(category_counts.values()) if category_counts else 0
     min_count = min(category_counts.values()) if category_counts else 0
 
@@ -401,8 +425,6 @@ def get_annotation_progress():
     if not st.session_state.images_list:
         return 0, 0, 0
 
-    total = len(st.session_state.images_list)
-    annotated = len(st.session_state.annotations)
-    remaining = total - annotated
+    progress = get_progress_stats()
 
-    return total, annotated, remaining
\ No newline at end of file
+    return progress['total'], progress['annotated'], progress['remaining']
\ No newline at end of file
@@ -0,0 +1,38 @@
+import streamlit as st
+
+
+# Ключи фрагментов, которые перезапускаются независимо от остального приложения
+WORKSPACE_FRAGMENT = "workspace"
+SIDEBAR_STATS_FRAGMENT = "sidebar_stats"
+EXPORT_FRAGMENT = "export_panel"
+JUMP_FRAGMENT = "sidebar_jump"
+
+# Переход к другому изображению меняет рабочую область и номер в поле перехода боковой панели
+NAVIGATION_FRAGMENTS = [WORKSPACE_FRAGMENT, JUMP_FRAGMENT]
+# Изменение разметок затрагивает рабочую область и панели статистики, но не остальную страницу;
+# после сохранения курсор переходит дальше
+ANNOTATION_FRAGMENTS = [WORKSPACE_FRAGMENT, SIDEBAR_STATS_FRAGMENT, EXPORT_FRAGMENT, JUMP_FRAGMENT]
+
+
+def rerun_after_annotation_change():
+    """Перезапускает только фрагменты, зависящие от разметок (вызывается из колбэка виджета)"""
+    st.rerun(ANNOTATION_FRAGMENTS)
+
+
+def rerun_after_navigation():
+    """Перезапускает фрагменты, показывающие текущее изображение (вызывается из колбэка виджета)"""
+    st.rerun(NAVIGATION_FRAGMENTS)
+
+
+def flash(kind, text):
+    """Запоминает сообщение из колбэка, чтобы показать его при следующей отрисовке"""
+    st.session_state.flash_message = (kind, text)
+
+
+def show_flash():
+    """Показывает и сбрасывает сообщение, оставленное колбэком"""
+    message = st.session_state.get('flash_message')
+    if message:
+        kind, text = message
+        getattr(st, kind)(text)
+        st.session_state.flash_message = None
@@ -1,4 +1,6 @@
 import streamlit as st
+from utils.annotations import get_current_annotation, get_annotation_progress
+from .fragments import rerun_after_navigation
 
 
 def render_navigation():
@@ -14,10 +16,10 @@ def render_navigation():
     # Компактная навигация
     col1, col2, col3 = st.columns([1, 2, 1])
 
+    # Переход выполняется в колбэке: перезапускаются только рабочая область и поле перехода
     with col1:
-        if st.button("⬅️ Предыдущее", disabled=(current_idx == 0), use_container_width=True):
-            st.session_state.current_image_index = max(0, current_idx - 1)
-            st.rerun()
+        st.button("⬅️ Предыдущее", disabled=(current_idx == 0), use_container_width=True,
+                  on_click=go_to_image, args=(max(0, current_idx - 1),))
 
     with col2:
         st.markdown(f"**Изображение {current_idx + 1} из {total_images}**")
@@ -26,9 +28,14 @@ def render_navigation():
         st.progress(progress)
 
     with col3:
-        if st.button("➡️ Следующее", disabled=(current_idx == total_images - 1), use_container_width=True):
-            st.session_state.current_image_index = min(total_images - 1, current_idx + 1)
-            st.rerun()
+        st.button("➡️ Следующее", disabled=(current_idx == total_images - 1), use_container_width=True,
+                  on_click=go_to_image, args=(min(total_images - 1, current_idx + 1),))
+
+
+def go_to_image(index):
+    """Колбэк навигации: меняет текущее изображение"""
+    st.session_state.current_image_index = index
+    rerun_after_navigation()
 
 
 def render_annotation_status():
@@ -40,11 +47,7 @@ def render_annotation_status():
     current_filename = st.session_state.images_list[st.session_state.current_image_index]
 
     # Проверяем, есть ли разметка для текущего изображения
-    current_annotation = None
-    for ann in st.session_state.annotations:
-        if ann['filename'] == current_filename:
-            current_annotation = ann
-            break
+    current_annotation = get_current_annotation(current_filename)
 
     if current_annotation:
         st.success("✅ Изображение размечено")
@@ -58,15 +61,12 @@ def get_navigation_stats():
     if not st.session_state.images_list:
         return {}
 
-    total = len(st.session_state.images_list)
-    current = st.session_state.current_image_index + 1
-    annotated = len(st.session_state.annotations)
-    remaining = total - annotated
+    progress = get_annotation_progress()
 
     return {
-        'total': total,
-        'current': current,
-        'annotated': annotated,
-        'remaining': remaining,
-        'progress_percent': (annotated / total) * 100 if total > 0 else 0
+        'total': progress['total'],
+        'current': st.session_state.current_image_index + 1,
+        'annotated': progress['annotated'],
+        'remaining': progress['remaining'],
+        'progress_percent': progress['progress'] * 100
     }
\ No newline at end of file
@@ -0,0 +1,148 @@
+import os
+import streamlit as st
+import streamlit.components.v1 as components
+from utils.annotations import save_annotation, delete_annotation, get_current_annotation
+from .fragments import flash, rerun_after_annotation_change, rerun_after_navigation
+
+
+# Сколько следующих изображений компонент может размечать, не дожидаясь ответа сервера
+LOOKAHEAD = 5
+
+SHORTCUTS_KEY = "keyboard_shortcuts"
+
+_keyboard_shortcuts = components.declare_component(
+    "keyboard_shortcuts",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "shortcuts_frontend")
+)
+
+
+def render_keyboard_shortcuts():
+    """
+    Подключает горячие клавиши разметки. Метки V/N, M/F, 1-5 набираются в браузере,
+    Enter / Ctrl+S отправляет их одним событием - один запрос к серверу на изображение.
+    Значение компонента - очередь неподтвержденных событий, last_event подтверждает обработанные
+    """
+
+    images = st.session_state.images_list
+    if not images:
+        return
+
+    current_idx = st.session_state.current_image_index
+
+    # Текущее и следующие изображения с их разметками: после сохранения компонент
+    # сразу переключается на следующее, пока сервер загружает картинку
+    targets = []
+    for index in range(current_idx, min(current_idx + 1 + LOOKAHEAD, len(images))):
+        annotation = get_current_annotation(images[index])
+        targets.append({
+            'index': index,
+            'filename': images[index],
+            'annotation': {
+                'validity': annotation['validity'],
+                'gender': annotation['gender'],
+                'category': annotation['category']
+            } if annotation else None
+        })
+
+    _keyboard_shortcuts(
+        targets=targets,
+        total=len(images),
+        last_event=st.session_state.get('last_shortcut_event'),
+        key=SHORTCUTS_KEY,
+        default=None,
+        on_change=handle_shortcut_event
+    )
+
+
+def handle_shortcut_event():
+    """
+    Колбэк компонента. Компонент присылает все события, которые сервер еще не подтвердил;
+    применяются по порядку только события новее последнего обработанного
+    """
+
+    events = st.session_state.get(SHORTCUTS_KEY)
+    if not events:
+        return
+
+    last = st.session_state.get('last_shortcut_event')
+    fresh = [
+        event for event in events
+        if last is None or event['instance'] != last['instance'] or event['seq'] > last['seq']
+    ]
+    if not fresh:
+        return
+
+    st.session_state.last_shortcut_event = {'instance': fresh[-1]['instance'], 'seq': fresh[-1]['seq']}
+
+    start_index = st.session_state.current_image_index
+    saved = 0
+    changed = False
+    problem = None
+
+    for event in fresh:
+        result = apply_shortcut_event(event)
+        if result == 'saved':
+            saved += 1
+        if result in ('saved', 'cleared'):
+            changed = True
+        elif result is not None and problem is None:
+            problem = result
+
+    # Одно сообщение на все события: первая проблема важнее отчетов об успехе
+    if problem:
+        flash(*problem)
+    elif saved > 1:
+        flash("success", f"✅ Сохранено разметок: {saved}")
+    elif saved:
+        flash("success", "✅ Разметка сохранена!")
+    elif changed:
+        flash("success", "🗑️ Разметка очищена")
+
+    if changed:
+        rerun_after_annotation_change()
+    elif st.session_state.current_image_index != start_index:
+        rerun_after_navigation()
+
+
+def apply_shortcut_event(event):
+    """
+    Применяет одно действие к тому изображению, для которого оно набрано.
+    Возвращает 'saved', 'cleared', (вид, текст) сообщения о проблеме или None
+    """
+
+    images = st.session_state.images_list
+    index = event.get('index', -1)
+    if not 0 <= index < len(images):
+        return None
+
+    action = event['action']
+
+    if action == 'goto':
+        st.session_state.current_image_index = index
+        return None
+
+    # Список изображений мог смениться, пока событие было в пути
+    filename = event.get('filename')
+    if images[index] != filename:
+        return "warning", "⚠️ Набор изображений изменился - действие клавиатуры пропущено"
+
+    if action == 'save':
+        validity = event['validity']
+        gender = event['gender'] if validity == "Валидно" else ""
+        category = event['category'] if validity == "Валидно" else ""
+
+        if validity == "Валидно" and not gender:
+            return "error", "❌ Выберите хотя бы один пол (М или Ж)"
+
+        if not save_annotation(filename, validity, gender, category, st.session_state.folder_name):
+            return "error", "❌ Ошибка при сохранении разметки"
+
+        # Следующее считается от размеченного изображения, а не от текущего на сервере
+        st.session_state.current_image_index = min(index + 1, len(images) - 1)
+        return 'saved'
+
+    if action == 'clear':
+        delete_annotation(filename)
+        return 'cleared'
+
+    return None
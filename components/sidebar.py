@@ -1,4 +1,17 @@
 import streamlit as st
+from utils.annotations import (
+    clear_all_annotations, get_annotation_stats, get_annotation_progress, unbind_annotations,
+    get_unannotated_count, get_next_unannotated_index, get_previous_unannotated_index
+)
+from utils.dataset_registry import release_session_dataset
+from utils.image_search import get_image_search_index
+from .navigation import go_to_image
+
+
+# Сколько результатов поиска показывать на одной странице
+JUMP_PAGE_SIZE = 20
+# Ключ поля перехода по номеру
+JUMP_NUMBER_KEY = "jump_number"
 
 
 def render_sidebar():
@@ -19,38 +32,25 @@ def render_sidebar():
             st.progress(progress)
 
             # Быстрый переход
-            new_index = st.selectbox(
-                "Перейти к изображению:",
-                range(total_images),
-                index=current_idx,
-                format_func=lambda
-                    x: f"{x + 1}. {st.session_state.images_list[x][:30]}{'...' if len(st.session_state.images_list[x]) > 30 else ''}"
-            )
-
-            if new_index != current_idx:
-                st.session_state.current_image_index = new_index
-                st.rerun()
+            render_jump_control(total_images)
 
         # Статистика разметки
         if st.session_state.images_list:
             st.markdown("---")
             st.header("📊 Статистика")
 
-            total_images = len(st.session_state.images_list)
-            annotated_count = len(st.session_state.annotations)
+            progress = get_annotation_progress()
 
-            st.metric("Всего изображений", total_images)
-            st.metric("Размечено", annotated_count)
+            st.metric("Всего изображений", progress['total'])
+            st.metric("Размечено", progress['annotated'])
 
-            if total_images > 0:
-                progress = annotated_count / total_images
-                st.progress(progress)
-                st.caption(f"{progress * 100:.1f}% завершено")
+            if progress['total'] > 0:
+                st.progress(progress['progress'])
+                st.caption(f"{progress['progress'] * 100:.1f}% завершено")
 
             # Показываем статистику по категориям
             if st.session_state.annotations:
                 with st.expander("📈 Детальная статистика"):
-                    from utils.annotations import get_annotation_stats
                     stats = get_annotation_stats()
 
                     col1, col2 = st.columns(2)
@@ -75,37 +75,32 @@ def render_sidebar():
             st.markdown("---")
             st.header("⚡ Быстрые действия")
 
-            # Переход к следующему неразмеченному
-            unannotated_files = get_unannotated_files()
-            if unannotated_files:
-                if st.button("➡️ К неразмеченному", use_container_width=True):
-                    next_idx = get_next_unannotated_index()
-                    if next_idx is not None:
-                        st.session_state.current_image_index = next_idx
-                        st.rerun()
-
-                st.caption(f"Осталось: {len(unannotated_files)} изображений")
-            else:
-                st.success("✅ Все изображения размечены!")
+            # Переход к соседним неразмеченным
+            render_unannotated_navigation()
 
             # Очистка данных
             if st.button("🗑️ Очистить всё", use_container_width=True):
                 if st.session_state.annotations:
-                    st.session_state.annotations = []
+                    clear_all_annotations()
                     st.success("Разметки очищены")
                     st.rerun()
 
             # Перезагрузка
             if st.button("🔄 Новый архив", use_container_width=True):
-                # Очищаем все данные для загрузки нового архива
-                for key in ['images_list', 'image_paths', 'annotations', 'folder_name', 'current_image_index']:
+                # Очищаем все данные для загрузки нового архива (сохраненные разметки остаются в базе)
+                unbind_annotations()
+                clear_all_annotations()
+                release_session_dataset(st.session_state)
+                if st.session_state.get('prefetcher') is not None:
+                    st.session_state.prefetcher.cancel()
+                for key in ['images_list', 'image_catalog', 'folder_name', 'current_image_index']:
                     if key in st.session_state:
                         if key == 'current_image_index':
                             st.session_state[key] = 0
-                        elif key in ['images_list', 'annotations']:
+                        elif key in ['images_list']:
                             st.session_state[key] = []
-                        elif key in ['image_paths']:
-                            st.session_state[key] = {}
+                        elif key in ['image_catalog']:
+                            st.session_state[key] = None
                         else:
                             st.session_state[key] = ""
                 st.rerun()
@@ -125,6 +120,8 @@ def render_sidebar():
             - `N` - Невалидно
             - `M` - Мужской
             - `F` - Женский
+            - `1`-`5` - Категория
+            - `Enter` - Сохранить и перейти к следующему
             """)
 
         with st.expander("📋 Формат CSV"):
@@ -144,36 +141,82 @@ def render_sidebar():
             """)
 
 
-def get_unannotated_files():
-    """Возвращает список неразмеченных файлов"""
-    if not st.session_state.images_list:
-        return []
+def render_unannotated_navigation():
+    """Кнопки перехода к соседним неразмеченным изображениям и счетчик оставшихся"""
 
-    annotated_files = {ann['filename'] for ann in st.session_state.annotations}
+    remaining = get_unannotated_count()
+    if not remaining:
+        st.success("✅ Все изображения размечены!")
+        return
 
-    return [
-        filename for filename in st.session_state.images_list
-        if filename not in annotated_files
-    ]
+    col1, col2 = st.columns(2)
+
+    with col1:
+        if st.button("⬅️ Неразмеченное", use_container_width=True):
+            prev_idx = get_previous_unannotated_index()
+            if prev_idx is not None:
+                st.session_state.current_image_index = prev_idx
+                st.rerun()
+
+    with col2:
+        if st.button("➡️ К неразмеченному", use_container_width=True):
+            next_idx = get_next_unannotated_index()
+            if next_idx is not None:
+                st.session_state.current_image_index = next_idx
+                st.rerun()
 
+    st.caption(f"Осталось: {remaining} изображений")
 
-def get_next_unannotated_index():
-    """Возвращает индекс следующего неразмеченного файла"""
-    unannotated_files = get_unannotated_files()
 
-    if not unannotated_files:
-        return None
+def render_jump_control(total_images):
+    """
+    Переход к изображению по номеру или по поиску имени файла.
+    Результаты поиска показываются страницами, в браузер уходит только текущая страница
+    """
 
-    # Ищем первый неразмеченный файл после текущего
     current_idx = st.session_state.current_image_index
 
-    for i in range(current_idx + 1, len(st.session_state.images_list)):
-        if st.session_state.images_list[i] in unannotated_files:
-            return i
+    # Поле хранит номер в session state и сверяется с текущим изображением при каждой отрисовке,
+    # поэтому введенный номер всегда сравнивается с актуальной позицией
+    if st.session_state.get(JUMP_NUMBER_KEY) != current_idx + 1:
+        st.session_state[JUMP_NUMBER_KEY] = current_idx + 1
+
+    st.number_input(
+        "Перейти к изображению №:",
+        min_value=1,
+        max_value=total_images,
+        step=1,
+        key=JUMP_NUMBER_KEY,
+        on_change=jump_to_number
+    )
+
+    query = st.text_input("🔍 Поиск по имени файла:", key="jump_query")
+    if not query:
+        return
+
+    substring = st.toggle("Искать в любой части имени", key="jump_substring")
+
+    index = get_image_search_index(st.session_state)
+    ranks = index.search(query, substring=substring)
+
+    if not len(ranks):
+        st.caption("Ничего не найдено")
+        return
+
+    pages = -(-len(ranks) // JUMP_PAGE_SIZE)
+    page = 0
+    if pages > 1:
+        page = st.number_input(f"Страница (всего {pages}):", min_value=1, max_value=pages, value=1, key=f"jump_page_{substring}_{query}") - 1
+
+    st.caption(f"Найдено: {len(ranks)}")
+
+    for position, filename in index.page(ranks, page, JUMP_PAGE_SIZE):
+        label = f"{position + 1}. {filename[:30]}{'...' if len(filename) > 30 else ''}"
+        st.button(label, key=f"jump_{position}", use_container_width=True, disabled=position == current_idx,
+                  on_click=go_to_image, args=(position,))
+
 
-    # Если не найден после текущего, ищем с начала
-    for i in range(current_idx):
-        if st.session_state.images_list[i] in unannotated_files:
-            return i
+def jump_to_number():
+    """Колбэк поля перехода по номеру"""
+    go_to_image(st.session_state[JUMP_NUMBER_KEY] - 1)
 
-    return None
\ No newline at end of file
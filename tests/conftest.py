@@ -0,0 +1,174 @@
+import hashlib
+import json
+import re
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import pytest
+
+
+class FakeDrive:
+    """
+    Локальная замена Google Drive для тестов: Drive API с постраничной выдачей, страница папки
+    и embeddedfolderview (отвечают ETag и 304 на условные запросы), а также скачивание файлов
+    через страницу подтверждения /uc -> /download с поддержкой Range
+    """
+
+    def __init__(self, files, folder_page_size=2, contents=None):
+        # Пары (id, имя) в порядке папки
+        self.files = list(files)
+        # Сколько записей с id отдает страница папки; остальные имена на ней без id
+        self.folder_page_size = folder_page_size
+        # Содержимое файлов для скачивания: id -> байты
+        self.contents = dict(contents or {})
+        # Отвечает ли сервер на Range-запросы частью файла
+        self.accept_ranges = True
+        # id -> сколько следующих передач файла оборвать на середине
+        self.drop = {}
+        # id -> задержка ответа с файлом в секундах (зависшее соединение)
+        self.delay = {}
+        # Путь -> код ответа, которым сервер отвечает вместо списка
+        self.status = {}
+        self.requests = []
+        # Заголовки Range запросов к /download (None - запрос без Range)
+        self.range_headers = []
+        self._lock = threading.Lock()
+
+        drive = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                drive.handle(self)
+
+        class Server(ThreadingHTTPServer):
+            def handle_error(self, request, client_address):
+                # Клиент закрыл соединение, не дочитав ответ (resolve, обрыв загрузки)
+                pass
+
+        self._server = Server(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def handle(self, handler):
+        url = urlparse(handler.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.requests.append((url.path, query))
+
+        status = self.status.get(url.path)
+        if status:
+            return self.send(handler, '', status=status)
+
+        if url.path == '/api':
+            start = int(query.get('pageToken', 0))
+            size = int(query['pageSize'])
+            page = {'files': [
+                {'id': file_id, 'name': name, 'mimeType': 'image/jpeg' if name.endswith('.jpg') else 'text/plain'}
+                for file_id, name in self.files[start:start + size]
+            ]}
+            if start + size < len(self.files):
+                page['nextPageToken'] = str(start + size)
+            return self.send(handler, json.dumps(page))
+
+        if url.path.startswith('/drive/folders/'):
+            entries = [
+                f'<div data-id="{file_id}" title="{name}"></div>' if position < self.folder_page_size
+                else f'<div title="{name}"></div>'
+                for position, (file_id, name) in enumerate(self.files)
+            ]
+            return self.send(handler, '<html>' + ''.join(entries) + '</html>')
+
+        if url.path == '/embeddedfolderview':
+            entries = [
+                f'<div class="flip-entry" id="entry-{file_id}"><div class="flip-entry-title">{name}</div></div>'
+                for file_id, name in self.files
+            ]
+            return self.send(handler, ''.join(entries))
+
+        if url.path in ('/uc', '/download') and query.get('id') in self.contents:
+            if url.path == '/uc':
+                # Страница предупреждения о проверке на вирусы с формой подтверждения
+                return self.send(handler, (
+                    '<html><form id="download-form" action="/download" method="get">'
+                    f'<input type="hidden" name="id" value="{query["id"]}">'
+                    '<input type="hidden" name="confirm" value="t"></form></html>'
+                ), content_type='text/html; charset=utf-8')
+            return self.send_file(handler, query['id'])
+
+        self.send(handler, '', status=404)
+
+    def send_file(self, handler, file_id):
+        data = self.contents[file_id]
+        header = handler.headers.get('Range')
+        with self._lock:
+            self.range_headers.append(header)
+            drop = self.drop.get(file_id, 0) > 0
+            if drop:
+                self.drop[file_id] -= 1
+        time.sleep(self.delay.get(file_id, 0))
+
+        start, end, status = 0, len(data) - 1, 200
+        match = re.match(r'bytes=(\d+)-(\d*)$', header or '')
+        if match and self.accept_ranges:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), end) if match.group(2) else end
+            status = 206
+
+        body = data[start:end + 1]
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/octet-stream')
+        handler.send_header('Content-Length', str(len(body)))
+        if self.accept_ranges:
+            handler.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            handler.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        handler.end_headers()
+
+        if drop:
+            # Обрыв соединения посреди передачи
+            handler.wfile.write(body[:len(body) // 2])
+            handler.wfile.flush()
+            handler.close_connection = True
+            handler.connection.shutdown(socket.SHUT_RDWR)
+            return
+        handler.wfile.write(body)
+
+    def send(self, handler, body, status=200, content_type=None):
+        data = body.encode('utf-8')
+        etag = '"' + hashlib.sha256(data).hexdigest()[:16] + '"'
+
+        if status == 200 and handler.headers.get('If-None-Match') == etag:
+            status, data = 304, b''
+
+        handler.send_response(status)
+        if content_type:
+            handler.send_header('Content-Type', content_type)
+        if status in (200, 304):
+            handler.send_header('ETag', etag)
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def paths(self):
+        return [path for path, _ in self.requests]
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def make_files(count):
+    return [(f"1{index:04d}abcdefghijklmnopqrstuvwxyz", f"img_{index:04d}.jpg") for index in range(count)]
+
+
+@pytest.fixture
+def drive():
+    server = FakeDrive(make_files(7))
+    yield server
+    server.close()
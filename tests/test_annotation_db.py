@@ -0,0 +1,91 @@
+import threading
+from utils.annotation_db import AnnotationDatabase
+
+
+class SlowFirstWrite(AnnotationDatabase):
+    """База, в которой первая запись зависает, пока идет вторая запись"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.first_started = threading.Event()
+        self.release_first = threading.Event()
+        self._writes = 0
+
+    def _write(self, pending, cursors):
+        self._writes += 1
+        if self._writes == 1:
+            self.first_started.set()
+            self.release_first.wait(1)
+        super()._write(pending, cursors)
+
+
+def make_annotation(filename, validity):
+    return {
+        'img_path': f"folder/{filename}",
+        'filename': filename,
+        'validity': validity,
+        'gender': 'М',
+        'category': 'верх',
+        'folder': 'folder',
+        'notes': ''
+    }
+
+
+def test_concurrent_flushes_keep_newest_annotation(tmp_path):
+    # Фоновый поток не должен сбрасывать изменения сам
+    database = SlowFirstWrite(str(tmp_path / 'annotations.db'), flush_interval=60)
+
+    database.save('set', make_annotation('a.jpg', 'Валидно'))
+    background = threading.Thread(target=database.flush)
+    background.start()
+    assert database.first_started.wait(5)
+
+    # Пока старая пачка записывается, сессия сохраняет новую разметку и сбрасывает ее сама
+    database.save('set', make_annotation('a.jpg', 'Невалидно'))
+    session = threading.Thread(target=database.flush)
+    session.start()
+    session.join(0.3)
+    database.release_first.set()
+    session.join()
+    background.join()
+
+    assert [row['validity'] for row in database.load('set')] == ['Невалидно']
+    database.close()
+
+
+def test_flush_persists_cursor_and_deletes(tmp_path):
+    database = AnnotationDatabase(str(tmp_path / 'annotations.db'), flush_interval=60)
+
+    database.save('set', make_annotation('a.jpg', 'Валидно'))
+    database.save('set', make_annotation('b.jpg', 'Валидно'))
+    database.delete('set', 'a.jpg')
+    database.save_cursor('set', 7)
+    database.close()
+
+    reopened = AnnotationDatabase(str(tmp_path / 'annotations.db'), flush_interval=60)
+    assert [row['filename'] for row in reopened.load('set')] == ['b.jpg']
+    assert reopened.load_cursor('set') == 7
+    reopened.close()
+
+
+def test_adopt_moves_legacy_keys_keeping_newest(tmp_path):
+    database = AnnotationDatabase(str(tmp_path / 'annotations.db'), flush_interval=60)
+
+    # Разметки под ключами кэша старых версий: архив другого размера и архив без размера
+    database.save('FILE-100', make_annotation('a.jpg', 'Валидно'))
+    database.save('FILE-100', make_annotation('b.jpg', 'Валидно'))
+    database.save_cursor('FILE-100', 4)
+    database.flush()
+    database.save('FILE-unknown-1', make_annotation('a.jpg', 'Невалидно'))
+    database.save('OTHER-100', make_annotation('c.jpg', 'Валидно'))
+
+    assert database.adopt('zip-FILE', 'FILE-') == 2
+    rows = {row['filename']: row['validity'] for row in database.load('zip-FILE')}
+    assert rows == {'a.jpg': 'Невалидно', 'b.jpg': 'Валидно'}
+    assert database.load_cursor('zip-FILE') == 4
+    assert database.load('FILE-100') == [] and database.load('FILE-unknown-1') == []
+    assert len(database.load('OTHER-100')) == 1
+
+    # Повторный перенос ничего не меняет
+    assert database.adopt('zip-FILE', 'FILE-') == 0
+    database.close()
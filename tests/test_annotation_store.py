@@ -0,0 +1,74 @@
+from collections import Counter
+import pytest
+from utils.annotation_store import AnnotationStore
+
+
+class Recorder:
+    def __init__(self):
+        self.upserts = []
+
+    def on_upsert(self, old, new):
+        self.upserts.append(new['filename'])
+
+
+def make_annotation(filename, category='верх'):
+    return {
+        'img_path': f"folder/{filename}",
+        'filename': filename,
+        'validity': 'Валидно',
+        'gender': 'М',
+        'category': category,
+        'folder': 'folder',
+        'notes': ''
+    }
+
+
+def test_bulk_upsert_rejects_whole_batch_on_bad_value():
+    store = AnnotationStore(images=['a.jpg', 'b.jpg', 'c.jpg'])
+    recorder = Recorder()
+    store.add_listener(recorder)
+    version, table_version = store.version, store.table.version
+
+    with pytest.raises(ValueError):
+        store.bulk_upsert([make_annotation('a.jpg'), make_annotation('b.jpg', category='шапка')])
+
+    assert len(store) == 0
+    assert store.get('a.jpg') is None
+    assert (store.version, store.table.version) == (version, table_version)
+    assert recorder.upserts == []
+
+    assert store.bulk_upsert([make_annotation('a.jpg'), make_annotation('c.jpg')]) == 2
+    assert [row['filename'] for row in store] == ['a.jpg', 'c.jpg']
+
+
+def test_stats_follow_every_change():
+    store = AnnotationStore(images=['a.jpg', 'b.jpg', 'c.jpg'])
+
+    def recount():
+        rows = list(store)
+        return (
+            Counter(row['validity'] for row in rows),
+            Counter(row['gender'] for row in rows),
+            Counter(row['category'] for row in rows),
+            Counter((row['category'], row['gender'], row['validity']) for row in rows),
+        )
+
+    def current():
+        stats = store.stats
+        return stats.by_validity, stats.by_gender, stats.by_category, stats.crosstab
+
+    store.upsert(make_annotation('a.jpg'))
+    store.bulk_upsert([make_annotation('b.jpg', category='низ'), make_annotation('a.jpg', category='обувь')])
+    assert current() == recount()
+    assert store.stats.by_category == {'низ': 1, 'обувь': 1}
+
+    store.upsert({**make_annotation('c.jpg'), 'validity': 'Невалидно', 'gender': '', 'category': ''})
+    store.delete('b.jpg')
+    assert current() == recount()
+    assert (store.stats.total, store.stats.valid, store.stats.invalid) == (2, 1, 1)
+
+    store.bind_images(['c.jpg', 'a.jpg'])
+    assert current() == recount()
+
+    store.clear()
+    assert current() == (Counter(), Counter(), Counter(), Counter())
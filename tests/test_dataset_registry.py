@@ -0,0 +1,52 @@
+import os
+from utils.dataset_cache import DatasetCache
+from utils.dataset_registry import DatasetRegistry
+from utils.image_catalog import ImageCatalog
+
+
+class FakeSource:
+    """Источник без изображений: проверка целостности заканчивается сразу"""
+
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def load_into(cache, key):
+    def loader(report):
+        os.makedirs(cache.entry_dir(key), exist_ok=True)
+        return ImageCatalog([]), FakeSource()
+    return loader
+
+
+def test_private_entry_removed_after_last_release(tmp_path):
+    cache = DatasetCache(str(tmp_path), quota=1 << 30)
+    registry = DatasetRegistry(cache)
+
+    key = cache.make_private_key('file')
+    assert key != cache.make_private_key('file')
+
+    first = registry.attach(key, load_into(cache, key))
+    second = registry.attach(key, load_into(cache, key))
+    first.release()
+    assert os.path.isdir(cache.entry_dir(key))
+
+    second.release()
+    assert second.dataset.source.closed
+    assert not os.path.exists(cache.entry_dir(key))
+
+
+def test_shared_entry_kept_and_stale_private_entries_collected(tmp_path):
+    cache = DatasetCache(str(tmp_path), quota=1 << 30)
+    registry = DatasetRegistry(cache)
+
+    key = cache.make_key('file', 100)
+    registry.attach(key, load_into(cache, key)).release()
+    assert os.path.isdir(cache.entry_dir(key))
+
+    # Разовая запись, оставшаяся после аварийной остановки
+    leftover = cache.make_private_key('file')
+    os.makedirs(cache.entry_dir(leftover))
+    cache.collect_garbage()
+    assert not os.path.exists(cache.entry_dir(leftover))
@@ -0,0 +1,109 @@
+import os
+import pytest
+from utils.downloader import Downloader, DownloadError
+from conftest import FakeDrive
+
+
+FILE_ID = 'ARCHIVE'
+CONTENT = os.urandom(300 * 1024)
+
+
+@pytest.fixture
+def server():
+    drive = FakeDrive([], contents={FILE_ID: CONTENT})
+    yield drive
+    drive.close()
+
+
+def download_url(server):
+    return f"{server.url}/uc?export=download&id={FILE_ID}"
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_confirm_page_is_followed(server, tmp_path):
+    downloader = Downloader(connections=1)
+
+    final_url, total, ranges = downloader.resolve(download_url(server))
+    assert '/download?' in final_url and 'confirm=t' in final_url
+    assert (total, ranges) == (len(CONTENT), True)
+
+    dest = downloader.download(download_url(server), str(tmp_path / 'archive.zip'))
+    assert read(dest) == CONTENT
+    assert os.listdir(tmp_path) == ['archive.zip']
+
+
+def test_interrupted_transfer_resumes_with_range(server, tmp_path):
+    dest = str(tmp_path / 'archive.zip')
+    downloader = Downloader(connections=1, chunk_size=16 * 1024, max_retries=0)
+    resolved = downloader.resolve(download_url(server))
+
+    server.drop[FILE_ID] = 1
+    server.range_headers.clear()
+    with pytest.raises(DownloadError):
+        downloader.download(download_url(server), dest, resolved=resolved)
+    kept = os.path.getsize(f"{dest}.part")
+    assert 0 < kept < len(CONTENT)
+
+    downloader.download(download_url(server), dest, resolved=resolved)
+    assert read(dest) == CONTENT
+    assert server.range_headers == [None, f"bytes={kept}-"]
+
+
+def test_parallel_parts_are_stitched_byte_exact(server, tmp_path, monkeypatch):
+    dest = str(tmp_path / 'archive.zip')
+    downloader = Downloader(connections=4, chunk_size=8 * 1024, parallel_min_size=0)
+    resolved = downloader.resolve(download_url(server))
+
+    saves = []
+    save_state = Downloader._save_state
+    monkeypatch.setattr(Downloader, '_save_state', staticmethod(lambda *args: saves.append(save_state(*args))))
+
+    server.range_headers.clear()
+    downloader.download(download_url(server), dest, resolved=resolved)
+
+    assert read(dest) == CONTENT
+    # Прогресс частей не пишется на диск после каждого блока
+    assert 1 <= len(saves) < len(CONTENT) // (8 * 1024) // 4
+    # Части по len / (соединения * 4) байт, каждая своим Range-запросом
+    assert len(server.range_headers) == 16
+    assert all(header.startswith('bytes=') for header in server.range_headers)
+
+
+def test_interrupted_parallel_download_resumes_from_saved_parts(server, tmp_path):
+    dest = str(tmp_path / 'archive.zip')
+    downloader = Downloader(connections=4, chunk_size=8 * 1024, parallel_min_size=0, max_retries=0)
+    resolved = downloader.resolve(download_url(server))
+
+    server.drop[FILE_ID] = 1
+    with pytest.raises(DownloadError):
+        downloader.download(download_url(server), dest, resolved=resolved)
+    assert os.path.exists(f"{dest}.part.json")
+
+    server.range_headers.clear()
+    downloader.download(download_url(server), dest, resolved=resolved)
+    assert read(dest) == CONTENT
+    assert not os.path.exists(f"{dest}.part.json")
+    # Докачиваются только недостающие байты частей
+    requested = 0
+    for header in server.range_headers:
+        start, end = header[len('bytes='):].split('-')
+        requested += int(end) - int(start) + 1
+    assert requested < len(CONTENT)
+
+
+def test_server_ignoring_range_restarts_from_scratch(server, tmp_path):
+    dest = str(tmp_path / 'archive.zip')
+    server.accept_ranges = False
+    # Остаток прошлой загрузки, который нельзя продолжить
+    with open(f"{dest}.part", 'wb') as f:
+        f.write(b'stale' * 1000)
+
+    downloader = Downloader(connections=4, parallel_min_size=0)
+    assert downloader.resolve(download_url(server))[1:] == (len(CONTENT), False)
+
+    downloader.download(download_url(server), dest)
+    assert read(dest) == CONTENT
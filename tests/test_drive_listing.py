@@ -0,0 +1,74 @@
+import pytest
+from utils.drive_listing import DriveListingClient, DriveListingError
+from conftest import FakeDrive, make_files
+
+
+def api_client(drive, page_size=3):
+    return DriveListingClient(api_key='key', api_url=f"{drive.url}/api", web_url=drive.url, page_size=page_size)
+
+
+def web_client(drive):
+    return DriveListingClient(api_key='', web_url=drive.url)
+
+
+def test_api_reads_every_page():
+    drive = FakeDrive(make_files(7) + [('1zzzzabcdefghijklmnopqrstuvwxyz', 'notes.txt')])
+    client = api_client(drive)
+
+    files = client.list_files('FOLDER')
+
+    assert [entry['filename'] for entry in files] == [name for _, name in make_files(7)]
+    assert all(entry['file_id'] for entry in files)
+    # 8 записей по 3 на страницу - три запроса, токен следующей страницы передается дальше
+    tokens = [query.get('pageToken') for path, query in drive.requests if path == '/api']
+    assert tokens == [None, '3', '6']
+    assert "'FOLDER' in parents" in drive.requests[0][1]['q']
+    drive.close()
+
+
+def test_api_pages_are_streamed(drive):
+    files = api_client(drive).iter_files('FOLDER')
+
+    assert next(files)['filename'] == 'img_0000.jpg'
+    # Следующая страница запрашивается, только когда первая отдана целиком
+    assert drive.paths() == ['/api']
+    assert len(list(files)) == 6
+    assert drive.paths() == ['/api'] * 3
+
+
+def test_web_fallback_merges_embedded_listing(drive):
+    files = web_client(drive).list_files('FOLDER')
+
+    # Первые записи со страницы папки уже с id, остальные id берутся из embeddedfolderview
+    assert [(entry['file_id'], entry['filename']) for entry in files] == make_files(7)
+    assert drive.paths() == ['/drive/folders/FOLDER', '/embeddedfolderview']
+    assert drive.requests[1][1] == {'id': 'FOLDER'}
+
+
+def test_web_fallback_keeps_files_with_same_name():
+    files = make_files(4)
+    # Разные файлы с одинаковыми именами: один на странице папки с id, другой только в embeddedfolderview
+    files[3] = (files[3][0], files[0][1])
+    drive = FakeDrive(files)
+    try:
+        listed = web_client(drive).list_files('FOLDER')
+    finally:
+        drive.close()
+
+    assert sorted((entry['file_id'], entry['filename']) for entry in listed) == sorted(files)
+
+
+def test_web_fallback_keeps_names_without_embedded_listing(drive):
+    drive.status['/embeddedfolderview'] = 404
+
+    files = web_client(drive).list_files('FOLDER')
+
+    assert [entry['filename'] for entry in files] == [name for _, name in make_files(7)]
+    assert [entry['file_id'] is not None for entry in files] == [True, True] + [False] * 5
+
+
+def test_http_error_is_reported(drive):
+    drive.status['/drive/folders/FOLDER'] = 404
+
+    with pytest.raises(DriveListingError, match='404'):
+        web_client(drive).list_files('FOLDER')
@@ -0,0 +1,94 @@
+import io
+import os
+import time
+import pytest
+from PIL import Image
+from utils.folder_source import FolderImageSource, ImageNotReady, SkippedImage
+from conftest import FakeDrive
+
+
+def jpeg(size):
+    buffer = io.BytesIO()
+    Image.new('RGB', (size, size), (200, 0, 0)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+FILES = {
+    'a.jpg': ('ID_A', jpeg(100)),
+    'b.jpg': ('ID_B', jpeg(120)),
+    'tiny.jpg': ('ID_TINY', jpeg(20)),
+    'broken.jpg': ('ID_BROKEN', b'not an image'),
+}
+
+
+@pytest.fixture
+def server(monkeypatch):
+    drive = FakeDrive([], contents={file_id: data for file_id, data in FILES.values()})
+    monkeypatch.setattr('utils.downloader.DRIVE_DOWNLOAD_URL', drive.url + '/uc?export=download&id={file_id}')
+    yield drive
+    drive.close()
+
+
+def make_source(tmp_path, **kwargs):
+    return FolderImageSource(
+        [(name, file_id) for name, (file_id, _) in FILES.items()], str(tmp_path / 'folder'), **kwargs
+    )
+
+
+def wait_done(source, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not source.done and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert source.done
+
+
+def test_downloads_and_skips_bad_images(server, tmp_path):
+    source = make_source(tmp_path)
+    wait_done(source)
+
+    assert source.read('a.jpg') == FILES['a.jpg'][1]
+    assert source.is_ready('b.jpg')
+    assert sorted(source.progress()[2]) == ['broken.jpg', 'tiny.jpg']
+    with pytest.raises(SkippedImage):
+        source.read('tiny.jpg')
+    with pytest.raises(SkippedImage):
+        source.read('broken.jpg')
+
+    # В кэше только проверенные файлы, без временных; поврежденный удален
+    assert sorted(os.listdir(tmp_path / 'folder')) == ['ID_A', 'ID_B', 'ID_TINY']
+    source.close()
+
+
+def test_close_does_not_wait_for_hung_download(server, tmp_path):
+    server.delay['ID_A'] = 1
+    source = make_source(tmp_path, workers=1)
+    with pytest.raises(ImageNotReady):
+        source.read('a.jpg', timeout=0.2)
+
+    started = time.monotonic()
+    source.close(timeout=0.3)
+    assert time.monotonic() - started < 1
+
+    with pytest.raises(ValueError):
+        source.read('a.jpg')
+
+    # Зависшее скачивание завершается в фоне и ничего не оставляет в кэше
+    time.sleep(1.5)
+    assert os.listdir(tmp_path / 'folder') == []
+
+
+def test_background_downloads_stop_when_over_quota(server, tmp_path, monkeypatch):
+    monkeypatch.setattr('utils.folder_source.QUOTA_CHECK_BYTES', 1)
+    checks = []
+    source = make_source(tmp_path, workers=1, check_quota=lambda: checks.append(1) and False)
+
+    source.wait('a.jpg')
+    assert checks and source.over_quota
+    time.sleep(0.5)
+    assert not source.is_ready('b.jpg')
+
+    # Открываемое изображение по-прежнему скачивается
+    source.wait('b.jpg', timeout=5)
+    assert source.is_ready('b.jpg')
+    assert source.progress()[0] == 2
+    source.close()
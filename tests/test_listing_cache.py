@@ -0,0 +1,56 @@
+import os
+import time
+import pytest
+from utils.drive_listing import DriveListingClient, DriveListingError, make_session
+from utils.listing_cache import ListingCache
+
+
+def cached_client(drive, cache_dir):
+    # Без повторов: недоступный сервер не должен задерживать тест
+    return DriveListingClient(
+        session=make_session(max_retries=0), api_key='', web_url=drive.url,
+        page_cache=ListingCache(str(cache_dir))
+    )
+
+
+def test_unchanged_pages_are_revalidated_not_parsed(drive, tmp_path):
+    first = cached_client(drive, tmp_path).list_files('FOLDER')
+
+    client = cached_client(drive, tmp_path)
+    assert client.list_files('FOLDER') == first
+    assert client.page_cache.stats()['not_modified'] == 2
+
+
+def test_http_error_is_not_hidden_by_cache(drive, tmp_path):
+    cached_client(drive, tmp_path).list_files('FOLDER')
+
+    # Папку удалили или закрыли - сохраненный список показывать нельзя
+    drive.status['/drive/folders/FOLDER'] = 404
+    client = cached_client(drive, tmp_path)
+    with pytest.raises(DriveListingError, match='404'):
+        client.list_files('FOLDER')
+    assert client.page_cache.stats()['hits'] == 0
+
+
+def test_network_failure_serves_saved_listing(drive, tmp_path):
+    first = cached_client(drive, tmp_path).list_files('FOLDER')
+
+    drive.close()
+    client = cached_client(drive, tmp_path)
+    assert client.list_files('FOLDER') == first
+    assert client.page_cache.stats()['stale'] == 2
+
+
+def test_garbage_collection_prunes_old_and_excess_entries(tmp_path):
+    cache = ListingCache(str(tmp_path))
+    now = time.time()
+    for index in range(5):
+        key = cache.make_key('url', {'pageToken': str(index)})
+        cache.store(key, {'data': index})
+        # Запись index использовалась index дней назад
+        os.utime(cache._path(key), (now - index * 86400, now - index * 86400))
+
+    cache.collect_garbage(max_entries=2, max_age=3.5 * 86400)
+
+    kept = [index for index in range(5) if cache.load(cache.make_key('url', {'pageToken': str(index)}))]
+    assert kept == [0, 1]
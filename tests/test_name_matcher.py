@@ -0,0 +1,32 @@
+import pandas as pd
+from utils.image_catalog import NameMatcher
+
+
+NAMES = ['tops/a.jpg', 'shoes/a.jpg', 'shoes/b.jpg', 'c.jpg']
+
+
+def test_longest_catalog_suffix_wins():
+    matcher = NameMatcher(NAMES)
+
+    # Папка набора со '/' в названии
+    assert matcher.match('юбки/лето/shoes/a.jpg') == 'shoes/a.jpg'
+    assert matcher.match('юбки/лето/c.jpg') == 'c.jpg'
+    assert matcher.match('tops/a.jpg') == 'tops/a.jpg'
+
+
+def test_basename_only_when_unique():
+    matcher = NameMatcher(NAMES)
+
+    assert matcher.match('b.jpg') == 'shoes/b.jpg'
+    assert matcher.match('folder/b.jpg') == 'shoes/b.jpg'
+    assert matcher.match('a.jpg') is None
+    assert matcher.match('missing.jpg') is None
+    assert matcher.match('') is None
+
+
+def test_match_all_keeps_unmatched_as_missing():
+    matcher = NameMatcher(NAMES)
+    matched = matcher.match_all(pd.Series(['x/y/c.jpg', 'x/a.jpg', 'x/c.jpg']))
+    assert matched.tolist()[0] == 'c.jpg'
+    assert pd.isna(matched.tolist()[1])
+    assert matched.tolist()[2] == 'c.jpg'
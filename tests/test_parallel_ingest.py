@@ -0,0 +1,49 @@
+import multiprocessing
+import os
+import signal
+import time
+import zipfile
+import pytest
+from utils import parallel_ingest
+
+
+def fake_check(source, member, min_size):
+    if member.startswith('hang'):
+        # Зависание, которое не прерывается таймером изображения
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+        time.sleep(60)
+    if member.startswith('crash'):
+        os._exit(1)
+    return True, None
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    path = tmp_path / 'images.zip'
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr('a.jpg', b'jpeg')
+
+    # fork переносит подмененную проверку в рабочие процессы
+    monkeypatch.setattr(parallel_ingest, '_context', multiprocessing.get_context('fork'))
+    monkeypatch.setattr(parallel_ingest, 'check_member', fake_check)
+    monkeypatch.setattr(parallel_ingest, 'STALL_SLACK', 0.5)
+    return str(path)
+
+
+@pytest.mark.parametrize('bad, error', [
+    ('hang.jpg', "Превышено время проверки изображения"),
+    ('crash.jpg', "Процесс проверки изображения завершился аварийно"),
+])
+def test_only_offending_image_fails(archive, bad, error):
+    members = [f'img{i:03d}.jpg' for i in range(40)]
+    members[13] = bad
+
+    start = time.monotonic()
+    results = parallel_ingest.validate_members(
+        archive, members, workers=2, chunk_size=16, timeout=0.2, min_parallel=0
+    )
+
+    assert time.monotonic() - start < 10
+    assert [member for member, _, _ in results] == members
+    assert [(accepted, message) for member, accepted, message in results if member == bad] == [(False, error)]
+    assert all(accepted for member, accepted, _ in results if member != bad)
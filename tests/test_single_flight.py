@@ -0,0 +1,109 @@
+import threading
+import pytest
+from streamlit.runtime.scriptrunner_utils.exceptions import StopException
+from utils.single_flight import SingleFlight
+
+
+def start(target, count):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def run_with_followers(flights, job, call, followers):
+    """
+    Запускает ведущего, а после входа в job - ожидающих. job держит ведущего внутри задачи,
+    пока все ожидающие не получат его прогресс (barrier)
+    """
+
+    leader_started = threading.Event()
+
+    def leader_job(flight):
+        leader_started.set()
+        return job(flight)
+
+    leader = threading.Thread(target=lambda: call(leader_job))
+    leader.start()
+    assert leader_started.wait(5)
+
+    threads = [leader] + start(lambda: call(job), followers)
+    for thread in threads:
+        thread.join(10)
+        assert not thread.is_alive()
+
+
+def test_concurrent_calls_share_one_run():
+    flights = SingleFlight()
+    barrier = threading.Barrier(4)
+    runs = []
+    results = []
+
+    def job(flight):
+        runs.append(1)
+        flight.report(None, 'loading')
+        barrier.wait(5)
+        return 'done'
+
+    def call(fn):
+        results.append(flights.run('key', fn, on_wait=lambda fraction, text: barrier.wait(5)))
+
+    run_with_followers(flights, job, call, 3)
+
+    assert runs == [1]
+    assert results == ['done'] * 4
+    assert not flights.in_flight('key')
+
+
+def test_waiters_get_leader_error_and_progress():
+    flights = SingleFlight()
+    barrier = threading.Barrier(3)
+    errors = []
+    progress = []
+
+    def job(flight):
+        flight.report(0.5, 'half')
+        barrier.wait(5)
+        raise ValueError('boom')
+
+    def on_wait(fraction, text):
+        progress.append((fraction, text))
+        barrier.wait(5)
+
+    def call(fn):
+        try:
+            flights.run('key', fn, on_wait=on_wait)
+        except ValueError as e:
+            errors.append(str(e))
+
+    run_with_followers(flights, job, call, 2)
+
+    assert errors == ['boom'] * 3
+    assert progress == [(0.5, 'half')] * 2
+
+
+def test_waiter_takes_over_when_leader_session_stops():
+    flights = SingleFlight()
+    waiter_waiting = threading.Event()
+    outcome = {}
+
+    def abandoned(flight):
+        flight.report(None, 'loading')
+        assert waiter_waiting.wait(5)
+        # Так Streamlit прерывает скрипт сессии, которую остановили или перезапустили
+        raise StopException()
+
+    def call(fn):
+        if not outcome:
+            # Первый вызов - ведущий, его сессию останавливают
+            outcome['leader'] = 'stopped'
+            with pytest.raises(StopException):
+                flights.run('key', fn)
+        else:
+            outcome['result'] = flights.run(
+                'key', lambda flight: 'loaded by waiter', on_wait=lambda fraction, text: waiter_waiting.set()
+            )
+
+    run_with_followers(flights, abandoned, call, 1)
+
+    assert outcome == {'leader': 'stopped', 'result': 'loaded by waiter'}
@@ -0,0 +1,17 @@
+from utils.unannotated_tracker import UnannotatedTracker
+
+
+def test_skipped_images_are_not_unannotated():
+    tracker = UnannotatedTracker(['a.jpg', 'b.jpg', 'c.jpg', 'd.jpg'], annotated=['a.jpg'])
+    tracker.skip(['b.jpg', 'missing.jpg'])
+
+    assert tracker.remaining == 2
+    assert tracker.next_unannotated(0) == 2
+    assert tracker.previous_unannotated(2) == 3
+
+    # Удаление разметки и очистка не возвращают пропущенное изображение в неразмеченные
+    tracker.on_upsert(None, {'filename': 'b.jpg'})
+    tracker.on_delete({'filename': 'b.jpg'})
+    assert tracker.remaining == 2
+    tracker.on_clear()
+    assert tracker.unannotated_positions() == [0, 2, 3]
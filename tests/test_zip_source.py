@@ -0,0 +1,19 @@
+import zipfile
+import pytest
+from utils.zip_source import ZipImageSource
+
+
+def test_closed_source_does_not_reopen(tmp_path):
+    path = tmp_path / 'images.zip'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('folder/a.jpg', b'jpeg')
+        archive.writestr('__MACOSX/folder/._a.jpg', b'junk')
+
+    source = ZipImageSource(str(path), use_mmap=True)
+    assert source.names() == ['folder/a.jpg']
+    assert source.read('folder/a.jpg') == b'jpeg'
+
+    source.close()
+    with pytest.raises(ValueError):
+        source.read('folder/a.jpg')
+    assert source._zip is None and source._fp is None
@@ -7,15 +7,27 @@ from .annotations import (
     get_current_annotation,
     delete_annotation,
     export_to_csv,
+    get_export_csv,
     get_annotation_stats,
     validate_annotation,
     bulk_update_annotations,
+    bulk_save_annotations,
     clear_all_annotations,
     get_unannotated_files,
     get_next_unannotated_index,
-    import_annotations_from_csv
+    get_previous_unannotated_index,
+    get_unannotated_count,
+    import_annotations_from_csv,
+    get_annotation_store,
+    get_annotation_progress,
+    bind_annotations_to_dataset,
+    unbind_annotations,
+    save_annotation_cursor
 )
 
+from .annotation_store import AnnotationStore
+from .annotation_stats import AnnotationStats
+
 from .helpers import (
     extract_folder_name_from_url,
     extract_folder_id_from_url,
@@ -39,13 +51,24 @@ __all__ = [
     'get_current_annotation',
     'delete_annotation',
     'export_to_csv',
+    'get_export_csv',
     'get_annotation_stats',
     'validate_annotation',
     'bulk_update_annotations',
+    'bulk_save_annotations',
     'clear_all_annotations',
     'get_unannotated_files',
     'get_next_unannotated_index',
+    'get_previous_unannotated_index',
+    'get_unannotated_count',
     'import_annotations_from_csv',
+    'get_annotation_store',
+    'get_annotation_progress',
+    'bind_annotations_to_dataset',
+    'unbind_annotations',
+    'save_annotation_cursor',
+    'AnnotationStore',
+    'AnnotationStats',
 
     # Helpers
     'extract_folder_name_from_url',
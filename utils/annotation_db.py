@@ -0,0 +1,283 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import streamlit as st
+
+
+DB_PATH = os.environ.get(
+    'ANNOTATION_DB_PATH',
+    os.path.join(os.path.expanduser('~'), '.local', 'share', 'image_validation_app', 'annotations.db')
+)
+# Изменения копятся в памяти и записываются одной транзакцией раз в FLUSH_INTERVAL секунд
+# или сразу, как только накопится BATCH_SIZE изменений
+FLUSH_INTERVAL = float(os.environ.get('ANNOTATION_DB_FLUSH_INTERVAL', 0.5))
+BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS annotations (
+    dataset TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (dataset, filename)
+);
+CREATE TABLE IF NOT EXISTS cursors (
+    dataset TEXT PRIMARY KEY,
+    image_index INTEGER NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+class AnnotationDatabase:
+    """
+    Долговременное хранилище разметок в SQLite (режим WAL).
+    Разметки адресуются ключом набора данных и именем файла.
+    Запись отложенная: изменения объединяются и сбрасываются на диск фоновым потоком
+    """
+
+    def __init__(self, path=DB_PATH, flush_interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.last_error = None
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+        # Пачка забирается из очереди и записывается под одной блокировкой,
+        # поэтому пачки попадают в базу в том порядке, в котором были взяты
+        self._flush_lock = threading.Lock()
+
+        # Несохраненные изменения: набор -> {'clear': bool, 'items': имя файла -> разметка или None (удаление)}
+        self._pending = {}
+        self._pending_count = 0
+        self._cursors = {}
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name='annotation-writer', daemon=True)
+        self._thread.start()
+
+    def _changes(self, dataset):
+        changes = self._pending.get(dataset)
+        if changes is None:
+            changes = self._pending[dataset] = {'clear': False, 'items': OrderedDict()}
+        return changes
+
+    def _enqueue(self, dataset, filename, annotation):
+        with self._cond:
+            self._changes(dataset)['items'][filename] = annotation
+            self._pending_count += 1
+            if self._pending_count >= self.batch_size:
+                self._cond.notify()
+
+    def save(self, dataset, annotation):
+        """Ставит разметку в очередь на запись"""
+        self._enqueue(dataset, annotation['filename'], dict(annotation))
+
+    def delete(self, dataset, filename):
+        """Ставит удаление разметки в очередь на запись"""
+        self._enqueue(dataset, filename, None)
+
+    def clear(self, dataset):
+        """Ставит удаление всех разметок набора в очередь на запись"""
+        with self._cond:
+            changes = self._changes(dataset)
+            changes['clear'] = True
+            changes['items'].clear()
+            self._pending_count += 1
+
+    def save_cursor(self, dataset, index):
+        """Запоминает позицию пользователя в наборе"""
+        with self._cond:
+            self._cursors[dataset] = index
+            self._pending_count += 1
+
+    def load(self, dataset):
+        """Возвращает сохраненные разметки набора в порядке добавления"""
+
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute(
+                'SELECT data FROM annotations WHERE dataset = ? ORDER BY rowid', (dataset,)
+            ).fetchall()
+
+        return [json.loads(data) for data, in rows]
+
+    def load_cursor(self, dataset):
+        """Возвращает сохраненную позицию в наборе или None"""
+
+        self.flush()
+        with self._db_lock:
+            row = self._conn.execute(
+                'SELECT image_index FROM cursors WHERE dataset = ?', (dataset,)
+            ).fetchone()
+
+        return row[0] if row else None
+
+    def adopt(self, dataset, prefix):
+        """
+        Переносит в набор разметки и позицию наборов, чьи ключи начинаются с prefix
+        (ключи старых версий приложения). При совпадении имен остается более новая разметка
+        """
+
+        self.flush()
+        with self._db_lock, self._conn:
+            legacy = [
+                key for key, in self._conn.execute(
+                    'SELECT DISTINCT dataset FROM annotations WHERE substr(dataset, 1, ?) = ? '
+                    'UNION SELECT dataset FROM cursors WHERE substr(dataset, 1, ?) = ?',
+                    (len(prefix), prefix, len(prefix), prefix)
+                ) if key != dataset
+            ]
+
+            for key in legacy:
+                # WHERE true нужен SQLite, чтобы отличить ON CONFLICT от условия соединения
+                self._conn.execute(
+                    'INSERT INTO annotations (dataset, filename, data, updated) '
+                    'SELECT ?, filename, data, updated FROM annotations WHERE dataset = ? AND true ORDER BY rowid '
+                    'ON CONFLICT (dataset, filename) DO UPDATE SET data = excluded.data, updated = excluded.updated '
+                    'WHERE excluded.updated > annotations.updated',
+                    (dataset, key)
+                )
+                self._conn.execute(
+                    'INSERT OR IGNORE INTO cursors (dataset, image_index, updated) '
+                    'SELECT ?, image_index, updated FROM cursors WHERE dataset = ?',
+                    (dataset, key)
+                )
+                self._conn.execute('DELETE FROM annotations WHERE dataset = ?', (key,))
+                self._conn.execute('DELETE FROM cursors WHERE dataset = ?', (key,))
+
+        return len(legacy)
+
+    def flush(self):
+        """Синхронно записывает все накопленные изменения"""
+
+        with self._flush_lock:
+            with self._cond:
+                pending, cursors = self._pending, self._cursors
+                self._pending, self._cursors, self._pending_count = {}, {}, 0
+
+            if not pending and not cursors:
+                return
+
+            try:
+                self._write(pending, cursors)
+                self.last_error = None
+            except sqlite3.Error as e:
+                # Возвращаем изменения в очередь (более новые поверх), запись повторится в следующий раз
+                self.last_error = e
+                self._requeue(pending, cursors)
+
+    def _write(self, pending, cursors):
+        now = time.time()
+
+        with self._db_lock, self._conn:
+            for dataset, changes in pending.items():
+                if changes['clear']:
+                    self._conn.execute('DELETE FROM annotations WHERE dataset = ?', (dataset,))
+
+                upserts = [
+                    (dataset, filename, json.dumps(annotation, ensure_ascii=False), now)
+                    for filename, annotation in changes['items'].items() if annotation is not None
+                ]
+                deletes = [
+                    (dataset, filename)
+                    for filename, annotation in changes['items'].items() if annotation is None
+                ]
+
+                # ON CONFLICT сохраняет rowid, поэтому порядок добавления не меняется
+                self._conn.executemany(
+                    'INSERT INTO annotations (dataset, filename, data, updated) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (dataset, filename) DO UPDATE SET data = excluded.data, updated = excluded.updated',
+                    upserts
+                )
+                self._conn.executemany(
+                    'DELETE FROM annotations WHERE dataset = ? AND filename = ?', deletes
+                )
+
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO cursors (dataset, image_index, updated) VALUES (?, ?, ?)',
+                [(dataset, index, now) for dataset, index in cursors.items()]
+            )
+
+    def _requeue(self, pending, cursors):
+        with self._cond:
+            for dataset, changes in pending.items():
+                newer = self._pending.get(dataset)
+                if newer is not None and newer['clear']:
+                    continue
+                merged = self._changes(dataset)
+                merged['clear'] = merged['clear'] or changes['clear']
+                items = OrderedDict(changes['items'])
+                items.update(merged['items'])
+                merged['items'] = items
+                self._pending_count += len(changes['items'])
+
+            for dataset, index in cursors.items():
+                self._cursors.setdefault(dataset, index)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                self._cond.wait(self.flush_interval)
+
+            self.flush()
+
+    def close(self):
+        """Останавливает фоновую запись и сбрасывает оставшиеся изменения"""
+
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+
+        self._thread.join()
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+
+class AnnotationPersistence:
+    """Подписчик хранилища разметок, который сохраняет изменения в базу для одного набора"""
+
+    def __init__(self, database, dataset):
+        self.database = database
+        self.dataset = dataset
+        self.cursor = None
+
+    def on_upsert(self, old, new):
+        self.database.save(self.dataset, new)
+
+    def on_delete(self, old):
+        self.database.delete(self.dataset, old['filename'])
+
+    def on_clear(self):
+        self.database.clear(self.dataset)
+
+    def save_cursor(self, index):
+        """Запоминает позицию, если она изменилась"""
+        if index != self.cursor:
+            self.cursor = index
+            self.database.save_cursor(self.dataset, index)
+
+
+@st.cache_resource
+def get_annotation_database():
+    """Общая для всех сессий база разметок; при остановке процесса несохраненное дописывается"""
+    database = AnnotationDatabase()
+    atexit.register(database.close)
+    return database
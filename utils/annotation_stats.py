@@ -0,0 +1,64 @@
+from .annotation_table import GENDER_LABELS
+
+
+GENDERS = GENDER_LABELS[1:]
+
+
+class AnnotationStats:
+    """
+    Статистика разметок. Счетчики ведет таблица разметок при каждой записи и удалении,
+    поэтому чтение статистики ничего не пересчитывает
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    @property
+    def by_validity(self):
+        return self.table.by_validity
+
+    @property
+    def by_gender(self):
+        return self.table.by_gender
+
+    @property
+    def by_category(self):
+        return self.table.by_category
+
+    @property
+    def crosstab(self):
+        """Кросс-таблица категория × пол × валидность"""
+        return self.table.crosstab
+
+    @property
+    def total(self):
+        return len(self.table)
+
+    @property
+    def valid(self):
+        return self.by_validity['Валидно']
+
+    @property
+    def invalid(self):
+        return self.by_validity['Невалидно']
+
+    def snapshot(self):
+        """Возвращает статистику в формате get_annotation_stats"""
+        return {
+            'total': self.total,
+            'valid': self.valid,
+            'invalid': self.invalid,
+            'by_gender': {gender: self.by_gender[gender] for gender in GENDERS if self.by_gender[gender] > 0},
+            'by_category': dict(self.by_category.most_common())
+        }
+
+    def progress(self, total_images):
+        """Возвращает прогресс разметки относительно общего числа изображений"""
+        annotated = self.total
+
+        return {
+            'total': total_images,
+            'annotated': annotated,
+            'remaining': max(total_images - annotated, 0),
+            'progress': annotated / total_images if total_images > 0 else 0
+        }
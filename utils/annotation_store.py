@@ -0,0 +1,161 @@
+from collections.abc import Sequence, Set
+from .annotation_stats import AnnotationStats
+from .annotation_table import AnnotationTable
+
+
+class AnnotatedFilenames(Set):
+    """Множество-представление размеченных файлов"""
+
+    def __init__(self, table):
+        self._table = table
+
+    def __contains__(self, filename):
+        return self._table.contains(filename)
+
+    def __iter__(self):
+        names = self._table.names
+        return (names[position] for position in self._table.annotated_positions())
+
+    def __len__(self):
+        return len(self._table)
+
+
+class AnnotationStore(Sequence):
+    """
+    Хранилище разметок с индексом по имени файла.
+    Разметки лежат в колоночной таблице по позициям изображений; наружу отдаются словарями.
+    Сохраняет порядок добавления, а вставка, поиск и удаление работают за O(1)
+    """
+
+    def __init__(self, annotations=None, images=()):
+        self.table = AnnotationTable(images)
+        self.stats = AnnotationStats(self.table)
+        self._listeners = []
+        # Версия меняется при каждом изменении разметок
+        self.version = 0
+        self._cache = {}
+
+        for annotation in annotations or []:
+            self.upsert(annotation)
+
+    def add_listener(self, listener):
+        """
+        Подписывает объект на изменения хранилища.
+        Объект должен реализовать методы on_upsert(old, new), on_delete(old) и on_clear()
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Отписывает объект от изменений хранилища"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def bind_images(self, images):
+        """Привязывает позиции таблицы к списку изображений (существующие разметки сохраняются)"""
+        self.table.rebind(images)
+
+    def upsert(self, annotation):
+        """Добавляет или обновляет разметку (позиция обновляемой записи не меняется)"""
+        old = self.table.set(annotation)
+        self.version += 1
+
+        for listener in self._listeners:
+            listener.on_upsert(old, annotation)
+
+    def bulk_upsert(self, annotations):
+        """
+        Добавляет или обновляет много разметок за один раз (версия меняется один раз).
+        Вся пачка кодируется до записи: при недопустимом значении ничего не меняется
+        """
+        annotations = list(annotations)
+        encoded = [self.table.encode(annotation) for annotation in annotations]
+        changed = 0
+
+        for annotation, codes in zip(annotations, encoded):
+            old = self.table.set(annotation, codes)
+            changed += 1
+
+            for listener in self._listeners:
+                listener.on_upsert(old, annotation)
+
+        if changed:
+            self.version += 1
+
+        return changed
+
+    def get(self, filename):
+        """Возвращает разметку по имени файла или None"""
+        return self.table.get(filename)
+
+    def delete(self, filename):
+        """Удаляет разметку, возвращает удаленную запись или None"""
+        old = self.table.delete(filename)
+
+        if old is not None:
+            self.version += 1
+            for listener in self._listeners:
+                listener.on_delete(old)
+
+        return old
+
+    def clear(self):
+        """Удаляет все разметки"""
+        self.table.clear()
+        self.version += 1
+
+        for listener in self._listeners:
+            listener.on_clear()
+
+    def cached(self, key, build):
+        """Возвращает результат build(self), пересчитывая его только после изменения разметок"""
+        version, value = self._cache.get(key, (None, None))
+
+        if version != self.version:
+            value = build(self)
+            self._cache[key] = (self.version, value)
+
+        return value
+
+    def filenames(self):
+        """Возвращает множество-представление размеченных файлов"""
+        return AnnotatedFilenames(self.table)
+
+    def to_list(self):
+        """Возвращает разметки списком в порядке добавления"""
+        return list(self)
+
+    def to_frame(self):
+        """Возвращает разметки DataFrame в порядке добавления"""
+        return self.table.to_frame()
+
+    def __contains__(self, filename):
+        return self.table.contains(filename)
+
+    def __iter__(self):
+        return (self.table.row(position) for position in self.table.annotated_positions())
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, index):
+        # Позиционный доступ нужен только для совместимости со списком
+        positions = self.table.annotated_positions()
+        if isinstance(index, slice):
+            return [self.table.row(position) for position in positions[index]]
+        return self.table.row(positions[index])
+
+    def __repr__(self):
+        return f"AnnotationStore({len(self)} annotations)"
+
+
+def ensure_annotation_store(session_state):
+    """Возвращает хранилище разметок из session state, создавая его при необходимости"""
+
+    annotations = session_state.get('annotations')
+
+    if not isinstance(annotations, AnnotationStore):
+        # Переносим разметки, сохраненные старым списком
+        annotations = AnnotationStore(annotations)
+        session_state['annotations'] = annotations
+
+    return annotations
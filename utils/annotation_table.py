@@ -0,0 +1,284 @@
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+
+VALIDITY_LABELS = ['Валидно', 'Невалидно']
+CATEGORY_LABELS = ['верх', 'низ', 'обувь', 'голова', 'аксессуар']
+# Пол хранится битовой маской: М = 1, Ж = 2, М/Ж = 3
+GENDER_BITS = {'М': 1, 'Ж': 2, 'М/Ж': 3}
+GENDER_LABELS = ['', 'М', 'Ж', 'М/Ж']
+
+EMPTY = -1
+INITIAL_CAPACITY = 1024
+
+# Код -1 указывает на последний элемент - пустую строку
+_VALIDITY_ARRAY = np.array(VALIDITY_LABELS + [''], dtype=object)
+_CATEGORY_ARRAY = np.array(CATEGORY_LABELS + [''], dtype=object)
+_GENDER_ARRAY = np.array(GENDER_LABELS, dtype=object)
+
+_VALIDITY_CODES = {label: code for code, label in enumerate(VALIDITY_LABELS)}
+_CATEGORY_CODES = {label: code for code, label in enumerate(CATEGORY_LABELS)}
+
+
+def _encode(codes, value, field, empty=EMPTY):
+    if not value:
+        return empty
+    try:
+        return codes[value]
+    except KeyError:
+        raise ValueError(f"Недопустимое значение поля '{field}': {value}")
+
+
+class AnnotationTable:
+    """
+    Колоночное хранение разметок по позициям изображений.
+    Валидность и категория - коды int8, пол - битовая маска, папки интернированы,
+    img_path строится при чтении. Заметки и нестандартные img_path хранятся разреженно
+    """
+
+    def __init__(self, names=()):
+        self.names = []
+        self._index = {}
+        self._size = 0
+        # Меняется при каждом изменении разметок
+        self.version = 0
+        self._allocate(max(len(names), INITIAL_CAPACITY))
+        self.folders = []
+        self._folder_codes = {}
+        self._reset_rows()
+
+        for name in names:
+            self._append_name(name)
+
+    def _allocate(self, capacity):
+        self.validity = np.full(capacity, EMPTY, dtype=np.int8)
+        self.gender = np.zeros(capacity, dtype=np.int8)
+        self.category = np.full(capacity, EMPTY, dtype=np.int8)
+        self.folder = np.full(capacity, EMPTY, dtype=np.int32)
+        # Порядковый номер сохранения; 0 - разметки нет
+        self.seq = np.zeros(capacity, dtype=np.int64)
+
+    def _reset_rows(self):
+        self.validity[:] = EMPTY
+        self.gender[:] = 0
+        self.category[:] = EMPTY
+        self.folder[:] = EMPTY
+        self.seq[:] = 0
+        self.notes = {}
+        self.img_paths = {}
+        self.count = 0
+        self._next_seq = 1
+        # Счетчики по меткам; меняются вместе с записью и удалением разметок
+        self.by_validity = Counter()
+        self.by_gender = Counter()
+        self.by_category = Counter()
+        # Ключ - (категория, пол, валидность)
+        self.crosstab = Counter()
+
+    def _grow(self):
+        capacity = len(self.seq) * 2
+        for column in ('validity', 'gender', 'category', 'folder', 'seq'):
+            old = getattr(self, column)
+            new = np.full(capacity, EMPTY if column in ('validity', 'category', 'folder') else 0, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, column, new)
+
+    def _append_name(self, name):
+        if self._size == len(self.seq):
+            self._grow()
+        position = self._size
+        self.names.append(name)
+        # Повторяющиеся имена адресуются первой позицией
+        self._index.setdefault(name, position)
+        self._size += 1
+        return position
+
+    def __len__(self):
+        return self.count
+
+    def position(self, filename):
+        """Позиция файла или None"""
+        return self._index.get(filename)
+
+    def contains(self, filename):
+        position = self._index.get(filename)
+        return position is not None and self.seq[position] > 0
+
+    def _folder_code(self, folder):
+        code = self._folder_codes.get(folder)
+        if code is None:
+            code = self._folder_codes[folder] = len(self.folders)
+            self.folders.append(folder)
+        return code
+
+    def _count(self, position, delta):
+        """Добавляет метки позиции к счетчикам (delta = 1) или вычитает их (delta = -1)"""
+
+        validity = _VALIDITY_ARRAY[self.validity[position]]
+        gender = GENDER_LABELS[self.gender[position]]
+        category = _CATEGORY_ARRAY[self.category[position]]
+
+        for counter, key in ((self.by_validity, validity), (self.by_gender, gender),
+                             (self.by_category, category), (self.crosstab, (category, gender, validity))):
+            counter[key] += delta
+            # Нулевые ключи удаляем, чтобы счетчики содержали только встречающиеся метки
+            if not counter[key]:
+                del counter[key]
+
+    @staticmethod
+    def encode(annotation):
+        """Кодирует метки разметки: (валидность, пол, категория); недопустимое значение - ValueError"""
+        return (
+            _encode(_VALIDITY_CODES, annotation.get('validity'), 'validity'),
+            _encode(GENDER_BITS, annotation.get('gender'), 'gender', empty=0),
+            _encode(_CATEGORY_CODES, annotation.get('category'), 'category')
+        )
+
+    def set(self, annotation, codes=None):
+        """
+        Записывает разметку, возвращает предыдущую (словарем) или None.
+        codes - заранее полученный результат encode(annotation)
+        """
+
+        filename = annotation['filename']
+        validity, gender, category = codes if codes is not None else self.encode(annotation)
+
+        position = self._index.get(filename)
+        if position is None:
+            # Файл вне текущего списка изображений - добавляем позицию в конец
+            position = self._append_name(filename)
+
+        old = self.row(position)
+        folder = annotation.get('folder') or ''
+        if old is not None:
+            self._count(position, -1)
+
+        self.validity[position] = validity
+        self.gender[position] = gender
+        self.category[position] = category
+        self.folder[position] = self._folder_code(folder)
+
+        notes = annotation.get('notes') or ''
+        if notes:
+            self.notes[position] = notes
+        else:
+            self.notes.pop(position, None)
+
+        img_path = annotation.get('img_path')
+        if img_path and img_path != f"{folder}/{filename}":
+            self.img_paths[position] = img_path
+        else:
+            self.img_paths.pop(position, None)
+
+        self._count(position, 1)
+        if old is None:
+            # Обновление сохраняет позицию в порядке добавления
+            self.seq[position] = self._next_seq
+            self._next_seq += 1
+            self.count += 1
+
+        self.version += 1
+        return old
+
+    def row(self, position):
+        """Собирает разметку позиции в словарь или возвращает None"""
+
+        if position is None or self.seq[position] == 0:
+            return None
+
+        filename = self.names[position]
+        folder = self.folders[self.folder[position]]
+
+        return {
+            'img_path': self.img_paths.get(position, f"{folder}/{filename}"),
+            'filename': filename,
+            'validity': _VALIDITY_ARRAY[self.validity[position]],
+            'gender': GENDER_LABELS[self.gender[position]],
+            'category': _CATEGORY_ARRAY[self.category[position]],
+            'folder': folder,
+            'notes': self.notes.get(position, '')
+        }
+
+    def get(self, filename):
+        return self.row(self._index.get(filename))
+
+    def delete(self, filename):
+        """Удаляет разметку, возвращает удаленную запись или None"""
+
+        position = self._index.get(filename)
+        old = self.row(position)
+        if old is None:
+            return None
+
+        self._count(position, -1)
+        self.validity[position] = EMPTY
+        self.gender[position] = 0
+        self.category[position] = EMPTY
+        self.folder[position] = EMPTY
+        self.seq[position] = 0
+        self.notes.pop(position, None)
+        self.img_paths.pop(position, None)
+        self.count -= 1
+        self.version += 1
+
+        return old
+
+    def clear(self):
+        self._reset_rows()
+        self.version += 1
+
+    def annotated_positions(self):
+        """Позиции с разметкой в порядке добавления"""
+        seq = self.seq[:self._size]
+        positions = np.flatnonzero(seq)
+        return positions[np.argsort(seq[positions], kind='stable')]
+
+    def rebind(self, names):
+        """Переиндексирует таблицу под новый список изображений, сохраняя разметки и их порядок"""
+
+        rows = [self.row(position) for position in self.annotated_positions()]
+        self.names = []
+        self._index = {}
+        self._size = 0
+        self._allocate(max(len(names), INITIAL_CAPACITY))
+        self._reset_rows()
+
+        for name in names:
+            self._append_name(name)
+        for row in rows:
+            self.set(row)
+
+    def to_frame(self):
+        """Все разметки в порядке добавления одним DataFrame; строится по колонкам без циклов по строкам"""
+
+        positions = self.annotated_positions()
+        names = np.array(self.names, dtype=object)[positions]
+        folders = np.array(self.folders, dtype=object)[self.folder[positions]] if len(positions) else \
+            np.array([], dtype=object)
+
+        frame = pd.DataFrame({
+            'img_path': folders + '/' + names,
+            'filename': names,
+            'validity': _VALIDITY_ARRAY[self.validity[positions]],
+            'gender': _GENDER_ARRAY[self.gender[positions]],
+            'category': _CATEGORY_ARRAY[self.category[positions]],
+            'folder': folders,
+            'notes': ''
+        })
+
+        if self.img_paths or self.notes:
+            row_of = pd.Series(np.arange(len(positions)), index=positions)
+            for column, values in (('img_path', self.img_paths), ('notes', self.notes)):
+                if values:
+                    rows = row_of.reindex(list(values)).dropna().astype(np.int64)
+                    frame.loc[rows.to_numpy(), column] = [values[position] for position in rows.index]
+
+        return frame
+
+    def counts(self):
+        """
+        Счетчики по меткам: (валидность, пол, категория, кросс-таблица).
+        Кросс-таблица адресуется (категория, пол, валидность)
+        """
+        return self.by_validity, self.by_gender, self.by_category, self.crosstab
@@ -1,34 +1,49 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
+from .annotation_store import AnnotationStore, ensure_annotation_store
+from .annotation_db import AnnotationPersistence, get_annotation_database
+from .unannotated_tracker import UnannotatedTracker
+from .image_catalog import NameMatcher
+
+
+REQUIRED_FIELDS = ['filename', 'validity', 'gender', 'category']
+VALIDITY_VALUES = ['Валидно', 'Невалидно']
+CATEGORY_VALUES = ['верх', 'низ', 'обувь', 'голова', 'аксессуар']
+GENDER_VALUES = ['М', 'Ж', 'М/Ж']
+
+# Колонки, обязательные в импортируемом CSV, и размер части при чтении
+IMPORT_COLUMNS = ['img_path', 'validity', 'gender', 'category']
+IMPORT_CHUNK_SIZE = 50000
+
+
+def get_annotation_store():
+    """Возвращает хранилище разметок текущей сессии"""
+    return ensure_annotation_store(st.session_state)
+
+
+def make_annotation(filename, validity, gender, category, folder_name, notes=""):
+    """Создает запись разметки"""
+
+    return {
+        'img_path': f"{folder_name}/{filename}",
+        'filename': filename,
+        'validity': validity,
+        'gender': gender,
+        'category': category,
+        'folder': folder_name,
+        'notes': notes
+    }
 
 
 def save_annotation(filename, validity, gender, category, folder_name, notes=""):
     """Сохраняет разметку изображения"""
 
     try:
-        annotation = {
-            'img_path': f"{folder_name}/{filename}",
-            'filename': filename,
-            'validity': validity,
-            'gender': gender,
-            'category': category,
-            'folder': folder_name,
-            'notes': notes
-        }
-
-        # Проверяем, есть ли уже разметка для этого изображения
-        existing_index = None
-        for i, ann in enumerate(st.session_state.annotations):
-            if ann['filename'] == filename:
-                existing_index = i
-                break
-
-        if existing_index is not None:
-            # Обновляем существующую разметку
-            st.session_state.annotations[existing_index] = annotation
-        else:
-            # Добавляем новую разметку
-            st.session_state.annotations.append(annotation)
+        annotation = make_annotation(filename, validity, gender, category, folder_name, notes)
+
+        # Добавляем новую или обновляем существующую разметку
+        get_annotation_store().upsert(annotation)
 
         return True
 
@@ -40,19 +55,13 @@ def save_annotation(filename, validity, gender, category, folder_name, notes="")
 def get_current_annotation(filename):
     """Получает текущую разметку для изображения"""
 
-    for ann in st.session_state.annotations:
-        if ann['filename'] == filename:
-            return ann
-    return None
+    return get_annotation_store().get(filename)
 
 
 def delete_annotation(filename):
     """Удаляет разметку для изображения"""
 
-    st.session_state.annotations = [
-        ann for ann in st.session_state.annotations
-        if ann['filename'] != filename
-    ]
+    get_annotation_store().delete(filename)
 
 
 def export_to_csv(annotations):
@@ -61,8 +70,11 @@ def export_to_csv(annotations):
     if not annotations:
         return None
 
-    # Создаем DataFrame с нужными колонками
-    df = pd.DataFrame(annotations)
+    # Создаем DataFrame с нужными колонками (хранилище собирает его прямо из колонок таблицы)
+    if isinstance(annotations, AnnotationStore):
+        df = annotations.to_frame()
+    else:
+        df = pd.DataFrame(annotations)
 
     # Выбираем нужные колонки в правильном порядке
     export_columns = ['img_path', 'validity', 'gender', 'category']
@@ -85,184 +97,340 @@ def export_to_csv(annotations):
     return csv_data.to_csv(index=False)
 
 
+def get_export_csv(store=None):
+    """Возвращает CSV экспорт, который пересчитывается только после изменения разметок"""
+
+    if store is None:
+        store = get_annotation_store()
+
+    return store.cached('csv', export_to_csv)
+
+
 def get_annotation_stats():
     """Возвращает статистику разметок"""
 
-    if not st.session_state.annotations:
-        return {
-            'total': 0,
-            'valid': 0,
-            'invalid': 0,
-            'by_gender': {},
-            'by_category': {}
-        }
+    return get_annotation_store().stats.snapshot()
 
-    df = pd.DataFrame(st.session_state.annotations)
 
-    # Базовая статистика
-    total = len(df)
-    valid_count = len(df[df['validity'] == 'Валидно'])
-    invalid_count = len(df[df['validity'] == 'Невалидно'])
+def get_annotation_progress():
+    """Возвращает прогресс разметки: всего, размечено, осталось и долю"""
 
-    # Статистика по полу
-    gender_stats = {}
-    for gender in ['М', 'Ж', 'М/Ж']:
-        count = len(df[df['gender'] == gender])
-        if count > 0:
-            gender_stats[gender] = count
+    store = get_annotation_store()
+    total = len(st.session_state.get('images_list', []))
+    # Пропущенные неразмеченные изображения не входят в прогресс
+    skipped = get_unannotated_tracker().skipped
+    if skipped:
+        annotated = store.filenames()
+        total -= sum(1 for filename in skipped if filename not in annotated)
 
-    # Статистика по категориям
-    category_stats = df['category'].value_counts().to_dict()
-
-    return {
-        'total': total,
-        'valid': valid_count,
-        'invalid': invalid_count,
-        'by_gender': gender_stats,
-        'by_category': category_stats
-    }
+    return store.stats.progress(total)
 
 
 def validate_annotation(annotation):
     """Валидирует разметку перед сохранением"""
 
-    required_fields = ['filename', 'validity', 'gender', 'category']
-
-    for field in required_fields:
+    for field in REQUIRED_FIELDS:
         if field not in annotation or not annotation[field]:
             return False, f"Поле '{field}' обязательно для заполнения"
 
     # Проверяем валидные значения
-    if annotation['validity'] not in ['Валидно', 'Невалидно']:
+    if annotation['validity'] not in VALIDITY_VALUES:
         return False, "Неверное значение валидности"
 
-    valid_categories = ['верх', 'низ', 'обувь', 'голова', 'аксессуар']
-    if annotation['category'] not in valid_categories:
+    if annotation['category'] not in CATEGORY_VALUES:
         return False, "Неверная категория"
 
     # Проверяем формат пола
-    valid_genders = ['М', 'Ж', 'М/Ж']
-    if annotation['gender'] not in valid_genders:
+    if annotation['gender'] not in GENDER_VALUES:
         return False, "Неверный формат пола"
 
     return True, "OK"
 
 
+def bulk_save_annotations(filenames, validity, gender, category, folder_name, notes=""):
+    """
+    Применяет одну разметку ко многим изображениям за один проход.
+    Значения проверяются один раз; возвращает количество сохраненных разметок
+    """
+
+    if not filenames:
+        return 0
+
+    is_valid, message = validate_annotation(
+        make_annotation(filenames[0], validity, gender, category, folder_name, notes)
+    )
+    if not is_valid:
+        st.error(f"Ошибка при массовой разметке: {message}")
+        return 0
+
+    return get_annotation_store().bulk_upsert(
+        make_annotation(filename, validity, gender, category, folder_name, notes)
+        for filename in filenames
+    )
+
+
 def bulk_update_annotations(updates):
-    """Массовое обновление разметок"""
+    """
+    Массовое обновление разметок.
+    Сначала проверяются все записи, затем корректные сохраняются одной операцией
+    """
 
-    updated_count = 0
+    annotations = []
+    errors = []
 
     for filename, annotation_data in updates.items():
-        try:
-            success = save_annotation(
-                filename=filename,
-                validity=annotation_data['validity'],
-                gender=annotation_data['gender'],
-                category=annotation_data['category'],
-                folder_name=annotation_data.get('folder', st.session_state.folder_name),
-                notes=annotation_data.get('notes', '')
-            )
-
-            if success:
-                updated_count += 1
+        annotation = make_annotation(
+            filename,
+            annotation_data.get('validity'),
+            annotation_data.get('gender'),
+            annotation_data.get('category'),
+            annotation_data.get('folder', st.session_state.folder_name),
+            annotation_data.get('notes', '')
+        )
+
+        is_valid, message = validate_annotation(annotation)
+        if is_valid:
+            annotations.append(annotation)
+        else:
+            errors.append(f"{filename}: {message}")
 
-        except Exception as e:
-            st.error(f"Ошибка при обновлении {filename}: {str(e)}")
+    if errors:
+        shown = "\n".join(errors[:10])
+        more = f"\n... и еще {len(errors) - 10}" if len(errors) > 10 else ""
+        st.error(f"Ошибки при обновлении ({len(errors)}):\n{shown}{more}")
 
-    return updated_count
+    return get_annotation_store().bulk_upsert(annotations)
 
 
 def clear_all_annotations():
     """Очищает все разметки"""
 
-    st.session_state.annotations = []
+    get_annotation_store().clear()
+
+
+def bind_annotations_to_dataset(dataset_key, images=()):
+    """
+    Подключает разметки сессии к базе: восстанавливает сохраненные разметки набора
+    и дальше сохраняет все изменения. Возвращает (сохраненная позиция или None,
+    количество сохраненных разметок, для которых в наборе нет изображения)
+    """
+
+    unbind_annotations()
+
+    database = get_annotation_database()
+    store = get_annotation_store()
+    store.clear()
+    store.bind_images(images)
+
+    # Записи старых версий хранят имя файла без подпапок: переносим их под имя из каталога,
+    # а записи, которых нет в наборе, не добавляем лишними позициями
+    matcher = NameMatcher(images)
+    saved = database.load(dataset_key)
+    current = {annotation['filename'] for annotation in saved}
+    skipped = 0
+
+    for annotation in saved:
+        filename = annotation['filename']
+        name = matcher.match(filename)
+        if name is None:
+            skipped += 1
+            continue
+
+        if name != filename:
+            database.delete(dataset_key, filename)
+            if name in current:
+                # У изображения уже есть запись под новым именем - она новее
+                continue
+            annotation = dict(annotation, filename=name, img_path=f"{annotation.get('folder') or ''}/{name}")
+            database.save(dataset_key, annotation)
+            current.add(name)
+
+        store.upsert(annotation)
+
+    persistence = AnnotationPersistence(database, dataset_key)
+    persistence.cursor = database.load_cursor(dataset_key)
+    store.add_listener(persistence)
+    st.session_state.annotation_persistence = persistence
+
+    return persistence.cursor, skipped
+
+
+def adopt_saved_annotations(dataset_key, prefix):
+    """Переносит под dataset_key разметки, сохраненные старыми версиями под ключами с prefix"""
+    return get_annotation_database().adopt(dataset_key, prefix)
+
+
+def unbind_annotations():
+    """Отключает разметки сессии от базы (сохраненные разметки не удаляются)"""
+
+    persistence = st.session_state.get('annotation_persistence')
+    if persistence is not None:
+        get_annotation_store().remove_listener(persistence)
+        st.session_state.annotation_persistence = None
+
+
+def save_annotation_cursor(index):
+    """Запоминает текущую позицию в наборе, если разметки подключены к базе"""
+
+    persistence = st.session_state.get('annotation_persistence')
+    if persistence is not None:
+        persistence.save_cursor(index)
+
+
+def get_unannotated_tracker():
+    """
+    Возвращает трекер неразмеченных позиций для текущего списка изображений.
+    Трекер строится один раз на список и дальше обновляется подпиской на хранилище
+    """
+
+    store = get_annotation_store()
+    images = st.session_state.get('images_list') or []
+    tracker = st.session_state.get('unannotated_tracker')
+
+    if tracker is None or tracker.images is not images or tracker.store is not store:
+        if tracker is not None:
+            tracker.store.remove_listener(tracker)
+
+        tracker = UnannotatedTracker(images, store.filenames())
+        tracker.store = store
+        store.add_listener(tracker)
+        st.session_state.unannotated_tracker = tracker
+
+    # Изображения, не прошедшие проверку целостности, пропускаются
+    check = st.session_state.get('integrity_check')
+    catalog = st.session_state.get('image_catalog')
+    if check is not None and catalog is not None and len(check.broken) > len(tracker.skipped):
+        root = len(catalog.root)
+        tracker.skip(member[root:] for member in list(check.broken))
+
+    return tracker
 
 
 def get_unannotated_files():
     """Возвращает список неразмеченных файлов"""
 
-    if not st.session_state.images_list:
-        return []
+    tracker = get_unannotated_tracker()
+    return [tracker.images[position] for position in tracker.unannotated_positions()]
 
-    annotated_files = {ann['filename'] for ann in st.session_state.annotations}
 
-    return [
-        filename for filename in st.session_state.images_list
-        if filename not in annotated_files
-    ]
+def get_unannotated_count():
+    """Возвращает количество неразмеченных изображений - O(1)"""
+
+    return get_unannotated_tracker().remaining
 
 
 def get_next_unannotated_index():
-    """Возвращает индекс следующего неразмеченного файла"""
+    """Возвращает индекс следующего неразмеченного файла (после последнего ищет с начала)"""
+
+    if not st.session_state.images_list:
+        return None
+
+    return get_unannotated_tracker().next_unannotated(st.session_state.current_image_index)
 
-    unannotated_files = get_unannotated_files()
 
-    if not unannotated_files:
+def get_previous_unannotated_index():
+    """Возвращает индекс предыдущего неразмеченного файла (перед первым ищет с конца)"""
+
+    if not st.session_state.images_list:
         return None
 
-    # Ищем первый неразмеченный файл после текущего
-    current_idx = st.session_state.current_image_index
+    return get_unannotated_tracker().previous_unannotated(st.session_state.current_image_index)
 
-    for i in range(current_idx + 1, len(st.session_state.images_list)):
-        if st.session_state.images_list[i] in unannotated_files:
-            return i
 
-    # Если не найден после текущего, ищем с начала
-    for i in range(current_idx):
-        if st.session_state.images_list[i] in unannotated_files:
-            return i
+def get_rejection_reasons(df, image_index):
+    """
+    Проверяет разметки целыми колонками, в том же порядке, что и validate_annotation.
+    Возвращает массив причин отклонения ('' - строка принята)
+    """
 
-    return None
+    conditions = [~df['filename'].isin(image_index)]
+    reasons = ["Файл отсутствует в загруженном архиве"]
 
+    for field in REQUIRED_FIELDS:
+        conditions.append(df[field] == '')
+        reasons.append(f"Поле '{field}' обязательно для заполнения")
 
-def import_annotations_from_csv(csv_file):
-    """Импортирует разметки из CSV файла"""
+    conditions += [
+        ~df['validity'].isin(VALIDITY_VALUES),
+        ~df['category'].isin(CATEGORY_VALUES),
+        ~df['gender'].isin(GENDER_VALUES)
+    ]
+    reasons += ["Неверное значение валидности", "Неверная категория", "Неверный формат пола"]
 
-    try:
-        df = pd.read_csv(csv_file)
+    # np.select берет первое сработавшее условие - как ранний return в validate_annotation
+    return np.select(conditions, reasons, default='')
+
+
+def read_annotations_csv(csv_file, images, folder_name, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Читает CSV с разметками частями и проверяет их без построчных циклов.
+    Для каждой части возвращает (принятые разметки, DataFrame отклоненных строк: line, img_path, reason)
+    """
+
+    image_index = pd.Index(images).unique()
+    matcher = NameMatcher(image_index)
+    line_offset = 2  # первая строка файла - заголовок
+
+    for chunk in pd.read_csv(csv_file, dtype=str, keep_default_na=False, chunksize=chunk_size):
+        missing_columns = [col for col in IMPORT_COLUMNS if col not in chunk.columns]
+        if missing_columns:
+            raise ValueError(f"CSV должен содержать колонки: {IMPORT_COLUMNS}")
+
+        # img_path экспортируется как папка/имя в каталоге, старые файлы ссылаются на изображения
+        # по имени файла; строки, которых нет в каталоге, уходят в отчет об отклоненных
+        chunk['filename'] = matcher.match_all(chunk['img_path']).fillna('')
+        reasons = get_rejection_reasons(chunk, image_index)
+        accepted_mask = reasons == ''
+
+        accepted = chunk.loc[accepted_mask, ['img_path', 'filename', 'validity', 'gender', 'category']]
+        accepted = accepted.assign(
+            folder=folder_name,
+            notes=chunk.loc[accepted_mask, 'notes'] if 'notes' in chunk.columns else ''
+        )
 
-        required_columns = ['img_path', 'validity', 'gender', 'category']
-        if not all(col in df.columns for col in required_columns):
-            return False, f"CSV должен содержать колонки: {required_columns}"
+        rejected = pd.DataFrame({
+            'line': chunk.index[~accepted_mask] + line_offset,
+            'img_path': chunk.loc[~accepted_mask, 'img_path'].to_numpy(),
+            'reason': reasons[~accepted_mask]
+        })
 
+        # Хранилищу нужны словари; собираем их из списков колонок (to_dict заметно медленнее)
+        columns = list(accepted.columns)
+        records = [dict(zip(columns, values)) for values in zip(*(accepted[col].tolist() for col in columns))]
+
+        yield records, rejected
+
+
+def import_annotations_from_csv(csv_file, with_report=False):
+    """
+    Импортирует разметки из CSV файла.
+    Если with_report=True, третьим значением возвращает отклоненные строки с причинами
+    """
+
+    rejected_parts = []
+
+    try:
+        store = get_annotation_store()
         imported_count = 0
 
-        for _, row in df.iterrows():
-            # Извлекаем filename из img_path
-            img_path = row['img_path']
-            filename = img_path.split('/')[-1] if '/' in img_path else img_path
-
-            # Проверяем, есть ли такой файл в списке
-            if filename in st.session_state.images_list:
-                annotation = {
-                    'img_path': img_path,
-                    'filename': filename,
-                    'validity': row['validity'],
-                    'gender': row['gender'],
-                    'category': row['category'],
-                    'folder': st.session_state.folder_name,
-                    'notes': row.get('notes', '')
-                }
-
-                # Валидируем разметку
-                is_valid, message = validate_annotation(annotation)
-                if is_valid:
-                    # Добавляем или обновляем разметку
-                    existing_index = None
-                    for i, ann in enumerate(st.session_state.annotations):
-                        if ann['filename'] == filename:
-                            existing_index = i
-                            break
-
-                    if existing_index is not None:
-                        st.session_state.annotations[existing_index] = annotation
-                    else:
-                        st.session_state.annotations.append(annotation)
-
-                    imported_count += 1
-
-        return True, f"Импортировано {imported_count} разметок"
+        for accepted, rejected in read_annotations_csv(
+            csv_file, st.session_state.images_list, st.session_state.folder_name
+        ):
+            imported_count += store.bulk_upsert(accepted)
+            rejected_parts.append(rejected)
+
+        report = pd.concat(rejected_parts, ignore_index=True) if rejected_parts else \
+            pd.DataFrame(columns=['line', 'img_path', 'reason'])
+
+        message = f"Импортировано {imported_count} разметок"
+        if len(report):
+            counts = report['reason'].value_counts()
+            message += f", отклонено {len(report)}: " + "; ".join(
+                f"{reason} - {count}" for reason, count in counts.items()
+            )
+
+        return (True, message, report) if with_report else (True, message)
 
     except Exception as e:
-        return False, f"Ошибка при импорте: {str(e)}"
\ No newline at end of file
+        message = f"Ошибка при импорте: {str(e)}"
+        return (False, message, None) if with_report else (False, message)
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import streamlit as st
+
+
+CACHE_DIR = os.environ.get(
+    'DATASET_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'image_validation_app', 'datasets')
+)
+CACHE_QUOTA = int(os.environ.get('DATASET_CACHE_QUOTA_MB', 20 * 1024)) * 1024 * 1024
+
+ARCHIVE_NAME = 'archive.zip'
+INDEX_NAME = 'index.json'
+# Версия формата индекса; индексы другой версии строятся заново по уже скачанному архиву
+INDEX_VERSION = 2
+
+# Недокачанные архивы, к которым не обращались дольше этого срока, удаляются
+STALE_PART_AGE = 7 * 24 * 3600
+# Временные папки старых версий приложения (tempfile.mkdtemp + images.zip/extracted)
+LEGACY_TEMP_ENTRIES = {'images.zip', 'images.zip.part', 'extracted'}
+LEGACY_TEMP_AGE = 3600
+# Метка ключей разовых записей (архив неизвестного размера)
+PRIVATE_MARK = 'unknown'
+
+
+def quick_checksum(path, sample_size=1024 * 1024):
+    """Быстрая контрольная сумма: размер файла, первый и последний мегабайт"""
+
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode('ascii'))
+
+    with open(path, 'rb') as f:
+        digest.update(f.read(sample_size))
+        if size > sample_size:
+            f.seek(max(size - sample_size, sample_size))
+            digest.update(f.read(sample_size))
+
+    return digest.hexdigest()
+
+
+class DatasetCache:
+    """
+    Дисковый кэш архивов и их проверенных индексов изображений.
+    Запись адресуется ID файла Google Drive и размером архива, сверяется по контрольной сумме.
+    Общий размер ограничен квотой, лишнее вытесняется по давности использования
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, quota=CACHE_QUOTA):
+        self.cache_dir = cache_dir
+        self.quota = quota
+        self._lock = threading.Lock()
+        # Записи, открытые сессиями прямо сейчас, - их нельзя вытеснять
+        self._pinned = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(file_id, size):
+        """Ключ записи по ID файла и размеру архива"""
+        return f"{file_id}-{size}"
+
+    @staticmethod
+    def make_private_key(file_id):
+        """
+        Ключ разовой записи для архива неизвестного размера: такую запись нельзя узнать при
+        следующей загрузке, поэтому она удаляется, как только набор перестает использоваться
+        """
+        return f"{file_id}-{PRIVATE_MARK}-{time.time_ns()}"
+
+    @staticmethod
+    def is_private(key):
+        return f"-{PRIVATE_MARK}-" in key
+
+    def entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def archive_path(self, key):
+        """Путь, по которому нужно скачивать архив для записи (докачка переживает перезапуск)"""
+        os.makedirs(self.entry_dir(key), exist_ok=True)
+        return os.path.join(self.entry_dir(key), ARCHIVE_NAME)
+
+    def lookup(self, key):
+        """
+        Возвращает сохраненный индекс записи или None.
+        Индекс содержит root и names каталога изображений и путь к архиву
+        """
+
+        index_path = os.path.join(self.entry_dir(key), INDEX_NAME)
+        archive_path = os.path.join(self.entry_dir(key), ARCHIVE_NAME)
+
+        try:
+            with open(index_path, encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('version') != INDEX_VERSION:
+                raise ValueError("Устаревший формат индекса")
+            if quick_checksum(archive_path) != index.get('checksum'):
+                raise ValueError("Контрольная сумма архива не совпадает")
+        except (OSError, ValueError):
+            return None
+
+        self._touch(key)
+        index['archive_path'] = archive_path
+        return index
+
+    def commit(self, key, catalog, **extra):
+        """Сохраняет проверенный каталог изображений для скачанного архива"""
+
+        archive_path = os.path.join(self.entry_dir(key), ARCHIVE_NAME)
+        index = {
+            'version': INDEX_VERSION,
+            'root': catalog.root,
+            'names': catalog.names,
+            'checksum': quick_checksum(archive_path),
+            'created': time.time(),
+            **extra
+        }
+
+        tmp_path = os.path.join(self.entry_dir(key), f"{INDEX_NAME}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.entry_dir(key), INDEX_NAME))
+
+        self._touch(key)
+        self.enforce_quota(keep={key})
+
+    def pin(self, key):
+        """Защищает запись от вытеснения, пока она используется"""
+        with self._lock:
+            self._pinned[key] = self._pinned.get(key, 0) + 1
+
+    def unpin(self, key):
+        """Снимает защиту, установленную pin()"""
+        with self._lock:
+            if self._pinned.get(key, 0) > 1:
+                self._pinned[key] -= 1
+            else:
+                self._pinned.pop(key, None)
+        self._touch(key)
+
+    def _touch(self, key):
+        """Отмечает время последнего использования записи"""
+        try:
+            os.utime(self.entry_dir(key))
+        except OSError:
+            pass
+
+    def entries(self):
+        """Возвращает записи кэша: (ключ, размер в байтах, время последнего использования, завершена ли)"""
+
+        result = []
+        for key in os.listdir(self.cache_dir):
+            path = self.entry_dir(key)
+            if not os.path.isdir(path):
+                continue
+
+            size = 0
+            for name in os.listdir(path):
+                try:
+                    size += os.path.getsize(os.path.join(path, name))
+                except OSError:
+                    pass
+
+            complete = os.path.exists(os.path.join(path, INDEX_NAME))
+            result.append((key, size, os.path.getmtime(path), complete))
+
+        return result
+
+    def remove(self, key):
+        """Удаляет запись кэша"""
+        shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+
+    def enforce_quota(self, keep=()):
+        """
+        Удаляет давно не использованные записи, пока кэш больше квоты; используемые записи не трогает.
+        Возвращает False, если и после этого кэш больше квоты
+        """
+
+        with self._lock:
+            keep = set(keep) | set(self._pinned)
+            entries = sorted(self.entries(), key=lambda entry: entry[2])
+            total = sum(entry[1] for entry in entries)
+
+            for key, size, _, _ in entries:
+                if total <= self.quota:
+                    break
+                if key in keep:
+                    continue
+                self.remove(key)
+                total -= size
+
+            return total <= self.quota
+
+    def collect_garbage(self):
+        """
+        Удаляет брошенные недокачанные записи и временные папки, оставшиеся от прошлых запусков.
+        Вызывается один раз при старте приложения
+        """
+
+        now = time.time()
+
+        for key, _, last_used, complete in self.entries():
+            # Разовые записи прошлого запуска больше никому не нужны
+            if self.is_private(key) or (not complete and now - last_used > STALE_PART_AGE):
+                self.remove(key)
+
+        temp_root = tempfile.gettempdir()
+        for name in os.listdir(temp_root):
+            path = os.path.join(temp_root, name)
+            if not name.startswith('tmp') or not os.path.isdir(path):
+                continue
+
+            try:
+                contents = set(os.listdir(path))
+                if contents and contents <= LEGACY_TEMP_ENTRIES and now - os.path.getmtime(path) > LEGACY_TEMP_AGE:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                continue
+
+        self.enforce_quota()
+
+
+@st.cache_resource
+def get_dataset_cache():
+    """Общий кэш наборов данных; при первом обращении убирает мусор прошлых запусков"""
+    cache = DatasetCache()
+    cache.collect_garbage()
+    return cache
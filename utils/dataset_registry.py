@@ -0,0 +1,170 @@
+import threading
+import weakref
+import streamlit as st
+from .image_probe import IntegrityCheck
+from .single_flight import SingleFlight
+
+
+class Dataset:
+    """Загруженный набор изображений, общий для всех сессий (только для чтения)"""
+
+    def __init__(self, key, catalog, source, integrity_check=None):
+        self.key = key
+        self.catalog = catalog
+        # Имена изображений в порядке навигации (позиция = id в каталоге)
+        self.images = catalog.names
+        self.source = source
+        # Полная проверка целостности одна на набор, а не на каждую сессию.
+        # Источник, проверяющий файлы сам (папка Google Drive), передает свою
+        self.integrity_check = integrity_check or IntegrityCheck(source, catalog.members())
+
+    def close(self):
+        """Освобождает ресурсы набора"""
+        self.integrity_check.cancel()
+        self.source.close()
+
+
+class DatasetHandle:
+    """
+    Подключение сессии к общему набору.
+    Набор освобождается, когда отпущено последнее подключение - явно или при удалении сессии
+    """
+
+    def __init__(self, registry, dataset, annotation_key=None):
+        self.dataset = dataset
+        # Ключ разметок в базе: привязан к файлу или папке Google Drive, а не к записи кэша
+        self.annotation_key = annotation_key or dataset.key
+        self._finalizer = weakref.finalize(self, registry.detach, dataset.key)
+
+    def release(self):
+        """Отключает сессию от набора"""
+        self._finalizer()
+
+    @property
+    def released(self):
+        return not self._finalizer.alive
+
+
+class DatasetRegistry:
+    """
+    Реестр наборов данных на уровне процесса.
+    Сессии, открывшие один и тот же архив, используют одну копию с общим индексом изображений;
+    одновременные загрузки одного набора объединяются в одну
+    """
+
+    def __init__(self, dataset_cache=None):
+        self.dataset_cache = dataset_cache
+        self._datasets = {}
+        self._refcounts = {}
+        self._lock = threading.Lock()
+        # Одновременные загрузки одного набора выполняются один раз
+        self._flights = SingleFlight()
+
+    def attach(self, key, loader, on_wait=None, annotation_key=None):
+        """
+        Подключает сессию к набору, загружая его через loader(report) при первом обращении.
+        loader возвращает (catalog, source), (catalog, source, integrity_check) или None;
+        report(доля, текст) публикует прогресс загрузки. Сессии, открывающие тот же набор
+        во время загрузки, ждут ее и видят прогресс через on_wait(доля, текст).
+        annotation_key - ключ разметок набора в базе (по умолчанию key)
+        """
+
+        while True:
+            with self._lock:
+                dataset = self._datasets.get(key)
+                if dataset is not None:
+                    self._refcounts[key] += 1
+                    return DatasetHandle(self, dataset, annotation_key)
+
+            dataset = self._flights.run(key, lambda flight: self._load(key, loader, flight.report), on_wait)
+            if dataset is None:
+                return None
+
+            with self._lock:
+                if self._datasets.get(key) is dataset:
+                    self._refcounts[key] += 1
+                    return DatasetHandle(self, dataset, annotation_key)
+            # Набор успели освободить до подключения - загружаем заново
+
+    def _load(self, key, loader, report):
+        """Загружает набор и регистрирует его (без подключений); выполняется одной сессией на ключ"""
+
+        with self._lock:
+            dataset = self._datasets.get(key)
+            if dataset is not None:
+                return dataset
+
+        try:
+            loaded = loader(report)
+        except BaseException:
+            self._discard(key)
+            raise
+        if not loaded:
+            self._discard(key)
+            return None
+
+        with self._lock:
+            dataset = self._datasets.get(key)
+            if dataset is None:
+                dataset = Dataset(key, *loaded)
+                self._datasets[key] = dataset
+                self._refcounts[key] = 0
+                if self.dataset_cache is not None:
+                    self.dataset_cache.pin(key)
+            else:
+                # Набор уже зарегистрирован - лишнюю копию закрываем
+                loaded[1].close()
+
+        return dataset
+
+    def loading(self, key):
+        """Загружается ли набор прямо сейчас"""
+        return self._flights.in_flight(key)
+
+    def detach(self, key):
+        """Уменьшает счетчик подключений и освобождает набор после последнего"""
+
+        with self._lock:
+            if key not in self._refcounts:
+                return
+
+            self._refcounts[key] -= 1
+            if self._refcounts[key] > 0:
+                return
+
+            del self._refcounts[key]
+            dataset = self._datasets.pop(key)
+            if self.dataset_cache is not None:
+                self.dataset_cache.unpin(key)
+
+        dataset.close()
+        self._discard(key)
+
+    def _discard(self, key):
+        """Удаляет с диска разовую запись кэша - повторно ее никто не откроет"""
+        if self.dataset_cache is not None and self.dataset_cache.is_private(key):
+            self.dataset_cache.remove(key)
+
+    def refcount(self, key):
+        """Возвращает количество подключенных сессий"""
+        with self._lock:
+            return self._refcounts.get(key, 0)
+
+
+@st.cache_resource
+def get_dataset_registry():
+    """Общий для всех сессий реестр наборов данных"""
+    from .dataset_cache import get_dataset_cache
+    return DatasetRegistry(get_dataset_cache())
+
+
+def release_session_dataset(session_state):
+    """Отключает сессию от текущего набора и очищает ссылки на его ресурсы"""
+
+    handle = session_state.get('dataset')
+    if handle is not None:
+        handle.release()
+
+    session_state.dataset = None
+    session_state.image_source = None
+    session_state.integrity_check = None
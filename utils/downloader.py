@@ -0,0 +1,328 @@
+import html
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from urllib.parse import urljoin, urlencode
+import requests
+
+
+DRIVE_DOWNLOAD_URL = "https://drive.google.com/uc?export=download&id={file_id}"
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_CONNECTIONS = int(os.environ.get('DOWNLOAD_CONNECTIONS', 4))
+# Файлы меньше этого размера качаются одним соединением
+PARALLEL_MIN_SIZE = 32 * 1024 * 1024
+MAX_RETRIES = 5
+# Прогресс частей сохраняется на диск не чаще, чем раз в STATE_SAVE_INTERVAL секунд
+# или STATE_SAVE_BYTES байт, и всегда при остановке загрузки
+STATE_SAVE_INTERVAL = 1.0
+STATE_SAVE_BYTES = 16 * 1024 * 1024
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+class DownloadError(Exception):
+    """Ошибка скачивания файла"""
+
+
+def get_drive_download_url(file_id):
+    """Создает ссылку на скачивание файла Google Drive"""
+    return DRIVE_DOWNLOAD_URL.format(file_id=file_id)
+
+
+def parse_content_range(value):
+    """Возвращает общий размер из заголовка Content-Range ('bytes 0-99/1000')"""
+    if not value or '/' not in value:
+        return None
+    total = value.rsplit('/', 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+
+def find_confirm_url(page, base_url):
+    """
+    Ищет на странице предупреждения Google Drive ссылку подтверждения скачивания.
+    Поддерживает форму download-form и старые ссылки с параметром confirm
+    """
+
+    form = re.search(r'<form[^>]*id="download-form"[^>]*action="([^"]+)"[^>]*>(.*?)</form>', page, re.S)
+    if form:
+        action = html.unescape(form.group(1))
+        inputs = re.findall(r'<input[^>]*name="([^"]+)"[^>]*value="([^"]*)"', form.group(2))
+        return f"{urljoin(base_url, action)}?{urlencode([(n, html.unescape(v)) for n, v in inputs])}"
+
+    link = re.search(r'href="(/uc\?export=download[^"]*confirm=[^"]+)"', page)
+    if link:
+        return urljoin(base_url, html.unescape(link.group(1)))
+
+    token = re.search(r'confirm=([0-9A-Za-z_-]+)', page)
+    if token:
+        separator = '&' if '?' in base_url else '?'
+        return f"{base_url}{separator}confirm={token.group(1)}"
+
+    return None
+
+
+class Downloader:
+    """
+    Скачивание больших файлов с докачкой по HTTP Range и необязательной
+    параллельной загрузкой частей в несколько соединений
+    """
+
+    def __init__(self, session=None, connections=DEFAULT_CONNECTIONS, chunk_size=CHUNK_SIZE,
+                 timeout=30, max_retries=MAX_RETRIES, parallel_min_size=PARALLEL_MIN_SIZE):
+        self.session = session or requests.Session()
+        self.session.headers.setdefault('User-Agent', USER_AGENT)
+        self.connections = max(1, connections)
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.parallel_min_size = parallel_min_size
+
+        self._downloaded = 0
+        self._unsaved = 0
+        self._saved_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Прерывает текущие и будущие скачивания этого загрузчика, в том числе паузы между повторами"""
+        self._cancelled.set()
+
+    def _check_cancelled(self):
+        if self._cancelled.is_set():
+            raise DownloadError("Скачивание остановлено")
+
+    def _backoff(self, attempt):
+        """Пауза перед повтором, которую прерывает cancel()"""
+        if self._cancelled.wait(min(2 ** attempt, 30)):
+            raise DownloadError("Скачивание остановлено")
+
+    def resolve(self, url):
+        """
+        Проходит страницу подтверждения Google Drive и определяет параметры файла.
+        Возвращает (итоговый URL, размер или None, поддерживаются ли Range-запросы)
+        """
+
+        for _ in range(3):
+            response = self.session.get(url, headers={'Range': 'bytes=0-'}, stream=True,
+                                        timeout=self.timeout, allow_redirects=True)
+            try:
+                if response.status_code not in (200, 206):
+                    raise DownloadError(f"HTTP {response.status_code} при скачивании файла")
+
+                content_type = response.headers.get('Content-Type', '')
+                if 'text/html' in content_type:
+                    # Google Drive вместо файла отдает страницу предупреждения о проверке на вирусы
+                    confirm_url = self._confirm_url_from_response(response)
+                    if not confirm_url:
+                        raise DownloadError("Файл недоступен: Google Drive вернул HTML страницу")
+                    url = confirm_url
+                    continue
+
+                total = parse_content_range(response.headers.get('Content-Range'))
+                if total is None and response.status_code == 200:
+                    length = response.headers.get('Content-Length')
+                    total = int(length) if length and length.isdigit() else None
+
+                ranges = response.status_code == 206 or response.headers.get('Accept-Ranges') == 'bytes'
+                return response.url, total, ranges
+            finally:
+                response.close()
+
+        raise DownloadError("Не удалось пройти подтверждение скачивания Google Drive")
+
+    def _confirm_url_from_response(self, response):
+        """Строит ссылку подтверждения из cookie download_warning или HTML страницы"""
+
+        for name, value in response.cookies.items():
+            if name.startswith('download_warning'):
+                separator = '&' if '?' in response.url else '?'
+                return f"{response.url}{separator}confirm={value}"
+
+        return find_confirm_url(response.text, response.url)
+
+    def download(self, url, dest_path, progress_callback=None, resolved=None):
+        """
+        Скачивает файл в dest_path. Недокачанные данные хранятся в dest_path + '.part'
+        и продолжаются при следующем вызове.
+        progress_callback(скачано байт, всего байт или None, скорость байт/с) вызывается из потока вызова.
+        resolved - уже полученный результат resolve(url)
+        """
+
+        final_url, total, ranges = resolved or self.resolve(url)
+        part_path = f"{dest_path}.part"
+
+        if ranges and total and self.connections > 1 and total >= self.parallel_min_size:
+            self._download_parallel(final_url, part_path, total, progress_callback)
+        else:
+            self._download_single(final_url, part_path, total, ranges, progress_callback)
+
+        size = os.path.getsize(part_path)
+        if total is not None and size != total:
+            raise DownloadError(f"Размер файла не совпадает: {size} из {total} байт")
+
+        os.replace(part_path, dest_path)
+        state_path = f"{part_path}.json"
+        if os.path.exists(state_path):
+            os.remove(state_path)
+
+        return dest_path
+
+    def _download_single(self, url, part_path, total, ranges, progress_callback):
+        """Скачивает файл одним соединением с докачкой после обрыва"""
+
+        started = time.monotonic()
+        resumed_from = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if not ranges:
+            resumed_from = 0
+
+        for attempt in range(self.max_retries + 1):
+            self._check_cancelled()
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) and ranges else 0
+            if total is not None and offset >= total:
+                return
+
+            headers = {'Range': f'bytes={offset}-'} if offset else {}
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    if response.status_code == 200:
+                        # Сервер проигнорировал Range - начинаем заново
+                        offset = 0
+                    elif response.status_code != 206:
+                        raise DownloadError(f"HTTP {response.status_code} при скачивании файла")
+
+                    with open(part_path, 'r+b' if offset else 'wb') as f:
+                        f.seek(offset)
+                        downloaded = offset
+                        for chunk in response.iter_content(self.chunk_size):
+                            self._check_cancelled()
+                            f.write(chunk)
+                            downloaded += len(chunk)
+                            if progress_callback:
+                                elapsed = max(time.monotonic() - started, 1e-6)
+                                progress_callback(downloaded, total, (downloaded - resumed_from) / elapsed)
+                return
+
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                if attempt == self.max_retries:
+                    raise DownloadError(f"Соединение прервано: {e}")
+                self._backoff(attempt)
+
+    def _download_parallel(self, url, part_path, total, progress_callback):
+        """Скачивает части файла параллельно; выполненные части запоминаются для докачки"""
+
+        state_path = f"{part_path}.json"
+        part_size = max(self.chunk_size, -(-total // (self.connections * 4)))
+        parts = [(start, min(start + part_size, total) - 1) for start in range(0, total, part_size)]
+
+        # Сколько байт каждой части уже скачано
+        state = {'total': total, 'part_size': part_size, 'done': [0] * len(parts)}
+        if os.path.exists(part_path) and os.path.exists(state_path):
+            try:
+                with open(state_path) as f:
+                    saved = json.load(f)
+                if saved.get('total') == total and saved.get('part_size') == part_size:
+                    state = saved
+            except (OSError, ValueError):
+                pass
+
+        if state['done'] == [0] * len(parts) or not os.path.exists(part_path):
+            with open(part_path, 'wb') as f:
+                f.truncate(total)
+            state['done'] = [0] * len(parts)
+
+        self._downloaded = sum(state['done'])
+        resumed_from = self._downloaded
+        started = time.monotonic()
+
+        self._stop.clear()
+        self._unsaved = 0
+        self._saved_at = started
+        fd = os.open(part_path, os.O_RDWR)
+        try:
+            with ThreadPoolExecutor(max_workers=self.connections, thread_name_prefix='download') as executor:
+                futures = [
+                    executor.submit(self._fetch_part, url, fd, i, start, end, state, state_path)
+                    for i, (start, end) in enumerate(parts)
+                    if state['done'][i] < end - start + 1
+                ]
+
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, timeout=0.5, return_when=FIRST_EXCEPTION)
+                    for future in done:
+                        if future.exception() is not None:
+                            # Останавливаем остальные части, прогресс сохранен для докачки
+                            self._stop.set()
+                            raise future.exception()
+
+                    if self._cancelled.is_set():
+                        self._stop.set()
+                        raise DownloadError("Скачивание остановлено")
+
+                    if progress_callback:
+                        with self._lock:
+                            downloaded = self._downloaded
+                        elapsed = max(time.monotonic() - started, 1e-6)
+                        progress_callback(downloaded, total, (downloaded - resumed_from) / elapsed)
+
+                # Части, прерванные отменой, завершаются без ошибки - файл не дописан
+                self._check_cancelled()
+        finally:
+            # Все части остановлены - запоминаем точный прогресс для докачки
+            with self._lock:
+                self._checkpoint(state, state_path)
+            os.close(fd)
+
+    def _fetch_part(self, url, fd, index, start, end, state, state_path):
+        """Скачивает одну часть файла с повторами после обрыва"""
+
+        for attempt in range(self.max_retries + 1):
+            offset = start + state['done'][index]
+            if offset > end:
+                return
+
+            try:
+                headers = {'Range': f'bytes={offset}-{end}'}
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    if response.status_code != 206:
+                        raise DownloadError(f"Сервер не поддерживает частичную загрузку: HTTP {response.status_code}")
+
+                    for chunk in response.iter_content(self.chunk_size):
+                        if self._stop.is_set() or self._cancelled.is_set():
+                            return
+                        chunk = chunk[:end - offset + 1]
+                        os.pwrite(fd, chunk, offset)
+                        offset += len(chunk)
+
+                        with self._lock:
+                            self._downloaded += len(chunk)
+                            state['done'][index] = offset - start
+                            self._unsaved += len(chunk)
+                            if self._unsaved >= STATE_SAVE_BYTES or \
+                                    time.monotonic() - self._saved_at >= STATE_SAVE_INTERVAL:
+                                self._checkpoint(state, state_path)
+                return
+
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                if attempt == self.max_retries:
+                    raise DownloadError(f"Соединение прервано: {e}")
+                self._backoff(attempt)
+
+    def _checkpoint(self, state, state_path):
+        """Сохраняет прогресс частей и сбрасывает счетчики троттлинга (вызывается под блокировкой)"""
+        self._save_state(state, state_path)
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
+
+    @staticmethod
+    def _save_state(state, state_path):
+        """Сохраняет прогресс частей для докачки (вызывается под блокировкой)"""
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
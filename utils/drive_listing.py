@@ -0,0 +1,269 @@
+import html
+import json
+import os
+import re
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .single_flight import SingleFlight
+
+
+DRIVE_WEB_URL = "https://drive.google.com"
+DRIVE_API_URL = "https://www.googleapis.com/drive/v3/files"
+
+# С ключом API список папки читается постранично через Drive API v3, без ключа - со страниц сайта
+API_KEY = os.environ.get('GOOGLE_DRIVE_API_KEY', '')
+PAGE_SIZE = 1000
+POOL_SIZE = int(os.environ.get('DRIVE_POOL_SIZE', 8))
+TIMEOUT = 15
+MAX_RETRIES = 3
+# Защита от зацикливания, если сервер возвращает один и тот же токен
+MAX_PAGES = 10000
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tiff', '.tif')
+
+# Запись списка embeddedfolderview: <div class="flip-entry" id="entry-ID"> ... <div class="flip-entry-title">имя</div>
+_EMBEDDED_ENTRY = re.compile(
+    r'id="entry-([A-Za-z0-9_-]{10,})".*?class="flip-entry-title">([^<]*)<',
+    re.S
+)
+
+
+class DriveListingError(Exception):
+    """Ошибка получения списка файлов папки"""
+
+
+class DriveNetworkError(DriveListingError):
+    """Сервер недоступен: запрос не дошел или ответ не получен"""
+
+
+def make_session(pool_size=POOL_SIZE, max_retries=MAX_RETRIES):
+    """Сессия с пулом keep-alive соединений и повторами при 429/5xx"""
+
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=('GET', 'HEAD'),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+
+def file_entry(file_id, filename):
+    """Запись о файле в формате списков google_drive"""
+    return {
+        'filename': filename,
+        'file_id': file_id,
+        'view_url': f"https://drive.google.com/file/d/{file_id}/preview" if file_id else None
+    }
+
+
+def parse_api_page(text):
+    """Разбирает ответ Drive API"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        raise DriveListingError("Drive API вернул некорректный ответ")
+
+
+def parse_folder_page(page):
+    """Пары [id или None, имя] со страницы папки"""
+    # Импорт здесь: google_drive импортирует этот модуль
+    from .google_drive import iter_files_from_html
+    return [[file_id, filename] for file_id, filename in iter_files_from_html(page)]
+
+
+def parse_embedded_listing(page):
+    """Возвращает пары (id, имя) со страницы embeddedfolderview - в ней у каждой записи есть id"""
+    return [[file_id, html.unescape(title).strip()] for file_id, title in _EMBEDDED_ENTRY.findall(page)]
+
+
+class DriveListingClient:
+    """
+    Клиент списков публичных папок Google Drive.
+    Все запросы идут через одну сессию с пулом соединений. С ключом API список читается
+    постранично (nextPageToken), и файлы отдаются генератором по мере получения страниц.
+    Без ключа используются страница папки и embeddedfolderview, откуда берутся недостающие id.
+    С page_cache страницы перепроверяются условными запросами и не разбираются повторно без изменений
+    """
+
+    def __init__(self, session=None, api_key=None, web_url=None, api_url=None,
+                 page_size=PAGE_SIZE, timeout=TIMEOUT, page_cache=None):
+        self.session = session or make_session()
+        # Кэш разобранных страниц с условными запросами (ListingCache) или None
+        self.page_cache = page_cache
+        self.api_key = API_KEY if api_key is None else api_key
+        # Адреса читаются при создании, чтобы их можно было подменить локальным сервером
+        self.web_url = (web_url or DRIVE_WEB_URL).rstrip('/')
+        self.api_url = api_url or DRIVE_API_URL
+        self.page_size = page_size
+        self.timeout = timeout
+        self._flights = SingleFlight()
+
+    def iter_files(self, folder_id):
+        """Генератор записей об изображениях папки: {'filename', 'file_id', 'view_url'}"""
+
+        if self.api_key:
+            yield from self._iter_api(folder_id)
+        else:
+            yield from self._iter_web(folder_id)
+
+    def list_files(self, folder_id, on_wait=None):
+        """
+        Полный список изображений папки.
+        Одновременные запросы одной папки выполняются одним обходом страниц, остальные ждут его
+        """
+        files = self._flights.run(folder_id, lambda flight: list(self.iter_files(folder_id)), on_wait)
+        # У каждого вызывающего своя копия списка
+        return list(files)
+
+    def iter_pages(self, folder_id):
+        """Генератор страниц Drive API: каждая страница - список записей о файлах"""
+
+        page_token = None
+        for _ in range(MAX_PAGES):
+            params = {
+                'q': f"'{folder_id}' in parents and trashed = false",
+                'pageSize': self.page_size,
+                'fields': 'nextPageToken, files(id, name, mimeType)',
+                'key': self.api_key
+            }
+            if page_token:
+                params['pageToken'] = page_token
+
+            data = self._fetch_parsed(self.api_url, params, parse_api_page)
+
+            yield [
+                file_entry(item.get('id'), item.get('name', ''))
+                for item in data.get('files', [])
+                if item.get('mimeType', '').startswith('image/') or is_image_name(item.get('name'))
+            ]
+
+            next_token = data.get('nextPageToken')
+            if not next_token or next_token == page_token:
+                return
+            page_token = next_token
+
+        raise DriveListingError("Слишком много страниц в списке папки")
+
+    def _iter_api(self, folder_id):
+        seen = set()
+        for page in self.iter_pages(folder_id):
+            for entry in page:
+                if entry['file_id'] not in seen:
+                    seen.add(entry['file_id'])
+                    yield entry
+
+    def _iter_web(self, folder_id):
+        """Список со страниц сайта: сначала страница папки, затем embeddedfolderview для файлов без id"""
+
+        found = self._fetch_parsed(f"{self.web_url}/drive/folders/{folder_id}", None, parse_folder_page)
+
+        # Файлы с id отдаем сразу, остальные ждут embeddedfolderview.
+        # Страница папки у больших папок обрезана, поэтому второй список читается всегда.
+        # Повторы отсеиваются по id: в папке могут быть разные файлы с одинаковыми именами
+        seen = set()
+        # Имя -> записи без id с этим именем
+        missing = {}
+        for file_id, filename in found:
+            entry = file_entry(file_id, filename)
+            if file_id:
+                if file_id not in seen:
+                    seen.add(file_id)
+                    yield entry
+            else:
+                missing.setdefault(filename, []).append(entry)
+
+        for file_id, filename in self.fetch_embedded_listing(folder_id):
+            if file_id in seen or not is_image_name(filename):
+                continue
+            seen.add(file_id)
+            # Запись со страницы папки получила id
+            if missing.get(filename):
+                missing[filename].pop()
+            yield file_entry(file_id, filename)
+
+        # Имена, для которых id так и не нашелся
+        for entries in missing.values():
+            yield from entries
+
+    def fetch_folder_page(self, folder_id):
+        """HTML страница папки"""
+        return self._get(f"{self.web_url}/drive/folders/{folder_id}").text
+
+    def fetch_embedded_listing(self, folder_id):
+        """Пары (id, имя) из embeddedfolderview; пустой список, если страница недоступна"""
+        try:
+            return self._fetch_parsed(f"{self.web_url}/embeddedfolderview", {'id': folder_id}, parse_embedded_listing)
+        except DriveListingError:
+            return []
+
+    def check_access(self, folder_id):
+        """Проверяет доступ к папке, возвращает (доступна ли, сообщение)"""
+
+        try:
+            response = self.session.get(f"{self.web_url}/drive/folders/{folder_id}", timeout=self.timeout)
+        except requests.RequestException as e:
+            return False, f"Ошибка подключения: {str(e)}"
+
+        if response.status_code == 200:
+            if 'This folder doesn\'t exist' in response.text:
+                return False, "Папка не существует или нет доступа"
+            return True, "Доступ к папке есть"
+        elif response.status_code == 403:
+            return False, "Нет прав доступа к папке"
+        elif response.status_code == 404:
+            return False, "Папка не найдена"
+        else:
+            return False, f"HTTP ошибка: {response.status_code}"
+
+    def _get(self, url, params=None, headers=None):
+        try:
+            response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise DriveNetworkError(f"Ошибка сети: {str(e)}")
+
+        # 304 возможен только в ответ на условный запрос из кэша страниц
+        if response.status_code != 200 and not (response.status_code == 304 and headers):
+            raise DriveListingError(f"Ошибка доступа к папке: HTTP {response.status_code}")
+
+        return response
+
+    def _fetch_parsed(self, url, params, parse):
+        """Загружает и разбирает страницу; с кэшем страниц разбор повторяется только при изменении"""
+
+        if self.page_cache is None:
+            return parse(self._get(url, params=params).text)
+
+        return self.page_cache.fetch(
+            lambda url, params, headers: self._get(url, params=params, headers=headers),
+            url, params, parse
+        )
+
+    def close(self):
+        self.session.close()
+
+
+def is_image_name(filename):
+    """Проверяет расширение имени файла"""
+    return bool(filename) and filename.lower().endswith(IMAGE_EXTENSIONS)
+
+
+@st.cache_resource
+def get_drive_listing_client():
+    """
+    Общий клиент процесса: соединения пула переиспользуются всеми запросами к Drive,
+    страницы списков перепроверяются через общий дисковый кэш
+    """
+    from .listing_cache import get_listing_cache
+    return DriveListingClient(page_cache=get_listing_cache())
@@ -0,0 +1,296 @@
+import io
+import itertools
+import os
+import queue
+import threading
+import time
+from .downloader import Downloader, get_drive_download_url
+from .drive_listing import make_session
+from .image_probe import probe_image_with_fallback, verify_image
+from .parallel_ingest import MIN_IMAGE_SIZE
+
+
+# Число одновременных скачиваний файлов папки
+DEFAULT_WORKERS = int(os.environ.get('FOLDER_DOWNLOAD_WORKERS', 8))
+# Сколько ждать изображение, которое еще не скачано (например, первое изображение при открытии папки)
+WAIT_TIMEOUT = float(os.environ.get('FOLDER_WAIT_TIMEOUT', 15))
+# Сколько ждать при показе: дольше ждать нельзя - поток скрипта не должен блокироваться,
+# вместо изображения сразу показывается заглушка
+DISPLAY_WAIT = float(os.environ.get('FOLDER_DISPLAY_WAIT', 0.5))
+# Сколько close() ждет остановки потоков; зависшее скачивание дозавершится в фоне и ничего не запишет
+CLOSE_TIMEOUT = float(os.environ.get('FOLDER_CLOSE_TIMEOUT', 2))
+# Квота дискового кэша проверяется после каждых QUOTA_CHECK_BYTES скачанных байт
+QUOTA_CHECK_BYTES = 64 * 1024 * 1024
+
+PENDING, LOADING, READY, BROKEN = range(4)
+
+# Запрошенные для показа изображения обгоняют очередь в порядке навигации
+_URGENT = -1
+
+
+class ImageNotReady(Exception):
+    """Изображение еще скачивается"""
+
+
+class SkippedImage(ValueError):
+    """Изображение не прошло проверку после скачивания (повреждено или слишком маленькое)"""
+
+
+class _Cancelled(Exception):
+    """Скачивание прервано закрытием источника"""
+
+
+def unique_names(files):
+    """
+    Пары (имя, file_id) с уникальными именами: в папке Google Drive могут быть одноименные файлы,
+    повторы получают путь '<file_id>/<имя>'
+    """
+
+    seen = set()
+    result = []
+    for file_id, filename in files:
+        name = filename if filename not in seen else f"{file_id}/{filename}"
+        seen.add(name)
+        result.append((name, file_id))
+    return result
+
+
+class FolderImageSource:
+    """
+    Источник изображений из публичной папки Google Drive.
+    Файлы скачиваются в фоне ограниченным пулом потоков в порядке навигации и проверяются
+    сразу после скачивания, поэтому разметку можно начинать на первых изображениях.
+    Запрошенное для показа изображение скачивается вне очереди.
+    Скачанные файлы лежат в cache_dir и переиспользуются при следующем открытии папки;
+    недокачанные пишутся во временные файлы этого источника, поэтому два источника одной папки
+    не пишут в один файл. check_quota() вызывается по мере скачивания; если он вернул False,
+    фоновое скачивание останавливается и качаются только запрошенные для показа изображения.
+    Заодно служит проверкой целостности набора: progress() / done / cancel()
+    """
+
+    title = "📥 Скачано изображений"
+
+    def __init__(self, files, cache_dir, workers=DEFAULT_WORKERS, min_size=MIN_IMAGE_SIZE, downloader=None,
+                 check_quota=None):
+        # Имя изображения -> file_id
+        self.files = dict(files)
+        self.cache_dir = cache_dir
+        self.min_size = min_size
+        self.check_quota = check_quota
+        # Кэш переполнен - фоновое скачивание остановлено
+        self.over_quota = False
+        self._unchecked_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.total = len(self.files)
+        self.checked = 0
+        self.broken = {}
+
+        self._state = {name: PENDING for name in self.files}
+        self._ready = {name: threading.Event() for name in self.files}
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._closed = False
+        # Временные файлы скачивания различаются по источнику
+        self._token = f"{os.getpid()}-{id(self):x}"
+
+        workers = max(1, min(workers, self.total or 1))
+        self.downloader = downloader or Downloader(session=make_session(pool_size=workers), connections=1)
+
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        for position, name in enumerate(self.files):
+            self._queue.put((position, next(self._order), name))
+
+        self._threads = [
+            threading.Thread(target=self._work, name=f'folder-download-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, self.files[name])
+
+    def _work(self):
+        while not self._cancelled:
+            try:
+                priority, _, name = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self.done:
+                    return
+                continue
+
+            # При переполненном кэше фоновые задачи отбрасываются; prioritize() вернет нужные в очередь
+            if self.over_quota and priority != _URGENT:
+                continue
+
+            with self._lock:
+                if self._state[name] != PENDING:
+                    continue
+                self._state[name] = LOADING
+
+            try:
+                error = self._fetch(name)
+            except _Cancelled:
+                return
+
+            with self._lock:
+                self._state[name] = BROKEN if error else READY
+                if error:
+                    self.broken[name] = error
+                self.checked += 1
+            self._ready[name].set()
+
+    def _fetch(self, name):
+        """Скачивает (если файла еще нет) и проверяет изображение. Возвращает текст ошибки или None"""
+
+        path = self._path(name)
+        stored = 0
+        try:
+            if not os.path.exists(path):
+                self._download(name, path)
+                stored = os.path.getsize(path)
+
+            with open(path, 'rb') as fp:
+                _, width, height = probe_image_with_fallback(fp)
+                fp.seek(0)
+                verify_image(fp)
+        except _Cancelled:
+            raise
+        except Exception as e:
+            if self._cancelled:
+                # Ошибка вызвана остановкой скачивания, а не файлом
+                raise _Cancelled()
+            # Поврежденный файл не должен считаться скачанным при следующем открытии
+            if os.path.exists(path):
+                os.remove(path)
+            return str(e)
+
+        self._count_stored(stored)
+        if width <= self.min_size or height <= self.min_size:
+            return f"Изображение меньше {self.min_size}px"
+        return None
+
+    def _download(self, name, path):
+        """Скачивает файл во временный файл источника и переносит его в кэш"""
+
+        download_path = f"{path}.{self._token}.download"
+
+        def on_progress(downloaded, total, speed):
+            # Закрытие источника прерывает скачивание на следующем блоке
+            if self._cancelled:
+                raise _Cancelled()
+
+        try:
+            self.downloader.download(
+                get_drive_download_url(self.files[name]), download_path, progress_callback=on_progress
+            )
+            # Источник закрыли, пока файл докачивался: в кэш ничего не попадает
+            if self._cancelled:
+                raise _Cancelled()
+            os.replace(download_path, path)
+        except BaseException:
+            for leftover in (download_path, f"{download_path}.part", f"{download_path}.part.json"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+
+    def _count_stored(self, size):
+        """Учитывает скачанный файл и время от времени проверяет квоту кэша"""
+        if self.check_quota is None or not size:
+            return
+        with self._lock:
+            self._unchecked_bytes += size
+            if self._unchecked_bytes < QUOTA_CHECK_BYTES:
+                return
+            self._unchecked_bytes = 0
+        if not self.check_quota():
+            self.over_quota = True
+
+    def prioritize(self, name):
+        """Ставит изображение в начало очереди скачивания"""
+        if self._state.get(name) == PENDING:
+            self._queue.put((_URGENT, next(self._order), name))
+
+    def wait(self, name, timeout=WAIT_TIMEOUT):
+        """Ждет скачивания изображения; бросает ImageNotReady, если не дождались"""
+
+        if self._closed:
+            raise ValueError("Источник изображений закрыт")
+
+        self.prioritize(name)
+        if not self._ready[name].wait(timeout):
+            raise ImageNotReady("Изображение еще загружается")
+        if self._closed:
+            raise ValueError("Источник изображений закрыт")
+
+        error = self.broken.get(name)
+        if error:
+            raise SkippedImage(error)
+
+    def is_ready(self, name):
+        """Скачано ли изображение"""
+        return self._state.get(name) == READY
+
+    def names(self):
+        """Имена изображений в порядке навигации"""
+        return list(self.files)
+
+    def read(self, name, timeout=DISPLAY_WAIT):
+        """Читает байты изображения, подождав его скачивания не дольше timeout секунд"""
+        self.wait(name, timeout)
+        with open(self._path(name), 'rb') as f:
+            return f.read()
+
+    def open(self, name, timeout=DISPLAY_WAIT):
+        self.wait(name, timeout)
+        return open(self._path(name), 'rb')
+
+    def open_image_bytes(self, name, timeout=DISPLAY_WAIT):
+        """Возвращает байты изображения в виде файлового объекта для PIL"""
+        return io.BytesIO(self.read(name, timeout))
+
+    def identity(self, name):
+        """Идентификатор содержимого изображения для кэша отображения"""
+        return f"drive:{self.files[name]}:{name}"
+
+    # Интерфейс проверки целостности набора
+
+    @property
+    def done(self):
+        return self.checked >= self.total
+
+    def progress(self):
+        """Возвращает (обработано, всего, словарь проблемных файлов)"""
+        with self._lock:
+            return self.checked, self.total, dict(self.broken)
+
+    def cancel(self):
+        """Останавливает скачивание"""
+        self._cancelled = True
+        self.downloader.cancel()
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """
+        Прерывает скачивания и ждет потоки не дольше timeout секунд. Поток, зависший на сети,
+        завершится сам после таймаута запроса и уберет свои временные файлы, не записав их в кэш
+        """
+
+        self.cancel()
+        self._closed = True
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(max(deadline - time.monotonic(), 0))
+
+        # Ожидающие изображений получат ошибку вместо таймаута
+        for event in self._ready.values():
+            event.set()
+        self.downloader.session.close()
+
+    def __contains__(self, name):
+        return name in self.files
+
+    def __len__(self):
+        return self.total
@@ -1,8 +1,6 @@
 import streamlit as st
-import requests
 import re
-from urllib.parse import urlparse, parse_qs
-import json
+from .drive_listing import get_drive_listing_client, file_entry, DriveListingError
 
 
 def extract_folder_id_from_url(url):
@@ -27,7 +25,8 @@ def extract_folder_id_from_url(url):
 def get_files_from_public_folder(folder_url):
     """
     Получает список файлов из публичной папки Google Drive
-    Использует веб-скрейпинг, так как папка публичная
+    Использует Drive API, если задан ключ, иначе веб-скрейпинг, так как папка публичная.
+    Одновременные запросы одной папки объединяются в один
     """
 
     folder_id = extract_folder_id_from_url(folder_url)
@@ -35,101 +34,119 @@ def get_files_from_public_folder(folder_url):
         raise Exception("Не удалось извлечь ID папки из URL")
 
     try:
-        # Формируем URL для получения списка файлов
-        api_url = f"https://drive.google.com/drive/folders/{folder_id}"
+        return get_drive_listing_client().list_files(folder_id)
 
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-
-        # Делаем запрос
-        response = requests.get(api_url, headers=headers, timeout=15)
-
-        if response.status_code != 200:
-            raise Exception(f"Ошибка доступа к папке: HTTP {response.status_code}")
+    except DriveListingError as e:
+        raise Exception(str(e))
+    except Exception as e:
+        raise Exception(f"Ошибка при получении файлов: {str(e)}")
 
-        # Парсим HTML для извлечения информации о файлах
-        html_content = response.text
 
-        # Ищем JSON данные в HTML
-        files_data = extract_files_from_html(html_content)
+def iter_files_from_public_folder(folder_url):
+    """
+    Генератор файлов публичной папки: записи отдаются по мере получения страниц списка.
+    Запросы идут через общий клиент с пулом соединений
+    """
 
-        if not files_data:
-            # Альтернативный метод - через embeddedfolderview
-            return get_files_alternative_method(folder_id)
+    folder_id = extract_folder_id_from_url(folder_url)
+    if not folder_id:
+        raise Exception("Не удалось извлечь ID папки из URL")
 
-        return files_data
+    try:
+        yield from get_drive_listing_client().iter_files(folder_id)
 
-    except requests.RequestException as e:
-        raise Exception(f"Ошибка сети: {str(e)}")
+    except DriveListingError as e:
+        raise Exception(str(e))
     except Exception as e:
         raise Exception(f"Ошибка при получении файлов: {str(e)}")
 
 
-def extract_files_from_html(html_content):
-    """Извлекает информацию о файлах из HTML страницы Google Drive"""
+# Один проход по странице: кавычки с id или именем изображения, имена в одинарных кавычках
+# (для запасного поиска) и '}' - граница записи, за которую пары id/имя не ищутся.
+# Проверки is_likely_file_id (длина, буквы и цифры) встроены в шаблон id
+_IMAGE_EXTENSION = r'\.(?:jpg|jpeg|png|gif|bmp|webp)'
+_HTML_TOKEN = re.compile(
+    r'"(?:(?=[a-zA-Z_-]*[0-9])(?=[0-9_-]*[a-zA-Z])([a-zA-Z0-9_-]{25,50})|([^"]*' + _IMAGE_EXTENSION + r'))"'
+    r"|'([^']*" + _IMAGE_EXTENSION + r")'"
+    r'|\}',
+    re.IGNORECASE
+)
 
-    files = []
+_ASCII_LETTERS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ')
+_ASCII_DIGITS = frozenset('0123456789')
 
-    # Более агрессивные паттерны для поиска файлов и их ID
-    patterns = [
-        # Паттерн 1: JSON структуры с ID и именем
-        r'"([a-zA-Z0-9_-]{25,})"[^}]*?"([^"]*\.(?:jpg|jpeg|png|gif|bmp|webp))"',
-        r'"([^"]*\.(?:jpg|jpeg|png|gif|bmp|webp))"[^}]*?"([a-zA-Z0-9_-]{25,})"',
+# Если пар id/имя меньше, добавляются имена без id
+MIN_FILES_WITH_ID = 5
 
-        # Паттерн 2: Прямые вхождения
-        r'data-id="([a-zA-Z0-9_-]{25,})"[^>]*?title="([^"]*\.(?:jpg|jpeg|png|gif|bmp|webp))"',
-        r'title="([^"]*\.(?:jpg|jpeg|png|gif|bmp|webp))"[^>]*?data-id="([a-zA-Z0-9_-]{25,})"',
 
-        # Паттерн 3: В скриптах
-        r'"id":"([a-zA-Z0-9_-]{25,})"[^}]*?"name":"([^"]*\.(?:jpg|jpeg|png|gif|bmp|webp))"',
-        r'"name":"([^"]*\.(?:jpg|jpeg|png|gif|bmp|webp))"[^}]*?"id":"([a-zA-Z0-9_-]{25,})"',
-    ]
+def iter_files_from_html(html_content):
+    """
+    Генератор пар (file_id, filename) со страницы Google Drive за один линейный проход.
+    Сначала идут пары "id ... имя" внутри одной записи, затем "имя ... id" для имен,
+    не найденных первым способом, затем (если пар мало) имена без id - file_id равен None
+    """
 
-    found_files = {}  # Используем dict для избежания дубликатов
+    found = set()
+    # Пары "имя ... id" уступают парам "id ... имя", поэтому откладываются до конца прохода
+    reverse_pairs = []
+    bare_names = []
+    single_quoted = []
+
+    pending_id = None
+    pending_name = None
+
+    for match in _HTML_TOKEN.finditer(html_content):
+        file_id, filename, quoted_name = match.groups()
+
+        if file_id is not None:
+            if pending_name is not None:
+                reverse_pairs.append((file_id, pending_name))
+                pending_name = None
+            if pending_id is None:
+                pending_id = file_id
+
+        elif filename is not None:
+            bare_names.append(filename)
+            if pending_id is not None:
+                if filename not in found:
+                    found.add(filename)
+                    yield pending_id, filename
+                pending_id = None
+            if pending_name is None:
+                pending_name = filename
+
+        elif quoted_name is not None:
+            single_quoted.append(quoted_name)
 
-    for pattern in patterns:
-        matches = re.findall(pattern, html_content, re.IGNORECASE)
-
-        for match in matches:
-            if len(match) != 2:
-                continue
-
-            # Определяем что является файлом, а что ID
-            if is_likely_file_id(match[0]) and is_image_file(match[1]):
-                file_id, filename = match[0], match[1]
-            elif is_likely_file_id(match[1]) and is_image_file(match[0]):
-                file_id, filename = match[1], match[0]
-            else:
-                continue
-
-            # Добавляем только уникальные файлы
-            if filename not in found_files:
-                found_files[filename] = {
-                    'filename': filename,
-                    'file_id': file_id,
-                    'view_url': f"https://drive.google.com/file/d/{file_id}/preview"
-                }
+        else:
+            # '}' закрывает запись
+            pending_id = None
+            pending_name = None
+
+    for file_id, filename in reverse_pairs:
+        if filename not in found:
+            found.add(filename)
+            yield file_id, filename
 
     # Дополнительный поиск только имен файлов (без ID)
-    if len(found_files) < 5:  # Если нашли мало файлов, ищем без ID
-        filename_patterns = [
-            r'"([^"]*\.(?:jpg|jpeg|png|gif|bmp|webp))"',
-            r"'([^']*\.(?:jpg|jpeg|png|gif|bmp|webp))'",
-        ]
+    if len(found) < MIN_FILES_WITH_ID:
+        for filename in bare_names + single_quoted:
+            if len(filename) > 5 and filename not in found and is_image_file(filename):
+                found.add(filename)
+                yield None, filename
 
-        for pattern in filename_patterns:
-            matches = re.findall(pattern, html_content, re.IGNORECASE)
 
-            for filename in matches:
-                if is_image_file(filename) and len(filename) > 5 and filename not in found_files:
-                    found_files[filename] = {
-                        'filename': filename,
-                        'file_id': None,
-                        'view_url': None
-                    }
+def extract_files_from_html(html_content):
+    """Извлекает информацию о файлах из HTML страницы Google Drive"""
 
-    return list(found_files.values())
+    return [
+        {
+            'filename': filename,
+            'file_id': file_id,
+            'view_url': f"https://drive.google.com/file/d/{file_id}/preview" if file_id else None
+        }
+        for file_id, filename in iter_files_from_html(html_content)
+    ]
 
 
 def is_likely_file_id(text):
@@ -146,53 +163,25 @@ def is_likely_file_id(text):
         return False
 
     # Должен содержать смесь букв и цифр
-    import string
-    has_letters = any(c in string.ascii_letters for c in text)
-    has_digits = any(c in string.digits for c in text)
-
-    return has_letters and has_digits
+    chars = set(text)
+    return not chars.isdisjoint(_ASCII_LETTERS) and not chars.isdisjoint(_ASCII_DIGITS)
 
 
 def get_files_alternative_method(folder_id):
     """Альтернативный метод получения файлов через embeddedfolderview"""
 
     try:
-        embed_url = f"https://drive.google.com/embeddedfolderview?id={folder_id}#list"
-
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-
-        response = requests.get(embed_url, headers=headers, timeout=10)
-
-        if response.status_code == 200:
-            html = response.text
-
-            # Простой поиск имен файлов изображений
-            image_extensions = ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']
-            files = []
-
-            for ext in image_extensions:
-                pattern = rf'["\']([^"\']*\.{ext})["\']'
-                matches = re.findall(pattern, html, re.IGNORECASE)
-
-                for filename in matches:
-                    if is_image_file(filename) and len(filename) > 3:
-                        files.append({
-                            'filename': filename,
-                            'file_id': None,  # Не можем получить ID этим методом
-                            'view_url': None
-                        })
+        client = get_drive_listing_client()
+        files = []
+        seen = set()
 
+        for file_id, filename in client.fetch_embedded_listing(folder_id):
             # Убираем дубликаты
-            seen = set()
-            unique_files = []
-            for file_info in files:
-                if file_info['filename'] not in seen:
-                    seen.add(file_info['filename'])
-                    unique_files.append(file_info)
+            if is_image_file(filename) and len(filename) > 3 and filename not in seen:
+                seen.add(filename)
+                files.append(file_entry(file_id, filename))
 
-            return unique_files
+        return files
 
     except Exception as e:
         st.error(f"Альтернативный метод не сработал: {str(e)}")
@@ -216,27 +205,7 @@ def test_folder_access(folder_url):
     if not folder_id:
         return False, "Неверный URL папки"
 
-    try:
-        test_url = f"https://drive.google.com/drive/folders/{folder_id}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-
-        response = requests.get(test_url, headers=headers, timeout=10)
-
-        if response.status_code == 200:
-            if 'This folder doesn\'t exist' in response.text:
-                return False, "Папка не существует или нет доступа"
-            return True, "Доступ к папке есть"
-        elif response.status_code == 403:
-            return False, "Нет прав доступа к папке"
-        elif response.status_code == 404:
-            return False, "Папка не найдена"
-        else:
-            return False, f"HTTP ошибка: {response.status_code}"
-
-    except Exception as e:
-        return False, f"Ошибка подключения: {str(e)}"
+    return get_drive_listing_client().check_access(folder_id)
 
 
 def get_direct_download_url(file_id):
@@ -253,9 +222,12 @@ def get_preview_url(file_id):
     return f"https://drive.google.com/file/d/{file_id}/preview"
 
 
-@st.cache_data(ttl=300)  # Кэшируем на 5 минут
 def cached_get_files_from_folder(folder_url):
-    """Кэшированная версия получения файлов"""
+    """
+    Кэшированная версия получения файлов.
+    Страницы списка хранятся в дисковом кэше общего клиента и перепроверяются условными
+    запросами, поэтому список всегда актуален, а разбор повторяется только после изменений
+    """
     return get_files_from_public_folder(folder_url)
 
 
@@ -0,0 +1,194 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+import streamlit as st
+from PIL import Image
+
+
+# Ширина отображаемой копии и бюджеты кэша можно переопределить переменными окружения
+DISPLAY_WIDTH = int(os.environ.get('DISPLAY_IMAGE_WIDTH', 1024))
+DISPLAY_QUALITY = 85
+MEMORY_BUDGET = int(os.environ.get('DISPLAY_CACHE_MEMORY_MB', 256)) * 1024 * 1024
+DISK_BUDGET = int(os.environ.get('DISPLAY_CACHE_DISK_MB', 2048)) * 1024 * 1024
+CACHE_DIR = os.environ.get(
+    'DISPLAY_CACHE_DIR',
+    os.path.join(tempfile.gettempdir(), 'image_validation_app', 'display')
+)
+
+
+def render_display_image(fp, width=DISPLAY_WIDTH):
+    """Декодирует изображение в уменьшенном размере и кодирует копию для браузера"""
+
+    with Image.open(fp) as img:
+        # Для JPEG декодер сразу уменьшает изображение в 2/4/8 раз
+        img.draft('RGB', (width, width))
+        img.thumbnail((width, width * 4))
+
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        buffer = io.BytesIO()
+
+        if has_alpha:
+            img.save(buffer, format='PNG', optimize=False)
+        else:
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            img.save(buffer, format='JPEG', quality=DISPLAY_QUALITY)
+
+    return buffer.getvalue()
+
+
+class DisplayImageCache:
+    """
+    Двухуровневый кэш уменьшенных копий изображений:
+    LRU в памяти с ограничением по байтам и дисковое хранилище с вытеснением по размеру
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, memory_budget=MEMORY_BUDGET, disk_budget=DISK_BUDGET):
+        self.cache_dir = cache_dir
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.hits = {'memory': 0, 'disk': 0, 'miss': 0}
+
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk = OrderedDict()
+        self._disk_size = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan_disk()
+
+    def _scan_disk(self):
+        """Восстанавливает индекс дискового кэша, старые файлы первыми"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                # Недописанные файлы от прерванных записей
+                if name.endswith('.tmp'):
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+
+        for _, name, size in sorted(entries):
+            self._disk[name] = size
+            self._disk_size += size
+
+    @staticmethod
+    def make_key(identity, width):
+        """Ключ кэша по идентификатору изображения и ширине"""
+        return hashlib.sha1(f"{identity}@{width}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Возвращает копию из памяти или с диска, либо None"""
+
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits['memory'] += 1
+                return data
+
+            on_disk = key in self._disk
+
+        if on_disk:
+            path = os.path.join(self.cache_dir, key)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                data = None
+
+            if data is not None:
+                with self._lock:
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self.hits['disk'] += 1
+                    self._remember(key, data)
+                return data
+
+        with self._lock:
+            self.hits['miss'] += 1
+        return None
+
+    def contains(self, key):
+        """Проверяет наличие копии в памяти или на диске, не читая ее"""
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def put(self, key, data):
+        """Сохраняет копию в память и на диск"""
+
+        path = os.path.join(self.cache_dir, key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            path = None
+
+        with self._lock:
+            self._remember(key, data)
+
+            if path is not None:
+                self._disk_size += len(data) - self._disk.pop(key, 0)
+                self._disk[key] = len(data)
+                self._evict_disk()
+
+    def get_or_render(self, identity, width, render):
+        """Возвращает копию из кэша или строит ее вызовом render()"""
+
+        key = self.make_key(identity, width)
+        data = self.get(key)
+
+        if data is None:
+            data = render()
+            self.put(key, data)
+
+        return data
+
+    def _remember(self, key, data):
+        """Кладет копию в LRU в памяти (вызывается под блокировкой)"""
+        if len(data) > self.memory_budget:
+            return
+
+        self._memory_size += len(data) - len(self._memory.pop(key, b''))
+        self._memory[key] = data
+
+        while self._memory_size > self.memory_budget:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _evict_disk(self):
+        """Удаляет самые старые файлы, пока кэш больше бюджета (вызывается под блокировкой)"""
+        while self._disk_size > self.disk_budget and self._disk:
+            name, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+
+@st.cache_resource
+def get_display_cache():
+    """Общий для всех сессий кэш отображаемых копий"""
+    return DisplayImageCache()
+
+
+def get_display_image(source, member, width=DISPLAY_WIDTH):
+    """Возвращает байты уменьшенной копии изображения из архива"""
+
+    return get_display_cache().get_or_render(
+        source.identity(member),
+        width,
+        lambda: render_display_image(source.open_image_bytes(member), width)
+    )
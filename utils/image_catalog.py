@@ -0,0 +1,102 @@
+import posixpath
+import sys
+
+
+def common_directory(members):
+    """Общая папка всех элементов архива ('' если ее нет), например 'photos/' для архива с корневой папкой"""
+
+    if not members:
+        return ''
+
+    prefix = posixpath.commonprefix(members)
+    cut = prefix.rfind('/')
+    return prefix[:cut + 1] if cut >= 0 else ''
+
+
+class ImageCatalog:
+    """
+    Каталог изображений набора: у каждого изображения постоянный целый id (позиция в навигации)
+    и имя - путь относительно общей папки архива. Одинаковые имена файлов в разных подпапках
+    остаются разными изображениями. Каждое имя хранится одной интернированной строкой,
+    путь в архиве собирается из общей папки и имени. id <-> имя за O(1)
+    """
+
+    def __init__(self, members):
+        # Повторяющиеся записи архива с одним и тем же путем - одно изображение
+        members = list(dict.fromkeys(members))
+        self.root = common_directory(members)
+        skip = len(self.root)
+
+        self.names = [sys.intern(member[skip:]) for member in members]
+        self._ids = {name: image_id for image_id, name in enumerate(self.names)}
+
+    @classmethod
+    def from_names(cls, root, names):
+        """Восстанавливает каталог из сохраненной общей папки и имен"""
+        catalog = cls.__new__(cls)
+        catalog.root = root
+        catalog.names = [sys.intern(name) for name in names]
+        catalog._ids = {name: image_id for image_id, name in enumerate(catalog.names)}
+        return catalog
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def name(self, image_id):
+        """Имя изображения по id"""
+        return self.names[image_id]
+
+    def id_of(self, name):
+        """id изображения по имени или None"""
+        return self._ids.get(name)
+
+    def member(self, image_id):
+        """Путь изображения внутри архива по id"""
+        return self.root + self.names[image_id]
+
+    def member_of(self, name):
+        """Путь изображения внутри архива по имени или None"""
+        return self.root + name if name in self._ids else None
+
+    def members(self):
+        """Все пути внутри архива в порядке id"""
+        return [self.root + name for name in self.names]
+
+
+class NameMatcher:
+    """
+    Сопоставляет пути из внешних источников (CSV, старые записи базы) с именами каталога.
+    Путь может содержать лишние папки спереди (папку набора, корень архива), в том числе со '/'
+    в названии: подходит самый длинный хвост пути, который есть в каталоге.
+    Если ни один хвост не подошел, используется имя файла, когда оно в каталоге единственное
+    """
+
+    def __init__(self, names):
+        self._names = set(names)
+        basenames = {}
+        for name in self._names:
+            basename = name.rsplit('/', 1)[-1]
+            # None - имя файла встречается в разных папках, по нему одному изображение не найти
+            basenames[basename] = None if basename in basenames else name
+        self._basenames = basenames
+
+    def match(self, path):
+        """Имя изображения в каталоге или None"""
+
+        if not path:
+            return None
+
+        parts = path.split('/')
+        for start in range(len(parts)):
+            candidate = '/'.join(parts[start:])
+            if candidate in self._names:
+                return candidate
+
+        return self._basenames.get(parts[-1])
+
+    def match_all(self, paths):
+        """Сопоставляет Series путей; каждый уникальный путь разбирается один раз"""
+        return paths.map({path: self.match(path) for path in paths.unique()})
@@ -0,0 +1,195 @@
+import struct
+import threading
+from PIL import Image
+
+
+# Маркеры JPEG, после которых идут размеры кадра (SOF0-SOF15 кроме DHT, JPG, DAC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# Маркеры без поля длины
+JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7}
+
+PROBE_HEADER_SIZE = 32
+
+
+def probe_image(fp):
+    """
+    Определяет формат и размеры изображения по заголовку, не декодируя пиксели.
+    Возвращает (format, width, height), при нераспознанном файле бросает ValueError
+    """
+
+    head = fp.read(PROBE_HEADER_SIZE)
+
+    if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+        width, height = struct.unpack('>II', head[16:24])
+        return 'PNG', width, height
+
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        width, height = struct.unpack('<HH', head[6:10])
+        return 'GIF', width, height
+
+    if head[:2] == b'BM' and len(head) >= 26:
+        header_size = struct.unpack('<I', head[14:18])[0]
+        if header_size == 12:
+            width, height = struct.unpack('<HH', head[18:22])
+        else:
+            width, height = struct.unpack('<ii', head[18:26])
+        return 'BMP', width, abs(height)
+
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return _probe_webp(head)
+
+    if head[:2] == b'\xff\xd8':
+        return _probe_jpeg(fp, head[2:])
+
+    raise ValueError("Неизвестный формат изображения")
+
+
+def _probe_webp(head):
+    """Читает размеры из заголовка WEBP (VP8, VP8L или VP8X)"""
+
+    chunk = head[12:16]
+
+    if chunk == b'VP8 ' and head[23:26] == b'\x9d\x01\x2a':
+        width, height = struct.unpack('<HH', head[26:30])
+        return 'WEBP', width & 0x3FFF, height & 0x3FFF
+
+    if chunk == b'VP8L' and head[20:21] == b'\x2f':
+        bits = struct.unpack('<I', head[21:25])[0]
+        return 'WEBP', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+
+    if chunk == b'VP8X':
+        width = int.from_bytes(head[24:27], 'little') + 1
+        height = int.from_bytes(head[27:30], 'little') + 1
+        return 'WEBP', width, height
+
+    raise ValueError("Поврежденный заголовок WEBP")
+
+
+def _probe_jpeg(fp, buffered):
+    """Проходит по сегментам JPEG до маркера SOF, пропуская данные сегментов"""
+
+    stream = _PrefixedStream(fp, buffered)
+
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            raise ValueError("Не найден заголовок кадра JPEG")
+        if byte != b'\xff':
+            continue
+
+        marker = stream.read(1)
+        # Пропускаем байты-заполнители 0xFF
+        while marker == b'\xff':
+            marker = stream.read(1)
+        if not marker:
+            raise ValueError("Не найден заголовок кадра JPEG")
+
+        code = marker[0]
+        if code in JPEG_STANDALONE_MARKERS or code == 0x00:
+            continue
+        if code in (0xD9, 0xDA):
+            raise ValueError("Не найден заголовок кадра JPEG")
+
+        length = struct.unpack('>H', stream.read_exact(2))[0]
+
+        if code in JPEG_SOF_MARKERS:
+            frame = stream.read_exact(5)
+            height, width = struct.unpack('>HH', frame[1:5])
+            return 'JPEG', width, height
+
+        stream.skip(length - 2)
+
+
+class _PrefixedStream:
+    """Поток, который сначала отдает уже прочитанный заголовок, затем продолжает чтение файла"""
+
+    def __init__(self, fp, prefix):
+        self._fp = fp
+        self._prefix = prefix
+
+    def read(self, size):
+        if self._prefix:
+            chunk, self._prefix = self._prefix[:size], self._prefix[size:]
+            if len(chunk) < size:
+                chunk += self._fp.read(size - len(chunk))
+            return chunk
+        return self._fp.read(size)
+
+    def read_exact(self, size):
+        data = self.read(size)
+        if len(data) != size:
+            raise ValueError("Неожиданный конец файла")
+        return data
+
+    def skip(self, size):
+        while size > 0:
+            chunk = self.read(min(size, 65536))
+            if not chunk:
+                raise ValueError("Неожиданный конец файла")
+            size -= len(chunk)
+
+
+def probe_image_with_fallback(fp):
+    """Пробует быстрый разбор заголовка, при неудаче - ленивое открытие через PIL"""
+
+    try:
+        return probe_image(fp)
+    except (ValueError, struct.error):
+        fp.seek(0)
+        # Image.open читает только заголовок, пиксели не декодируются
+        with Image.open(fp) as img:
+            return img.format, img.size[0], img.size[1]
+
+
+def verify_image(fp):
+    """Полная проверка целостности изображения через PIL"""
+
+    with Image.open(fp) as img:
+        img.verify()
+
+
+class IntegrityCheck:
+    """
+    Фоновая полная проверка целостности изображений.
+    Запускается после загрузки, пока пользователь уже размечает
+    """
+
+    title = "🔍 Проверка целостности"
+
+    def __init__(self, source, members):
+        self.total = len(members)
+        self.checked = 0
+        self.broken = {}
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._thread = threading.Thread(
+            target=self._run, args=(source, list(members)), name='integrity-check', daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, source, members):
+        for member in members:
+            if self._cancelled:
+                return
+
+            try:
+                verify_image(source.open_image_bytes(member))
+            except Exception as e:
+                with self._lock:
+                    self.broken[member] = str(e)
+
+            with self._lock:
+                self.checked += 1
+
+    @property
+    def done(self):
+        return not self._thread.is_alive()
+
+    def cancel(self):
+        """Останавливает проверку"""
+        self._cancelled = True
+
+    def progress(self):
+        """Возвращает (проверено, всего, словарь поврежденных файлов)"""
+        with self._lock:
+            return self.checked, self.total, dict(self.broken)
@@ -0,0 +1,87 @@
+from bisect import bisect_left, bisect_right
+
+
+class ImageSearchIndex:
+    """
+    Поисковый индекс по именам изображений.
+    Имена хранятся отсортированными (без учета регистра) вместе с позициями в списке навигации:
+    поиск по началу имени и точный поиск - бинарные, поиск подстроки идет по одной склеенной строке
+    """
+
+    def __init__(self, filenames):
+        self.filenames = filenames
+        keys = [name.lower() for name in filenames]
+        order = sorted(range(len(filenames)), key=keys.__getitem__)
+
+        self._keys = [keys[i] for i in order]
+        self._positions = order
+
+        # Все имена через перевод строки: str.find по ней работает на скорости C
+        self._blob = '\n'.join(self._keys)
+        self._starts = []
+        offset = 0
+        for key in self._keys:
+            self._starts.append(offset)
+            offset += len(key) + 1
+
+    def __len__(self):
+        return len(self._keys)
+
+    def find(self, filename):
+        """Возвращает позицию файла в списке навигации или None - O(log n)"""
+        key = filename.lower()
+        rank = bisect_left(self._keys, key)
+        if rank < len(self._keys) and self._keys[rank] == key:
+            return self._positions[rank]
+        return None
+
+    def prefix_search(self, prefix):
+        """Возвращает ранги (номера в отсортированном порядке) имен, начинающихся с prefix"""
+        key = prefix.lower()
+        lo = bisect_left(self._keys, key)
+        hi = bisect_right(self._keys, key + '\uffff', lo)
+        return range(lo, hi)
+
+    def substring_search(self, substring):
+        """Возвращает ранги имен, содержащих substring"""
+        needle = substring.lower()
+        if not needle:
+            return range(len(self._keys))
+        if '\n' in needle:
+            return []
+
+        ranks = []
+        pos = self._blob.find(needle)
+        while pos != -1:
+            rank = bisect_right(self._starts, pos) - 1
+            ranks.append(rank)
+            # Следующее совпадение ищем уже в следующем имени
+            next_start = self._starts[rank + 1] if rank + 1 < len(self._starts) else len(self._blob)
+            pos = self._blob.find(needle, next_start)
+
+        return ranks
+
+    def search(self, query, substring=False):
+        """Ищет имена по началу или по подстроке; результат - ранги в отсортированном порядке"""
+        return self.substring_search(query) if substring else self.prefix_search(query)
+
+    def page(self, ranks, page, page_size):
+        """Возвращает страницу результатов: список (позиция в навигации, имя файла)"""
+        start = page * page_size
+        return [
+            (self._positions[rank], self.filenames[self._positions[rank]])
+            for rank in ranks[start:start + page_size]
+        ]
+
+
+def get_image_search_index(session_state):
+    """Возвращает индекс для текущего списка изображений, перестраивая его только при смене списка"""
+
+    images = session_state.get('images_list') or []
+    index = session_state.get('image_search_index')
+
+    if index is None or index.filenames is not images:
+        index = ImageSearchIndex(images)
+        session_state['image_search_index'] = index
+
+    return index
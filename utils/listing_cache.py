@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import streamlit as st
+from .drive_listing import DriveNetworkError
+
+
+CACHE_DIR = os.environ.get(
+    'LISTING_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'image_validation_app', 'listings')
+)
+
+# Версия формата записей; записи другой версии считаются отсутствующими
+CACHE_VERSION = 1
+# Записи, которыми не пользовались дольше этого срока, удаляются при сборке мусора
+STALE_ENTRY_AGE = int(os.environ.get('LISTING_CACHE_MAX_AGE_DAYS', 30)) * 24 * 3600
+# Сверх этого числа записей удаляются давно не использованные
+MAX_ENTRIES = int(os.environ.get('LISTING_CACHE_MAX_ENTRIES', 10000))
+# Временные файлы записи старше этого срока остались от прерванной записи
+STALE_TMP_AGE = 3600
+
+
+class ListingCache:
+    """
+    Дисковый кэш разобранных страниц списков Google Drive.
+    Для каждой страницы хранятся результат разбора и валидаторы: ETag, Last-Modified
+    и хэш содержимого. Страница перепроверяется условным запросом; разбор повторяется,
+    только если сервер вернул новое содержимое. Кэш переживает перезапуск приложения
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        # not_modified - ответ 304, unchanged - 200 с тем же хэшем, miss - страница разобрана заново,
+        # stale - сбой сети, отдан сохраненный результат
+        self.counters = {'not_modified': 0, 'unchanged': 0, 'miss': 0, 'stale': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(url, params=None):
+        """Ключ записи по адресу и параметрам запроса"""
+        raw = json.dumps([url, sorted((params or {}).items())], ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def load(self, key):
+        """Сохраненная запись или None"""
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('version') == CACHE_VERSION else None
+
+    def store(self, key, entry):
+        entry['version'] = CACHE_VERSION
+        entry['checked'] = time.time()
+
+        tmp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(key))
+
+    def touch(self, key):
+        """Отмечает использование записи, которая отдана без перезаписи"""
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def fetch(self, request, url, params, parse):
+        """
+        Возвращает разобранную страницу.
+        request(url, params, headers) выполняет запрос (ответ 304 допустим) и бросает DriveNetworkError
+        при сбое сети, parse(text) разбирает тело; результат разбора должен сериализоваться в JSON
+        """
+
+        key = self.make_key(url, params)
+        entry = self.load(key)
+
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = request(url, params, headers)
+        except DriveNetworkError:
+            # Сохраненный список отдается только при сбое сети. Ошибки HTTP (403, 404) пробрасываются:
+            # папку могли закрыть или удалить, и старый список показывать нельзя
+            if entry is None:
+                raise
+            self._count('stale')
+            self.touch(key)
+            return entry['data']
+
+        if response.status_code == 304 and entry:
+            self._count('not_modified')
+            self.touch(key)
+            return entry['data']
+
+        digest = hashlib.sha256(response.content).hexdigest()
+        if entry and entry.get('hash') == digest:
+            # Сервер не поддерживает условные запросы, но содержимое то же - разбор не нужен
+            self._count('unchanged')
+            data = entry['data']
+        else:
+            self._count('miss')
+            data = parse(response.text)
+
+        self.store(key, {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'hash': digest,
+            'data': data
+        })
+        return data
+
+    def stats(self):
+        """Счетчики: hits - страницы без повторного разбора, misses - разобранные заново"""
+        with self._lock:
+            counters = dict(self.counters)
+        counters['hits'] = counters['not_modified'] + counters['unchanged'] + counters['stale']
+        counters['misses'] = counters['miss']
+        return counters
+
+    def collect_garbage(self, max_entries=MAX_ENTRIES, max_age=STALE_ENTRY_AGE):
+        """
+        Удаляет записи, не использованные дольше max_age секунд, давно не использованные записи
+        сверх max_entries и брошенные временные файлы. Вызывается один раз при старте приложения
+        """
+
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                last_used = os.path.getmtime(path)
+                if name.endswith('.json'):
+                    if now - last_used > max_age:
+                        os.remove(path)
+                    else:
+                        entries.append((last_used, path))
+                elif name.endswith('.tmp') and now - last_used > STALE_TMP_AGE:
+                    os.remove(path)
+            except OSError:
+                continue
+
+        entries.sort()
+        for _, path in entries[:max(len(entries) - max_entries, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        """Удаляет все записи"""
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json'):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+
+@st.cache_resource
+def get_listing_cache():
+    """Общий для всех сессий кэш списков папок; при первом обращении удаляет старые записи"""
+    cache = ListingCache()
+    cache.collect_garbage()
+    return cache
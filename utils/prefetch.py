@@ -0,0 +1,95 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .image_cache import DISPLAY_WIDTH, render_display_image
+
+
+PREFETCH_AHEAD = int(os.environ.get('PREFETCH_AHEAD', 3))
+PREFETCH_BEHIND = 1
+PREFETCH_WORKERS = int(os.environ.get('PREFETCH_WORKERS', 2))
+
+
+class ImagePrefetcher:
+    """
+    Фоновая подготовка уменьшенных копий следующих изображений.
+    Готовые копии попадают в общий кэш отображения, поэтому память ограничена его бюджетом.
+    При переходе к другому месту списка задачи старого окна отменяются
+    """
+
+    def __init__(self, cache, ahead=PREFETCH_AHEAD, behind=PREFETCH_BEHIND,
+                 workers=PREFETCH_WORKERS, width=DISPLAY_WIDTH):
+        self.cache = cache
+        self.ahead = ahead
+        self.behind = behind
+        self.width = width
+        self.last_index = None
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+        self._pending = {}
+        # Колбэк завершения вызывается синхронно при cancel(), поэтому блокировка реентерабельная
+        self._lock = threading.RLock()
+
+    def window(self, index, total, direction):
+        """Возвращает индексы для подготовки: сначала по направлению движения, потом в обратную сторону"""
+        forward = [index + direction * step for step in range(1, self.ahead + 1)]
+        backward = [index - direction * step for step in range(1, self.behind + 1)]
+        return [i for i in forward + backward if 0 <= i < total]
+
+    def update(self, source, index, total, member_at):
+        """
+        Планирует подготовку изображений вокруг текущего индекса.
+        member_at(i) возвращает элемент архива для i-го изображения в порядке навигации
+        """
+
+        if source is None or total == 0:
+            return
+
+        direction = -1 if self.last_index is not None and index < self.last_index else 1
+        self.last_index = index
+
+        wanted = {}
+        for i in self.window(index, total, direction):
+            member = member_at(i)
+            # Еще не скачанное изображение не занимает поток пула ожиданием:
+            # поднимаем его в очереди загрузки, подготовим при следующем обновлении
+            if not source.is_ready(member):
+                source.prioritize(member)
+                continue
+            key = self.cache.make_key(source.identity(member), self.width)
+            if not self.cache.contains(key):
+                wanted[key] = member
+
+        with self._lock:
+            # Отменяем задачи, которые больше не попадают в окно (например, после перехода из списка)
+            for key in list(self._pending):
+                if key not in wanted:
+                    self._pending.pop(key).cancel()
+
+            for key, member in wanted.items():
+                if key not in self._pending:
+                    future = self._executor.submit(self._render, source, member, key)
+                    self._pending[key] = future
+                    future.add_done_callback(lambda f, key=key: self._forget(key, f))
+
+    def _render(self, source, member, key):
+        if self.cache.contains(key):
+            return
+        data = render_display_image(source.open_image_bytes(member), self.width)
+        self.cache.put(key, data)
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def cancel(self):
+        """Отменяет все ожидающие задачи"""
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+
+    def shutdown(self):
+        """Останавливает пул потоков"""
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,82 @@
+import threading
+
+
+# Как часто ожидающие обновляют прогресс чужой задачи
+WAIT_POLL_INTERVAL = 0.25
+
+
+class Flight:
+    """Выполняющаяся задача: результат, ошибка и последний прогресс, видимый всем ожидающим"""
+
+    def __init__(self):
+        self.finished = threading.Event()
+        self.result = None
+        self.error = None
+        # Задача завершилась результатом или ошибкой, а не была брошена ведущим
+        self.completed = False
+        # (доля 0..1 или None, текст) - последнее сообщение ведущего
+        self.progress = None
+
+    def report(self, fraction, text):
+        """Публикует прогресс для ожидающих; вызывается ведущим"""
+        self.progress = (fraction, text)
+
+
+class SingleFlight:
+    """
+    Объединение одновременных одинаковых задач внутри процесса.
+    Первый вызов с ключом выполняет задачу, остальные ждут ее и получают тот же результат
+    (или ту же ошибку) и видят ее прогресс. Завершенные задачи не кэшируются
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, job, on_wait=None):
+        """
+        Выполняет job(flight) или присоединяется к уже идущей задаче с тем же ключом.
+        on_wait(fraction, text) вызывается у ожидающих при каждом изменении прогресса.
+        Если ведущий бросил задачу (его сессию перезапустили или остановили), один из ожидающих
+        становится новым ведущим
+        """
+
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = Flight()
+
+            if leader:
+                try:
+                    flight.result = job(flight)
+                    flight.completed = True
+                    return flight.result
+                except Exception as e:
+                    flight.error = e
+                    flight.completed = True
+                    raise
+                # RerunException/StopException Streamlit наследуют BaseException и относятся только
+                # к сессии ведущего: задача остается незавершенной, и ожидающие ее перехватывают
+                finally:
+                    with self._lock:
+                        del self._flights[key]
+                    flight.finished.set()
+
+            shown = None
+            while not flight.finished.wait(WAIT_POLL_INTERVAL):
+                progress = flight.progress
+                if on_wait is not None and progress is not None and progress != shown:
+                    shown = progress
+                    on_wait(*progress)
+
+            if flight.completed:
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
+
+    def in_flight(self, key):
+        """Выполняется ли сейчас задача с ключом"""
+        with self._lock:
+            return key in self._flights
@@ -0,0 +1,126 @@
+class UnannotatedTracker:
+    """
+    Множество неразмеченных позиций списка изображений.
+    Битовая карта плюс дерево Фенвика: пометка, счетчик оставшихся и поиск
+    следующей/предыдущей неразмеченной позиции работают за O(log n).
+    Подписывается на изменения хранилища разметок. Пропущенные изображения (не прошли проверку)
+    не считаются неразмеченными
+    """
+
+    def __init__(self, images, annotated=()):
+        self.images = images
+        self.size = len(images)
+        # Хранилище, на которое подписан трекер
+        self.store = None
+        # Пропущенные имена файлов
+        self.skipped = set()
+
+        # Одно имя файла может встречаться в списке несколько раз
+        self._positions = {}
+        for position, filename in enumerate(images):
+            self._positions.setdefault(filename, []).append(position)
+
+        self._rebuild(annotated)
+
+    def _rebuild(self, annotated=()):
+        """Строит битовую карту и дерево за O(n)"""
+
+        self._bits = bytearray(b'\x01') * self.size
+        for filename in annotated:
+            for position in self._positions.get(filename, ()):
+                self._bits[position] = 0
+
+        tree = [0] * (self.size + 1)
+        for i in range(1, self.size + 1):
+            tree[i] += self._bits[i - 1]
+            parent = i + (i & -i)
+            if parent <= self.size:
+                tree[parent] += tree[i]
+        self._tree = tree
+        self.remaining = sum(self._bits)
+
+    def _add(self, position, delta):
+        i = position + 1
+        while i <= self.size:
+            self._tree[i] += delta
+            i += i & -i
+        self.remaining += delta
+
+    def _prefix(self, position):
+        """Количество неразмеченных позиций в [0, position)"""
+        total = 0
+        i = position
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _kth(self, k):
+        """Позиция k-й (с 1) неразмеченной позиции"""
+        position = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= self.size and self._tree[nxt] < k:
+                position = nxt
+                k -= self._tree[nxt]
+            step >>= 1
+        return position
+
+    def _mark(self, filename, unannotated):
+        value = 1 if unannotated else 0
+        for position in self._positions.get(filename, ()):
+            if self._bits[position] != value:
+                self._bits[position] = value
+                self._add(position, 1 if unannotated else -1)
+
+    def skip(self, filenames):
+        """Исключает изображения из неразмеченных - к ним не переходит навигация"""
+        for filename in filenames:
+            if filename in self._positions and filename not in self.skipped:
+                self.skipped.add(filename)
+                self._mark(filename, False)
+
+    def is_unannotated(self, position):
+        return bool(self._bits[position])
+
+    def next_unannotated(self, position, wrap=True):
+        """Первая неразмеченная позиция после position; с wrap=True поиск продолжается с начала"""
+
+        before = self._prefix(position + 1)
+        if before < self.remaining:
+            return self._kth(before + 1)
+
+        if wrap and self._prefix(position) > 0:
+            return self._kth(1)
+
+        return None
+
+    def previous_unannotated(self, position, wrap=True):
+        """Последняя неразмеченная позиция перед position; с wrap=True поиск продолжается с конца"""
+
+        before = self._prefix(position)
+        if before > 0:
+            return self._kth(before)
+
+        if wrap and self.remaining - self._prefix(position + 1) > 0:
+            return self._kth(self.remaining)
+
+        return None
+
+    def unannotated_positions(self):
+        """Возвращает неразмеченные позиции по порядку"""
+        return [position for position, bit in enumerate(self._bits) if bit]
+
+    # Подписка на изменения хранилища разметок
+
+    def on_upsert(self, old, new):
+        if old is None:
+            self._mark(new['filename'], False)
+
+    def on_delete(self, old):
+        if old['filename'] not in self.skipped:
+            self._mark(old['filename'], True)
+
+    def on_clear(self):
+        self._rebuild(self.skipped)
@@ -0,0 +1,143 @@
+import io
+import mmap
+import os
+import zipfile
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')
+
+# Служебные папки и файлы, которые архиваторы добавляют в ZIP
+JUNK_DIRS = {'__MACOSX', '.DS_Store'}
+JUNK_PREFIXES = ('._', '.DS_Store', 'Thumbs.db')
+
+
+def is_image_member(info):
+    """Проверяет по записи центрального каталога, что элемент архива - изображение"""
+
+    if info.is_dir():
+        return False
+
+    parts = info.filename.split('/')
+    if any(part in JUNK_DIRS for part in parts[:-1]):
+        return False
+
+    basename = parts[-1]
+    if basename.startswith(JUNK_PREFIXES):
+        return False
+
+    return basename.lower().endswith(IMAGE_EXTENSIONS)
+
+
+class _MappedFile:
+    """Файловый объект поверх mmap для чтения архива без системных вызовов read"""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self, size=-1):
+        return self._map.read(size if size is not None else -1)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._map.seek(offset, whence)
+        return self._map.tell()
+
+    def tell(self):
+        return self._map.tell()
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class ZipImageSource:
+    """
+    Источник изображений, читающий их напрямую из ZIP архива без распаковки.
+    Индекс элементов строится по центральному каталогу, байты читаются по запросу
+    """
+
+    def __init__(self, zip_path, use_mmap=False):
+        self.zip_path = zip_path
+        self.use_mmap = use_mmap
+        self._zip = None
+        self._fp = None
+        self._closed = False
+
+        # Индекс изображений: имя элемента архива -> запись центрального каталога
+        self.members = {
+            info.filename: info
+            for info in self._archive().infolist()
+            if is_image_member(info)
+        }
+
+    def _archive(self):
+        """Открывает архив при первом обращении; закрытый источник больше не открывается"""
+        if self._closed:
+            raise ValueError("Архив закрыт")
+        if self._zip is None:
+            if self.use_mmap:
+                self._fp = _MappedFile(self.zip_path)
+                self._zip = zipfile.ZipFile(self._fp, 'r')
+            else:
+                self._zip = zipfile.ZipFile(self.zip_path, 'r')
+        return self._zip
+
+    def names(self):
+        """Возвращает имена изображений в порядке центрального каталога"""
+        return list(self.members)
+
+    def is_ready(self, name):
+        """Элементы архива доступны сразу"""
+        return True
+
+    def prioritize(self, name):
+        """Порядок чтения из архива не важен"""
+
+    def open(self, name):
+        """Открывает элемент архива для потокового чтения"""
+        return self._archive().open(self.members[name])
+
+    def read(self, name):
+        """Читает байты изображения из архива"""
+        return self._archive().read(self.members[name])
+
+    def open_image_bytes(self, name):
+        """Возвращает байты изображения в виде файлового объекта для PIL"""
+        return io.BytesIO(self.read(name))
+
+    def identity(self, name):
+        """Возвращает идентификатор содержимого изображения (не зависит от пути к архиву)"""
+        info = self.members[name]
+        return f"{name}:{info.CRC:08x}:{info.file_size}"
+
+    def close(self):
+        """Закрывает архив; дальнейшее чтение бросает ValueError"""
+        self._closed = True
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def __contains__(self, name):
+        return name in self.members
+
+    def __len__(self):
+        return len(self.members)
+
+    def __getstate__(self):
+        # Открытые дескрипторы не сериализуются - архив переоткроется лениво
+        state = self.__dict__.copy()
+        state['_zip'] = None
+        state['_fp'] = None
+        return state
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass